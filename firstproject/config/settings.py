@@ -298,9 +298,41 @@ CACHES = {
         },
         'KEY_PREFIX': 'medical_imaging',
         'TIMEOUT': config('CACHE_TTL', default=3600, cast=int),
+    },
+    # Encoded image bytes (JPEG/WebP/AVIF) - already compressed, so stored raw
+    'images': {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': f"redis://{config('REDIS_HOST', default='localhost')}:{config('REDIS_PORT', default='6379')}/{config('REDIS_DB', default='0')}",
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'PASSWORD': config('REDIS_PASSWORD', default=None),
+            'SOCKET_CONNECT_TIMEOUT': 5,
+            'SOCKET_TIMEOUT': 5,
+            'CONNECTION_POOL_KWARGS': {
+                'max_connections': 50,
+                'retry_on_timeout': True,
+            }
+        },
+        'KEY_PREFIX': 'medical_imaging:media',
+        'TIMEOUT': config('CACHE_TTL', default=3600, cast=int),
     }
 }
 
+# Image cache tiers: in-process LRU in front of the raw 'images' Redis cache
+IMAGE_CACHE_ALIAS = 'images'
+IMAGE_LOCAL_CACHE_BYTES = config('IMAGE_LOCAL_CACHE_BYTES', default=64 * 1024 * 1024, cast=int)
+IMAGE_LOCAL_CACHE_TTL = config('IMAGE_LOCAL_CACHE_TTL', default=300, cast=int)
+
+# Stampede protection: one process regenerates an expired rendition while others wait
+IMAGE_CACHE_LOCK_TIMEOUT = config('IMAGE_CACHE_LOCK_TIMEOUT', default=30, cast=int)
+IMAGE_CACHE_LOCK_WAIT = config('IMAGE_CACHE_LOCK_WAIT', default=5, cast=float)
+# Probabilistic early refresh before expiry (0 disables, >1 refreshes earlier)
+IMAGE_CACHE_EARLY_REFRESH_BETA = config('IMAGE_CACHE_EARLY_REFRESH_BETA', default=1.0, cast=float)
+# Seconds a process reuses study/hospital/version generation counters (invalidation delay)
+IMAGE_CACHE_GENERATION_TTL = config('IMAGE_CACHE_GENERATION_TTL', default=1, cast=float)
+# Seconds between background flushes of per-process image cache metrics to Redis
+IMAGE_CACHE_METRICS_FLUSH_INTERVAL = config('IMAGE_CACHE_METRICS_FLUSH_INTERVAL', default=10, cast=float)
+
 # Session cache backend (optional - faster sessions)
 SESSION_ENGINE = 'django.contrib.sessions.backends.cache'
 SESSION_CACHE_ALIAS = 'default'
@@ -327,6 +359,11 @@ if USE_S3:
           "default": {
               "BACKEND": "storages.backends.s3boto3.S3Boto3Storage",
           },
+          # Same bucket, replacing files at fixed keys (renditions, originals)
+          "overwrite": {
+              "BACKEND": "storages.backends.s3boto3.S3Boto3Storage",
+              "OPTIONS": {"file_overwrite": True},
+          },
           "staticfiles": {
               "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
           },
@@ -338,6 +375,62 @@ else:
       # Local storage (development fallback)
       MEDIA_URL = '/media/'
       MEDIA_ROOT = BASE_DIR/ 'media'
+# DICOM upload staging
+# Stream uploads to default_storage and pass only storage keys to Celery.
+# Disable only when the web and worker processes do not share storage.
+UPLOAD_STAGING_ENABLED = config('UPLOAD_STAGING_ENABLED', default=True, cast=bool)
+
+# DICOM ingest pipeline
+# Worker processes used per upload task for parsing/encoding (0 = one per CPU core)
+DICOM_INGEST_WORKERS = config('DICOM_INGEST_WORKERS', default=0, cast=int)
+# Rows per bulk_create batch when persisting ingested images
+DICOM_BULK_CREATE_BATCH_SIZE = config('DICOM_BULK_CREATE_BATCH_SIZE', default=200, cast=int)
+# Task progress is written at most every N items or every T seconds
+DICOM_PROGRESS_UPDATE_ITEMS = config('DICOM_PROGRESS_UPDATE_ITEMS', default=25, cast=int)
+DICOM_PROGRESS_UPDATE_SECONDS = config('DICOM_PROGRESS_UPDATE_SECONDS', default=2.0, cast=float)
+# Precompute thumbnail/preview/WebP (and AVIF) renditions at ingest
+INGEST_RENDITIONS_ENABLED = config('INGEST_RENDITIONS_ENABLED', default=True, cast=bool)
+INGEST_RENDITIONS_AVIF = config('INGEST_RENDITIONS_AVIF', default=True, cast=bool)
+
+# Image serving
+# Redirect full-image requests to the storage URL (presigned on private S3 buckets)
+FULL_IMAGE_REDIRECT_TO_STORAGE = config('FULL_IMAGE_REDIRECT_TO_STORAGE', default=False, cast=bool)
+
+# Thread pool for storage reads and Pillow work of the async image views
+# (run under an ASGI server, e.g. `uvicorn config.asgi:application`)
+IMAGE_ASYNC_WORKERS = config('IMAGE_ASYNC_WORKERS', default=16, cast=int)
+
+# Threads used to load/generate thumbnail cache misses in batched thumbnail requests
+THUMBNAIL_BATCH_WORKERS = config('THUMBNAIL_BATCH_WORKERS', default=8, cast=int)
+
+# Predictive prefetch of the next slices' previews while a viewer scrolls through a study.
+# The window ahead grows from MIN to MAX slices while scrolling continues in one direction.
+SLICE_PREFETCH_ENABLED = config('SLICE_PREFETCH_ENABLED', default=True, cast=bool)
+SLICE_PREFETCH_MIN_WINDOW = config('SLICE_PREFETCH_MIN_WINDOW', default=4, cast=int)
+SLICE_PREFETCH_MAX_WINDOW = config('SLICE_PREFETCH_MAX_WINDOW', default=32, cast=int)
+SLICE_PREFETCH_WORKERS = config('SLICE_PREFETCH_WORKERS', default=2, cast=int)
+SLICE_PREFETCH_MAX_PENDING = config('SLICE_PREFETCH_MAX_PENDING', default=64, cast=int)
+
+# Cache warming after a study finishes processing: thumbnails of every image and
+# previews of the first slices are pushed into Redis before the first viewer opens it.
+# Warmups run on their own queue so a dedicated low-concurrency worker
+# (`celery -A config worker -Q cache_warmup --concurrency=1`) never competes with ingest.
+CACHE_WARMUP_ENABLED = config('CACHE_WARMUP_ENABLED', default=True, cast=bool)
+CACHE_WARMUP_QUEUE = config('CACHE_WARMUP_QUEUE', default='cache_warmup')
+CACHE_WARMUP_PREVIEW_COUNT = config('CACHE_WARMUP_PREVIEW_COUNT', default=10, cast=int)
+CACHE_WARMUP_WORKERS = config('CACHE_WARMUP_WORKERS', default=2, cast=int)
+CACHE_WARMUP_BATCH_SIZE = config('CACHE_WARMUP_BATCH_SIZE', default=200, cast=int)
+# Warmups still queued after this many seconds are dropped (the study was likely viewed already)
+CACHE_WARMUP_EXPIRES = config('CACHE_WARMUP_EXPIRES', default=3600, cast=int)
+
+# Window/level rendering
+# Per-worker memory budget for decoded pixel arrays (bytes)
+RENDER_PIXEL_CACHE_BYTES = config('RENDER_PIXEL_CACHE_BYTES', default=256 * 1024 * 1024, cast=int)
+
+# Deep-zoom tiles
+# Per-worker memory budget for decoded pyramid levels tiles are cut from (bytes)
+TILE_LEVEL_CACHE_BYTES = config('TILE_LEVEL_CACHE_BYTES', default=256 * 1024 * 1024, cast=int)
+
 # DRF Spectacular Settings (API Documentation)
 SPECTACULAR_SETTINGS = {
     'TITLE': 'Medical Imaging Platform API',
@@ -65,7 +65,7 @@ class DicomImageAdmin(admin.ModelAdmin):
       list_display = ['id', 'study', 'instance_number', 'file_size_bytes', 'uploaded_at']
       search_fields = ['study__patient__first_name', 'study__patient__last_name']
       list_filter = ['uploaded_at']
-      readonly_fields = ['uploaded_at', 'file_size_bytes']
+      readonly_fields = ['uploaded_at', 'file_size_bytes', 'original_sha256']
 
 
 @admin.register(Diagnosis)
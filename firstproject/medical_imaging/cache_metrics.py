@@ -0,0 +1,209 @@
+"""
+Image cache instrumentation.
+Provides:
+- Per-variant counters: hits, misses, storage hits, bytes served
+- Generation and storage-fetch counts and latency totals
+- Aggregation of per-process counters across workers through Redis INCRBY,
+  pipelined and flushed by a background thread (never on a request)
+- Prometheus text exposition of the aggregated counters
+
+Redis INFO keyspace_hits mixes sessions, throttling, locks and images; these
+counters only cover image lookups, per variant, so TTLs and cache size can be
+tuned from them. Latencies are kept as integer microseconds so every counter
+can be aggregated with INCR.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict
+
+from django.conf import settings
+
+from .tiered_cache import image_cache
+
+logger = logging.getLogger(__name__)
+
+
+class CacheMetrics:
+    """
+    Per-variant image cache counters, flushed periodically to Redis.
+
+    Recording a value only updates this process's counters under a lock, so
+    it is safe on the event loop of the ASGI views. A daemon thread, started
+    on first use in each process, adds them to the Redis totals every
+    flush_interval seconds in a single pipeline.
+    """
+
+    KEY_PREFIX = "img_metrics"
+
+    # Variants reported by snapshot() and /metrics
+    VARIANTS = ('thumb', 'preview', 'webp', 'full', 'render', 'tile', 'rendition')
+
+    COUNTERS = (
+        'hits', 'misses', 'storage_hits', 'bytes_served',
+        'generations', 'generation_us', 'storage_fetches', 'storage_fetch_us',
+    )
+
+    # Timed operations: name -> count counter (durations go to '<name>_us')
+    OPERATIONS = {'generation': 'generations', 'storage_fetch': 'storage_fetches'}
+
+    def __init__(self, flush_interval: float):
+        """
+        Args:
+            flush_interval: Seconds between background flushes of pending counters
+                to Redis (0 disables them; flush() and snapshot() still flush)
+        """
+        self.flush_interval = flush_interval
+        self._pending = defaultdict(int)
+        self._lock = threading.Lock()
+        self._flusher_pid = None
+
+    def incr(self, variant: str, counter: str, amount: int = 1) -> None:
+        """
+        Add to a counter of this process.
+
+        Args:
+            variant: Variant name (e.g. 'thumb')
+            counter: One of COUNTERS
+            amount: Increment
+        """
+        if not amount:
+            return
+        with self._lock:
+            self._pending[(variant, counter)] += amount
+        self._ensure_flusher()
+
+    def lookup(self, variant: str, hit: bool, value: bytes = None) -> None:
+        """Record a cache lookup and the bytes it served."""
+        self.incr(variant, 'hits' if hit else 'misses')
+        if value:
+            self.incr(variant, 'bytes_served', len(value))
+
+    @contextmanager
+    def timed(self, variant: str, operation: str):
+        """
+        Count an operation and add its duration.
+
+        Args:
+            variant: Variant name
+            operation: 'generation' or 'storage_fetch'
+        """
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.incr(variant, self.OPERATIONS[operation])
+            self.incr(variant, f'{operation}_us', int((time.monotonic() - started) * 1_000_000))
+
+    def _key(self, variant: str, counter: str) -> str:
+        return f"{self.KEY_PREFIX}:{variant}:{counter}"
+
+    def _ensure_flusher(self) -> None:
+        """Start the background flush thread of this process if needed."""
+        pid = os.getpid()
+        if self.flush_interval <= 0 or self._flusher_pid == pid:
+            return
+        with self._lock:
+            if self._flusher_pid == pid:
+                return
+            if self._flusher_pid is not None:
+                # Forked worker: the inherited counts are flushed by the parent
+                self._pending = defaultdict(int)
+            self._flusher_pid = pid
+        threading.Thread(target=self._run_flusher, name='cache-metrics-flush', daemon=True).start()
+        atexit.register(self.flush)
+
+    def _run_flusher(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self) -> None:
+        """Add pending counters of this process to the Redis totals (one round trip)."""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+        if not pending:
+            return
+
+        try:
+            image_cache.incr_many({
+                self._key(variant, counter): amount for (variant, counter), amount in pending.items()
+            })
+        except Exception as e:
+            logger.warning(f"Could not flush {len(pending)} cache metrics: {str(e)}")
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """
+        Counters aggregated over all processes (after flushing this one).
+
+        Returns:
+            dict: variant -> counters, plus hit_rate and average latencies in ms
+        """
+        self.flush()
+        keys = {
+            (variant, counter): self._key(variant, counter)
+            for variant in self.VARIANTS for counter in self.COUNTERS
+        }
+        values = image_cache.redis.get_many(keys.values())
+
+        snapshot = {}
+        for variant in self.VARIANTS:
+            counters = {counter: int(values.get(keys[(variant, counter)], 0)) for counter in self.COUNTERS}
+            lookups = counters['hits'] + counters['misses']
+            counters['hit_rate'] = round(counters['hits'] / lookups, 4) if lookups else None
+            for operation, count_counter in self.OPERATIONS.items():
+                count = counters[count_counter]
+                counters[f'avg_{operation}_ms'] = (
+                    round(counters[f'{operation}_us'] / count / 1000, 2) if count else None
+                )
+            snapshot[variant] = counters
+
+        return snapshot
+
+    def prometheus(self) -> str:
+        """
+        Aggregated counters in the Prometheus text exposition format.
+
+        Returns:
+            str: Metrics text (version 0.0.4)
+        """
+        snapshot = self.snapshot()
+        families = [
+            ('image_cache_lookups_total', 'Image cache lookups by variant and result',
+             lambda counters: [({'result': 'hit'}, counters['hits']), ({'result': 'miss'}, counters['misses'])]),
+            ('image_cache_storage_hits_total', 'Cache misses served from precomputed renditions',
+             lambda counters: [({}, counters['storage_hits'])]),
+            ('image_cache_bytes_served_total', 'Bytes returned by image cache lookups',
+             lambda counters: [({}, counters['bytes_served'])]),
+            ('image_cache_generations_total', 'Renditions generated from the original image',
+             lambda counters: [({}, counters['generations'])]),
+            ('image_cache_generation_seconds_total', 'Time spent generating renditions',
+             lambda counters: [({}, counters['generation_us'] / 1_000_000)]),
+            ('image_cache_storage_fetches_total', 'Reads of renditions and images from storage',
+             lambda counters: [({}, counters['storage_fetches'])]),
+            ('image_cache_storage_fetch_seconds_total', 'Time spent reading from storage',
+             lambda counters: [({}, counters['storage_fetch_us'] / 1_000_000)]),
+        ]
+
+        lines = []
+        for name, description, samples in families:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} counter")
+            for variant, counters in snapshot.items():
+                for labels, value in samples(counters):
+                    label_text = ','.join(
+                        f'{label}="{label_value}"' for label, label_value in {'variant': variant, **labels}.items()
+                    )
+                    lines.append(f"{name}{{{label_text}}} {value}")
+
+        return '\n'.join(lines) + '\n'
+
+
+# Shared instance for this process
+cache_metrics = CacheMetrics(
+    flush_interval=getattr(settings, 'IMAGE_CACHE_METRICS_FLUSH_INTERVAL', 10),
+)
@@ -23,6 +23,17 @@ logger = logging.getLogger(__name__)
 class DicomParsingService:
     """Service for parsing DICOM files and extracting medical imaging data."""
 
+    # Standard display presets: (window center, window width) in Hounsfield units
+    WINDOW_PRESETS = {
+        'lung': (-600.0, 1500.0),
+        'bone': (400.0, 1800.0),
+        'soft_tissue': (40.0, 400.0),
+        'brain': (40.0, 80.0),
+    }
+
+    # Elements per slab when applying lookup tables to a volume
+    LUT_SLAB_SIZE = 1 << 20
+
     @staticmethod
     def is_dicom_file(file_path_or_bytes) -> bool:
         """
@@ -169,7 +180,12 @@ class DicomParsingService:
             rescale_slope = float(dicom_dataset.get('RescaleSlope', 1))
 
             if rescale_slope != 1 or rescale_intercept != 0:
-                pixels = pixels * rescale_slope + rescale_intercept
+                # float32 is ample for 16-bit sources and halves memory vs float64
+                pixels = pixels.astype(np.float32)
+                if rescale_slope != 1:
+                    pixels *= rescale_slope
+                if rescale_intercept != 0:
+                    pixels += rescale_intercept
 
             return pixels
 
@@ -191,14 +207,197 @@ class DicomParsingService:
         Returns:
             numpy.ndarray: Windowed pixel data (0-255 range)
         """
-        lower = window_center - window_width / 2
-        upper = window_center + window_width / 2
+        return DicomParsingService._apply_windowing(pixels, window_center, window_width)
+
+    @staticmethod
+    def _window_into(values: np.ndarray, window_center: float, window_width: float,
+                     out: np.ndarray) -> np.ndarray:
+        """
+        Window float32 values into a scratch buffer (in place, no temporaries).
+
+        Widths below 1 are clamped to 1 so degenerate windows cannot divide by zero.
+
+        Args:
+            values: float32 input values (already rescaled)
+            window_center: Center of the intensity window
+            window_width: Width of the intensity window
+            out: float32 scratch buffer with the same shape as values
+
+        Returns:
+            numpy.ndarray: out, holding values in the 0-255 range
+        """
+        width = max(float(window_width), 1.0)
+        lower = float(window_center) - width / 2
+
+        np.subtract(values, lower, out=out)
+        out *= 255.0 / width
+        np.clip(out, 0, 255, out=out)
+        return out
+
+    @staticmethod
+    def _apply_windowing(pixels: np.ndarray, window_center: float, window_width: float,
+                         rescale_intercept: float = 0.0, rescale_slope: float = 1.0) -> np.ndarray:
+        """
+        Window a single array using float32 in-place math.
+
+        Args:
+            pixels: Input pixel array (stored values or already rescaled)
+            window_center: Center of the intensity window
+            window_width: Width of the intensity window
+            rescale_intercept: Rescale intercept to apply first (default none)
+            rescale_slope: Rescale slope to apply first (default none)
+
+        Returns:
+            numpy.ndarray: uint8 windowed pixel data
+        """
+        values = np.array(pixels, dtype=np.float32)
+        if rescale_slope != 1:
+            values *= rescale_slope
+        if rescale_intercept != 0:
+            values += rescale_intercept
+
+        return DicomParsingService._window_into(values, window_center, window_width, values).astype(np.uint8)
+
+    @staticmethod
+    def _normalize_to_uint8(pixels: np.ndarray) -> np.ndarray:
+        """
+        Stretch the full pixel range to 0-255.
+        Constant images (zero range) map to black instead of dividing by zero.
+
+        Args:
+            pixels: Input pixel array
+
+        Returns:
+            numpy.ndarray: uint8 pixel data
+        """
+        lower = float(pixels.min())
+        value_range = float(pixels.max()) - lower
+
+        if value_range == 0:
+            return np.zeros(pixels.shape, dtype=np.uint8)
+
+        values = np.array(pixels, dtype=np.float32)
+        values -= lower
+        values *= 255.0 / value_range
+        return values.astype(np.uint8)
+
+    @classmethod
+    def resolve_window_presets(cls, presets=None) -> Dict[str, Tuple[float, float]]:
+        """
+        Resolve a preset selection into (center, width) pairs.
+
+        Args:
+            presets: None for all WINDOW_PRESETS, a list of preset names,
+                or a dict of name -> (center, width)
+
+        Returns:
+            dict: Preset name -> (center, width)
+
+        Raises:
+            ValueError: If a preset name is unknown
+        """
+        if presets is None:
+            return dict(cls.WINDOW_PRESETS)
+        if isinstance(presets, dict):
+            return {name: (float(c), float(w)) for name, (c, w) in presets.items()}
+
+        unknown = [name for name in presets if name not in cls.WINDOW_PRESETS]
+        if unknown:
+            raise ValueError(f"Unknown window preset(s): {', '.join(unknown)}")
+        return {name: cls.WINDOW_PRESETS[name] for name in presets}
+
+    @staticmethod
+    def build_series_volume(dicom_datasets) -> Tuple[np.ndarray, float, float]:
+        """
+        Stack the slices of a series into one 3D array of stored values.
+
+        Slices are ordered by InstanceNumber. When every slice shares the same
+        rescale slope/intercept the raw integer data is kept (so rendering can
+        use lookup tables); otherwise each slice is rescaled to float32 and
+        the returned slope/intercept are identity.
+
+        Args:
+            dicom_datasets: Parsed DICOM datasets of one series
+
+        Returns:
+            tuple: (volume, rescale_slope, rescale_intercept)
+        """
+        datasets = sorted(dicom_datasets, key=lambda ds: int(ds.get('InstanceNumber', 0) or 0))
+        rescales = {
+            (float(ds.get('RescaleSlope', 1)), float(ds.get('RescaleIntercept', 0)))
+            for ds in datasets
+        }
+
+        if len(rescales) == 1:
+            slope, intercept = rescales.pop()
+            return np.stack([ds.pixel_array for ds in datasets]), slope, intercept
 
-        # Clip and normalize to 0-255
-        windowed = np.clip(pixels, lower, upper)
-        windowed = ((windowed - lower) / (upper - lower) * 255).astype(np.uint8)
+        volume = np.stack([DicomParsingService.extract_pixel_array(ds) for ds in datasets]).astype(np.float32)
+        return volume, 1.0, 0.0
 
-        return windowed
+    @classmethod
+    def render_window_stack(cls, volume: np.ndarray, presets=None, rescale_slope: float = 1.0,
+                            rescale_intercept: float = 0.0, invert: bool = False) -> Dict[str, np.ndarray]:
+        """
+        Render a whole series volume for several window presets in one batched pass.
+
+        8/16-bit integer volumes go through a lookup table per preset: the
+        rescale and window math runs once per possible stored value (at most
+        65536 entries), then each rendition is a single gather over the
+        volume. Other dtypes are rescaled once into a float32 buffer and each
+        preset is windowed into one reused scratch buffer.
+
+        Args:
+            volume: 2D slice or 3D (slices, rows, columns) array of stored values
+            presets: Preset selection (see resolve_window_presets)
+            rescale_slope: Rescale slope of the stored values
+            rescale_intercept: Rescale intercept of the stored values
+            invert: Invert output (MONOCHROME1)
+
+        Returns:
+            dict: Preset name -> uint8 array with the same shape as volume
+        """
+        presets = cls.resolve_window_presets(presets)
+        volume = np.asarray(volume)
+        renditions = {}
+
+        if volume.dtype.kind in 'iu' and volume.dtype.itemsize <= 2:
+            # View signed data as unsigned so stored values index the LUT directly
+            index = volume.view(np.dtype(f'u{volume.dtype.itemsize}'))
+            values = np.arange(2 ** (8 * volume.dtype.itemsize), dtype=index.dtype)
+            values = values.view(volume.dtype).astype(np.float32)
+        else:
+            index = None
+            values = volume.astype(np.float32)
+
+        # Rescale exactly once, shared by every preset
+        if rescale_slope != 1:
+            values *= rescale_slope
+        if rescale_intercept != 0:
+            values += rescale_intercept
+
+        scratch = np.empty_like(values)
+        for name, (window_center, window_width) in presets.items():
+            windowed = cls._window_into(values, window_center, window_width, scratch).astype(np.uint8)
+            if invert:
+                np.subtract(255, windowed, out=windowed)
+            renditions[name] = windowed
+
+        if index is None:
+            return renditions
+
+        # Apply every LUT slab by slab so the index is widened to intp once
+        # per slab (and stays in cache) instead of once per preset per volume
+        luts = renditions
+        renditions = {name: np.empty(volume.shape, dtype=np.uint8) for name in luts}
+        flat_index = index.reshape(-1)
+        flat_outputs = {name: out.reshape(-1) for name, out in renditions.items()}
+        for start in range(0, flat_index.size, cls.LUT_SLAB_SIZE):
+            slab = flat_index[start:start + cls.LUT_SLAB_SIZE].astype(np.intp)
+            for name, lut in luts.items():
+                np.take(lut, slab, out=flat_outputs[name][start:start + slab.size])
+
+        return renditions
 
     @staticmethod
     def dicom_to_pil_image(dicom_dataset: pydicom.Dataset, apply_window: bool = True) -> Optional[Image.Image]:
@@ -219,6 +418,27 @@ class DicomParsingService:
             if pixels is None:
                 return None
 
+            return DicomParsingService.pixels_to_pil_image(dicom_dataset, pixels, apply_window)
+
+        except Exception as e:
+            logger.error(f"Error converting DICOM to PIL Image: {str(e)}")
+            return None
+
+    @staticmethod
+    def pixels_to_pil_image(dicom_dataset: pydicom.Dataset, pixels: np.ndarray,
+                            apply_window: bool = True) -> Optional[Image.Image]:
+        """
+        Convert already-extracted (rescaled) pixel data to a PIL Image.
+
+        Args:
+            dicom_dataset: Parsed DICOM dataset (for window and photometric tags)
+            pixels: Pixel array from extract_pixel_array
+            apply_window: Whether to apply windowing (default True for CT/MRI)
+
+        Returns:
+            PIL.Image: Converted image or None
+        """
+        try:
             # Apply windowing if requested and available
             if apply_window:
                 window_center = dicom_dataset.get('WindowCenter', None)
@@ -239,10 +459,10 @@ class DicomParsingService:
                     pixels = DicomParsingService.apply_windowing(pixels, window_center, window_width)
                 else:
                     # No windowing info - normalize to 0-255
-                    pixels = ((pixels - pixels.min()) / (pixels.max() - pixels.min()) * 255).astype(np.uint8)
+                    pixels = DicomParsingService._normalize_to_uint8(pixels)
             else:
                 # Normalize without windowing
-                pixels = ((pixels - pixels.min()) / (pixels.max() - pixels.min()) * 255).astype(np.uint8)
+                pixels = DicomParsingService._normalize_to_uint8(pixels)
 
             # Handle photometric interpretation (grayscale vs RGB)
             photometric = str(dicom_dataset.get('PhotometricInterpretation', ''))
@@ -262,9 +482,67 @@ class DicomParsingService:
             return image
 
         except Exception as e:
-            logger.error(f"Error converting DICOM to PIL Image: {str(e)}")
+            logger.error(f"Error converting DICOM pixels to PIL Image: {str(e)}")
             return None
 
+    @staticmethod
+    def ingest(source, jpeg_quality: int = 90) -> Dict:
+        """
+        Single-pass ingest of an uploaded file.
+
+        Reads the dataset once (with pixels), then derives detection,
+        metadata, rescaled pixels and the encoded JPEG rendition from that
+        one read. Nothing touches the filesystem: the source can be bytes,
+        an mmap of a staged file, or any seekable file-like object.
+
+        Args:
+            source: bytes-like object, mmap or file-like object
+            jpeg_quality: Quality of the encoded display rendition
+
+        Returns:
+            dict: 'is_dicom', 'dataset', 'metadata', 'pixels', 'image' (display
+            PIL Image) and 'rendition' (JPEG bytes). Fields that could not be
+            produced are None.
+        """
+        result = {
+            'is_dicom': False,
+            'dataset': None,
+            'metadata': None,
+            'pixels': None,
+            'image': None,
+            'rendition': None,
+        }
+
+        # mmap and file objects are read as they are; other sources need a file-like wrapper
+        fileobj = source if hasattr(source, 'read') else io.BytesIO(source)
+
+        try:
+            dicom_dataset = pydicom.dcmread(fileobj)
+        except Exception:
+            return result
+
+        result['is_dicom'] = True
+        result['dataset'] = dicom_dataset
+
+        try:
+            result['metadata'] = DicomParsingService.extract_metadata(dicom_dataset)
+        except Exception as e:
+            logger.error(f"Error extracting DICOM metadata: {str(e)}")
+            return result
+
+        result['pixels'] = DicomParsingService.extract_pixel_array(dicom_dataset)
+        if result['pixels'] is None:
+            return result
+
+        image = DicomParsingService.pixels_to_pil_image(dicom_dataset, result['pixels'])
+        if image is not None:
+            result['image'] = image
+            buffer = io.BytesIO()
+            image.save(buffer, 'JPEG', quality=jpeg_quality)
+            result['rendition'] = buffer.getvalue()
+
+        return result
+
     @staticmethod
     def get_formatted_date(dicom_date: str) -> Optional[str]:
         """
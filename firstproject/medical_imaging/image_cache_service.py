@@ -1,23 +1,45 @@
 """
 Image caching and compression service for medical imaging.
 Provides:
-- Redis caching for frequently accessed images
+- Two-tier caching (in-process LRU + uncompressed Redis) for frequently accessed images
 - Progressive image loading (thumbnails + full quality)
 - Image compression (DICOM to JPEG/WebP)
+- Durable rendition pyramid (thumbnail/preview/WebP/AVIF) generated at ingest
+- Shared-decode variant generation (one read and decode per image)
+- Batched thumbnail retrieval and sprite sheets for study grids
+- Stampede protection (single-flight misses, early refresh) for renditions
+- Version-aware, content-addressed keys with O(1) study/hospital/version invalidation
+- Per-variant hit/miss, latency and bytes-served metrics
+- Async access for ASGI views (non-blocking cache reads, bounded worker pool)
+- Prefetching of renditions ahead of requests
 - Performance optimization for large DICOM files
 """
+import asyncio
+import functools
 import hashlib
 import io
+import json
 import logging
-from typing import Optional, Tuple
-from PIL import Image
-from django.core.cache import cache
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+from PIL import Image, features
+from django.conf import settings
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from decouple import config
 
+from .cache_metrics import cache_metrics
+from .storage_service import StorageService
+from .tiered_cache import image_cache as cache
+
 logger = logging.getLogger(__name__)
 
+# Bounded pool for blocking storage reads and Pillow work of the async image views
+image_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'IMAGE_ASYNC_WORKERS', 16), thread_name_prefix='image-io'
+)
+
 
 class ImageCacheService:
     """Service for caching and optimizing medical images."""
@@ -26,6 +48,19 @@ class ImageCacheService:
     THUMBNAIL_PREFIX = "img_thumb"
     FULL_IMAGE_PREFIX = "img_full"
     COMPRESSED_PREFIX = "img_comp"
+    SPRITE_PREFIX = "img_sprite"
+    GENERATION_PREFIX = "img_gen"
+
+    # Storage prefix for precomputed renditions
+    RENDITIONS_PREFIX = "renditions"
+
+    # Rendition variants: name -> (file extension, content type)
+    RENDITION_VARIANTS = {
+        'thumb': ('jpg', 'image/jpeg'),
+        'preview': ('jpg', 'image/jpeg'),
+        'webp': ('webp', 'image/webp'),
+        'avif': ('avif', 'image/avif'),
+    }
 
     # Image sizes
     THUMBNAIL_SIZE = (200, 200)
@@ -34,14 +69,26 @@ class ImageCacheService:
     # Compression quality
     JPEG_QUALITY = 85
     WEBP_QUALITY = 80
+    AVIF_QUALITY = 60
+    AVIF_SPEED = 8  # 0 (slowest, smallest) - 10 (fastest)
+
+    # Thumbnail cells per sprite sheet row
+    SPRITE_COLUMNS = 10
 
     # Cache TTLs (in seconds)
     THUMBNAIL_TTL = 86400  # 24 hours
     FULL_IMAGE_TTL = 3600   # 1 hour
     COMPRESSED_TTL = 7200   # 2 hours
 
+    # Variants generated together on a cache miss: name -> (cache prefix, TTL)
+    LAZY_VARIANTS = {
+        'thumb': (THUMBNAIL_PREFIX, THUMBNAIL_TTL),
+        'preview': (COMPRESSED_PREFIX, COMPRESSED_TTL),
+        'webp': (COMPRESSED_PREFIX, COMPRESSED_TTL),
+    }
+
     @staticmethod
-    def _generate_cache_key(prefix: str, file_path: str, size: Optional[str] = None) -> str:
+    def _generate_cache_key(prefix: str, file_path: str, size: Optional[str] = None, namespace: str = '') -> str:
         """
         Generate a unique cache key for an image.
 
@@ -49,17 +96,116 @@ class ImageCacheService:
             prefix: Cache key prefix
             file_path: Path to the image file
             size: Optional size descriptor (e.g., 'thumbnail', 'preview')
+            namespace: Optional namespace from cache_namespace()
 
         Returns:
             str: Cache key
         """
         # Create a hash of the file path for consistent keys
         path_hash = hashlib.md5(file_path.encode()).hexdigest()
+        if namespace:
+            prefix = f"{prefix}:{namespace}"
 
         if size:
             return f"{prefix}:{path_hash}:{size}"
         return f"{prefix}:{path_hash}"
 
+    @classmethod
+    def _generation_key(cls, scope: str, scope_id) -> str:
+        return f"{cls.GENERATION_PREFIX}:{scope}:{scope_id}"
+
+    @classmethod
+    def _scope_keys(cls, study_id: int, hospital_id: Optional[int], processing_version: str) -> list:
+        return [
+            cls._generation_key('version', processing_version or '-'),
+            cls._generation_key('hospital', hospital_id),
+            cls._generation_key('study', study_id),
+        ]
+
+    @staticmethod
+    def _format_scope(study_id, hospital_id, processing_version, generations: list) -> str:
+        version_gen, hospital_gen, study_gen = generations
+        return (
+            f"{processing_version or '-'}.{version_gen}:"
+            f"h{hospital_id}.{hospital_gen}:s{study_id}.{study_gen}"
+        )
+
+    @classmethod
+    def scope_namespace(cls, study_id: int, hospital_id: Optional[int] = None, processing_version: str = '') -> str:
+        """
+        Cache namespace of a study: its processing version and the current
+        generation of the version, hospital and study counters.
+
+        Bumping any of those counters (invalidate_study, invalidate_hospital,
+        invalidate_processing_version) changes the namespace, so every key
+        built from it is orphaned at once without enumerating keys.
+
+        Args:
+            study_id: ImagingStudy id
+            hospital_id: Hospital id of the study's patient
+            processing_version: Processing version that produced the study's images
+
+        Returns:
+            str: Namespace for _generate_cache_key
+        """
+        keys = cls._scope_keys(study_id, hospital_id, processing_version)
+        generations = cache.get_generations(keys)
+        return cls._format_scope(study_id, hospital_id, processing_version, [generations[key] for key in keys])
+
+    @classmethod
+    async def ascope_namespace(cls, study_id: int, hospital_id: Optional[int] = None,
+                               processing_version: str = '') -> str:
+        """Async scope_namespace (non-blocking Redis read)."""
+        keys = cls._scope_keys(study_id, hospital_id, processing_version)
+        generations = await cache.aget_generations(keys)
+        return cls._format_scope(study_id, hospital_id, processing_version, [generations[key] for key in keys])
+
+    @staticmethod
+    def content_namespace(scope: str, content_hash: str = '') -> str:
+        """Extend a study namespace with an image's content digest (if known)."""
+        return f"{scope}:{content_hash[:16]}" if content_hash else scope
+
+    @classmethod
+    def cache_namespace(cls, image) -> str:
+        """
+        Cache namespace of a DicomImage (select_related('study__patient')
+        avoids extra queries).
+
+        Args:
+            image: DicomImage instance
+
+        Returns:
+            str: Namespace for the image's cache keys
+        """
+        study = image.study
+        scope = cls.scope_namespace(study.id, study.patient.hospital_id, study.processing_version)
+        return cls.content_namespace(scope, image.image_sha256)
+
+    @classmethod
+    async def acache_namespace(cls, image) -> str:
+        """Async cache_namespace (the study and patient must be select_related)."""
+        study = image.study
+        scope = await cls.ascope_namespace(study.id, study.patient.hospital_id, study.processing_version)
+        return cls.content_namespace(scope, image.image_sha256)
+
+    @classmethod
+    def invalidate_study(cls, study_id: int) -> None:
+        """Invalidate every cached rendition of a study (one Redis SET)."""
+        cache.bump_generation(cls._generation_key('study', study_id))
+        logger.info(f"Invalidated cached renditions of study {study_id}")
+
+    @classmethod
+    def invalidate_hospital(cls, hospital_id: int) -> None:
+        """Invalidate every cached rendition of a hospital's studies (one Redis SET)."""
+        cache.bump_generation(cls._generation_key('hospital', hospital_id))
+        logger.info(f"Invalidated cached renditions of hospital {hospital_id}")
+
+    @classmethod
+    def invalidate_processing_version(cls, processing_version: str) -> None:
+        """Invalidate every cached rendition produced by a processing version (one Redis SET)."""
+        cache.bump_generation(cls._generation_key('version', processing_version or '-'))
+        logger.info(f"Invalidated cached renditions of processing version {processing_version}")
+
     @staticmethod
     def _load_image_from_storage(file_path: str) -> Optional[Image.Image]:
         """
@@ -79,11 +225,8 @@ class ImageCacheService:
             # Open with PIL
             image = Image.open(io.BytesIO(image_data))
 
-            # Convert to RGB if necessary (DICOM files might be grayscale)
-            if image.mode not in ('RGB', 'RGBA'):
-                image = image.convert('RGB')
-
-            return image
+            # Grayscale (DICOM renditions) stays single-channel
+            return ImageCacheService._prepare_mode(image)
         except Exception as e:
             logger.error(f"Error loading image from {file_path}: {str(e)}")
             return None
@@ -109,93 +252,252 @@ class ImageCacheService:
         if format in ('JPEG', 'WEBP'):
             save_kwargs['quality'] = quality
             save_kwargs['optimize'] = True
+        elif format == 'AVIF':
+            save_kwargs['quality'] = quality
+            save_kwargs['speed'] = ImageCacheService.AVIF_SPEED
 
         image.save(buffer, **save_kwargs)
         return buffer.getvalue()
 
     @classmethod
-    def get_thumbnail(cls, file_path: str, force_regenerate: bool = False) -> Optional[bytes]:
+    def _rendition_key(cls, file_path: str, variant: str) -> str:
         """
-        Get or generate a thumbnail for an image.
+        Build the storage key of a precomputed rendition.
 
         Args:
             file_path: Path to the original image
-            force_regenerate: Force regeneration even if cached
+            variant: Rendition variant name (see RENDITION_VARIANTS)
 
         Returns:
-            bytes: Thumbnail image data (JPEG format)
+            str: Storage key of the rendition
         """
-        cache_key = cls._generate_cache_key(cls.THUMBNAIL_PREFIX, file_path, 'thumb')
+        path_hash = hashlib.md5(file_path.encode()).hexdigest()
+        extension = cls.RENDITION_VARIANTS[variant][0]
+        return f"{cls.RENDITIONS_PREFIX}/{path_hash[:2]}/{path_hash}/{variant}.{extension}"
 
-        # Try to get from cache
-        if not force_regenerate:
-            cached_thumbnail = cache.get(cache_key)
-            if cached_thumbnail:
-                logger.debug(f"Thumbnail cache HIT for {file_path}")
-                return cached_thumbnail
+    @staticmethod
+    def _prepare_mode(image: Image.Image) -> Image.Image:
+        """
+        Normalize the image mode for encoding.
+        Grayscale stays single-channel 'L' (a third of the memory and encode
+        work of RGB); everything else becomes RGB.
+        """
+        if image.mode in ('L', 'RGB'):
+            return image
+        if image.mode in ('1', 'LA', 'I', 'I;16', 'F'):
+            return image.convert('L')
+        return image.convert('RGB')
 
-        logger.debug(f"Thumbnail cache MISS for {file_path}")
+    @classmethod
+    def generate_variants(cls, image: Image.Image, variants: Iterable[str] = None) -> Dict[str, bytes]:
+        """
+        Derive several renditions from a single decoded image.
 
-        # Load original image
-        image = cls._load_image_from_storage(file_path)
-        if not image:
-            return None
+        Full-resolution variants are encoded from the source; smaller sizes
+        cascade (preview from the source, thumbnail from the preview) rather
+        than each resizing from full resolution.
+
+        Args:
+            image: Decoded PIL Image (full resolution)
+            variants: Variant names to produce (default: LAZY_VARIANTS).
+                AVIF is skipped if Pillow lacks AVIF support.
+
+        Returns:
+            dict: Variant name -> encoded bytes
+        """
+        variants = set(cls.LAZY_VARIANTS if variants is None else variants)
+        image = cls._prepare_mode(image)
+        renditions = {}
+
+        if 'webp' in variants:
+            renditions['webp'] = cls._image_to_bytes(image, 'WEBP', cls.WEBP_QUALITY)
+        if 'avif' in variants and features.check('avif'):
+            renditions['avif'] = cls._image_to_bytes(image, 'AVIF', cls.AVIF_QUALITY)
+
+        current = image
+        for variant, size in (('preview', cls.PREVIEW_SIZE), ('thumb', cls.THUMBNAIL_SIZE)):
+            if not variants.intersection(('preview', 'thumb')):
+                break
+            if current.width > size[0] or current.height > size[1]:
+                if current is image:
+                    current = image.copy()
+                current.thumbnail(size, Image.Resampling.LANCZOS)
+            if variant in variants:
+                renditions[variant] = cls._image_to_bytes(current, 'JPEG', cls.JPEG_QUALITY)
+            variants.discard(variant)
+
+        return renditions
+
+    @classmethod
+    def store_renditions(cls, file_path: str, renditions: Dict[str, bytes]) -> None:
+        """
+        Write precomputed renditions to durable storage next to the original.
 
-        # Generate thumbnail
-        image.thumbnail(cls.THUMBNAIL_SIZE, Image.Resampling.LANCZOS)
+        Only ingest and reprocessing write renditions; request-path misses
+        are cached but never stored.
 
-        # Convert to bytes
-        thumbnail_bytes = cls._image_to_bytes(image, 'JPEG', cls.JPEG_QUALITY)
+        Args:
+            file_path: Path to the original image
+            renditions: Variant name -> encoded bytes
+        """
+        for variant, data in renditions.items():
+            # Keys are deterministic: replace in place, never save a suffixed copy
+            StorageService.write_replacing(cls._rendition_key(file_path, variant), data)
 
-        # Cache it
-        cache.set(cache_key, thumbnail_bytes, cls.THUMBNAIL_TTL)
+    @classmethod
+    def _read_rendition(cls, file_path: str, variant: str) -> Optional[bytes]:
+        """
+        Read a precomputed rendition from durable storage.
 
-        logger.info(f"Generated and cached thumbnail for {file_path}")
-        return thumbnail_bytes
+        Returns:
+            bytes: Rendition data, or None if it was never generated
+        """
+        try:
+            with cache_metrics.timed(variant, 'storage_fetch'):
+                with default_storage.open(cls._rendition_key(file_path, variant), 'rb') as f:
+                    data = f.read()
+        except Exception:
+            return None
+
+        cache_metrics.incr(variant, 'storage_hits')
+        return data
 
     @classmethod
-    def get_preview(cls, file_path: str, force_regenerate: bool = False) -> Optional[bytes]:
+    def delete_renditions(cls, file_path: str) -> None:
         """
-        Get or generate a preview (medium size) for an image.
+        Delete all precomputed renditions of an image.
 
         Args:
             file_path: Path to the original image
+        """
+        for variant in cls.RENDITION_VARIANTS:
+            try:
+                default_storage.delete(cls._rendition_key(file_path, variant))
+            except Exception as e:
+                logger.warning(f"Could not delete {variant} rendition of {file_path}: {str(e)}")
+
+    @classmethod
+    def _get_variant(cls, file_path: str, variant: str, force_regenerate: bool = False,
+                     namespace: str = '') -> Optional[bytes]:
+        """
+        Get one rendition: Redis, then durable storage, then generation.
+
+        A generation miss decodes the original once and derives all
+        LAZY_VARIANTS from it, so the sibling requests a viewer makes for the
+        same image (thumbnail, preview, WebP) do not reload it.
+
+        Misses are single-flight: when many requests miss the same key at
+        once (a popular study opened after expiry), one of them loads the
+        rendition and the rest wait for its result. Hot keys are refreshed
+        early, before they expire, by one request chosen at random.
+
+        Args:
+            file_path: Path to the original image
+            variant: Variant name ('thumb', 'preview' or 'webp')
             force_regenerate: Force regeneration even if cached
+            namespace: Cache namespace from cache_namespace()
 
         Returns:
-            bytes: Preview image data (JPEG format)
+            bytes: Rendition data or None if the image cannot be loaded
         """
-        cache_key = cls._generate_cache_key(cls.COMPRESSED_PREFIX, file_path, 'preview')
+        prefix, ttl = cls.LAZY_VARIANTS[variant]
+        cache_key = cls._generate_cache_key(prefix, file_path, variant, namespace)
 
-        # Try to get from cache
-        if not force_regenerate:
-            cached_preview = cache.get(cache_key)
-            if cached_preview:
-                logger.debug(f"Preview cache HIT for {file_path}")
-                return cached_preview
+        missed = []
 
-        logger.debug(f"Preview cache MISS for {file_path}")
+        def load() -> Optional[bytes]:
+            missed.append(True)
+            logger.debug(f"{variant} cache MISS for {file_path}")
+            if not force_regenerate:
+                # Precomputed at ingest: a single storage GET
+                stored = cls._read_rendition(file_path, variant)
+                if stored:
+                    logger.debug(f"Rendition storage HIT for {variant} of {file_path}")
+                    return stored
 
-        # Load original image
-        image = cls._load_image_from_storage(file_path)
-        if not image:
-            return None
+            return cls._generate_lazy_variants(file_path, variant, namespace)
 
-        # Resize to preview size if larger
-        if image.width > cls.PREVIEW_SIZE[0] or image.height > cls.PREVIEW_SIZE[1]:
-            image.thumbnail(cls.PREVIEW_SIZE, Image.Resampling.LANCZOS)
+        if force_regenerate:
+            data = cache.refresh(cache_key, load, ttl)
+        else:
+            data = cache.get_or_compute(cache_key, load, ttl)
 
-        # Convert to bytes
-        preview_bytes = cls._image_to_bytes(image, 'JPEG', cls.JPEG_QUALITY)
+        cache_metrics.lookup(variant, hit=not missed, value=data)
+        return data
 
-        # Cache it
-        cache.set(cache_key, preview_bytes, cls.COMPRESSED_TTL)
+    @classmethod
+    def _generate_lazy_variants(cls, file_path: str, variant: str, namespace: str = '') -> Optional[bytes]:
+        """
+        Decode the original once and cache all LAZY_VARIANTS.
 
-        logger.info(f"Generated and cached preview for {file_path}")
-        return preview_bytes
+        The requested variant is returned, not cached: the caller caches it
+        together with its recompute cost.
+
+        Args:
+            file_path: Path to the original image
+            variant: Variant the caller asked for
+            namespace: Cache namespace of the siblings
+
+        Returns:
+            bytes: Requested rendition or None if the image cannot be loaded
+        """
+        started = time.monotonic()
+
+        with cache_metrics.timed(variant, 'generation'):
+            # Load original image once for every variant
+            image = cls._load_image_from_storage(file_path)
+            if not image:
+                return None
+
+            renditions = cls.generate_variants(image)
+        delta = time.monotonic() - started
+
+        # Siblings are cached in bulk per TTL
+        siblings_by_ttl = {}
+        for name, data in renditions.items():
+            if name != variant:
+                sibling_prefix, sibling_ttl = cls.LAZY_VARIANTS[name]
+                siblings_by_ttl.setdefault(sibling_ttl, {})[
+                    cls._generate_cache_key(sibling_prefix, file_path, name, namespace)
+                ] = data
+        for sibling_ttl, entries in siblings_by_ttl.items():
+            cache.set_many(entries, sibling_ttl, delta=delta)
+
+        logger.info(f"Generated {', '.join(sorted(renditions))} for {file_path}")
+        return renditions[variant]
 
     @classmethod
-    def get_compressed_webp(cls, file_path: str, force_regenerate: bool = False) -> Optional[bytes]:
+    def get_thumbnail(cls, file_path: str, force_regenerate: bool = False, namespace: str = '') -> Optional[bytes]:
+        """
+        Get or generate a thumbnail for an image.
+
+        Args:
+            file_path: Path to the original image
+            force_regenerate: Force regeneration even if cached
+            namespace: Cache namespace from cache_namespace()
+
+        Returns:
+            bytes: Thumbnail image data (JPEG format)
+        """
+        return cls._get_variant(file_path, 'thumb', force_regenerate, namespace)
+
+    @classmethod
+    def get_preview(cls, file_path: str, force_regenerate: bool = False, namespace: str = '') -> Optional[bytes]:
+        """
+        Get or generate a preview (medium size) for an image.
+
+        Args:
+            file_path: Path to the original image
+            force_regenerate: Force regeneration even if cached
+            namespace: Cache namespace from cache_namespace()
+
+        Returns:
+            bytes: Preview image data (JPEG format)
+        """
+        return cls._get_variant(file_path, 'preview', force_regenerate, namespace)
+
+    @classmethod
+    def get_compressed_webp(cls, file_path: str, force_regenerate: bool = False, namespace: str = '') -> Optional[bytes]:
         """
         Get or generate a WebP compressed version of an image.
         WebP provides better compression than JPEG for web delivery.
@@ -203,61 +505,247 @@ class ImageCacheService:
         Args:
             file_path: Path to the original image
             force_regenerate: Force regeneration even if cached
+            namespace: Cache namespace from cache_namespace()
 
         Returns:
             bytes: WebP image data
         """
-        cache_key = cls._generate_cache_key(cls.COMPRESSED_PREFIX, file_path, 'webp')
+        return cls._get_variant(file_path, 'webp', force_regenerate, namespace)
 
-        # Try to get from cache
-        if not force_regenerate:
-            cached_webp = cache.get(cache_key)
-            if cached_webp:
-                logger.debug(f"WebP cache HIT for {file_path}")
-                return cached_webp
+    @classmethod
+    def prefetch_variant(cls, file_path: str, variant: str, namespace: str = '') -> bool:
+        """
+        Load a rendition into the cache ahead of a request for it.
 
-        logger.debug(f"WebP cache MISS for {file_path}")
+        Presence is checked without downloading the cached value, so
+        prefetching an already cached image costs one STRLEN.
 
-        # Load original image
-        image = cls._load_image_from_storage(file_path)
-        if not image:
-            return None
+        Args:
+            file_path: Path to the original image
+            variant: Variant name ('thumb', 'preview' or 'webp')
+            namespace: Cache namespace from cache_namespace()
+
+        Returns:
+            bool: True if the rendition was loaded, False if already cached or unavailable
+        """
+        prefix, _ = cls.LAZY_VARIANTS[variant]
+        if cache.sizes([cls._generate_cache_key(prefix, file_path, variant, namespace)]):
+            return False
+        return cls._get_variant(file_path, variant, False, namespace) is not None
+
+    @classmethod
+    async def run_blocking(cls, func, *args):
+        """
+        Run blocking storage I/O or Pillow work in the bounded image pool.
+
+        Async views await this instead of blocking the event loop; the pool
+        size (IMAGE_ASYNC_WORKERS) caps concurrent decodes and storage reads
+        however many requests are in flight.
+        """
+        return await asyncio.get_running_loop().run_in_executor(image_executor, functools.partial(func, *args))
+
+    @classmethod
+    async def aget_variant(cls, file_path: str, variant: str, namespace: str = '') -> Optional[bytes]:
+        """
+        Async _get_variant.
+
+        Cache hits are served from the local tier or one non-blocking Redis
+        read. Misses (and drawn early refreshes) run the synchronous path in
+        the image pool, so storage reads, decoding and encoding never block
+        the event loop and keep their single-flight locking.
+
+        Args:
+            file_path: Path to the original image
+            variant: Variant name ('thumb', 'preview' or 'webp')
+            namespace: Cache namespace from acache_namespace()
+
+        Returns:
+            bytes: Rendition data or None if the image cannot be loaded
+        """
+        prefix, _ = cls.LAZY_VARIANTS[variant]
+        cached = await cache.aget_fresh(cls._generate_cache_key(prefix, file_path, variant, namespace))
+        if cached:
+            # Local counters only (flushed by a background thread): safe on the event loop
+            cache_metrics.lookup(variant, hit=True, value=cached)
+            return cached
+
+        return await cls.run_blocking(cls._get_variant, file_path, variant, False, namespace)
+
+    @classmethod
+    async def aget_thumbnail(cls, file_path: str, namespace: str = '') -> Optional[bytes]:
+        """Async get_thumbnail."""
+        return await cls.aget_variant(file_path, 'thumb', namespace)
+
+    @classmethod
+    async def aget_preview(cls, file_path: str, namespace: str = '') -> Optional[bytes]:
+        """Async get_preview."""
+        return await cls.aget_variant(file_path, 'preview', namespace)
+
+    @classmethod
+    async def aget_compressed_webp(cls, file_path: str, namespace: str = '') -> Optional[bytes]:
+        """Async get_compressed_webp."""
+        return await cls.aget_variant(file_path, 'webp', namespace)
+
+    @classmethod
+    def _load_thumbnail(cls, file_path: str) -> Optional[bytes]:
+        """Thumbnail from durable storage, or generated (thumbnail only)."""
+        stored = cls._read_rendition(file_path, 'thumb')
+        if stored:
+            return stored
+
+        with cache_metrics.timed('thumb', 'generation'):
+            image = cls._load_image_from_storage(file_path)
+            if not image:
+                return None
+
+            renditions = cls.generate_variants(image, ['thumb'])
+        return renditions['thumb']
+
+    @classmethod
+    def get_thumbnails(cls, file_paths: Iterable[str], max_workers: int = 8,
+                       namespaces: Optional[Dict[str, str]] = None) -> Dict[str, bytes]:
+        """
+        Get thumbnails for many images at once.
+
+        One cache get_many covers every image; misses are loaded from
+        durable storage or generated in parallel threads (storage I/O and
+        Pillow both release the GIL), then cached with one set_many.
+
+        Args:
+            file_paths: Paths to the original images
+            max_workers: Threads used for cache misses
+            namespaces: Optional file_path -> cache namespace
+
+        Returns:
+            dict: file_path -> thumbnail bytes (images that failed to load are omitted)
+        """
+        file_paths = list(file_paths)
+        namespaces = namespaces or {}
+        keys = {
+            path: cls._generate_cache_key(cls.THUMBNAIL_PREFIX, path, 'thumb', namespaces.get(path, ''))
+            for path in file_paths
+        }
+
+        cached = cache.get_many(keys.values())
+        thumbnails = {path: cached[key] for path, key in keys.items() if key in cached}
 
-        # Convert to WebP
-        webp_bytes = cls._image_to_bytes(image, 'WEBP', cls.WEBP_QUALITY)
+        missing = [path for path in file_paths if path not in thumbnails]
+        cache_metrics.incr('thumb', 'hits', len(thumbnails))
+        cache_metrics.incr('thumb', 'misses', len(missing))
+        if missing:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(missing)))) as executor:
+                loaded = dict(zip(missing, executor.map(cls._load_thumbnail, missing)))
 
-        # Cache it
-        cache.set(cache_key, webp_bytes, cls.COMPRESSED_TTL)
+            loaded = {path: data for path, data in loaded.items() if data}
+            if loaded:
+                cache.set_many({keys[path]: data for path, data in loaded.items()}, cls.THUMBNAIL_TTL)
+            thumbnails.update(loaded)
+            logger.info(f"Thumbnail batch: {len(file_paths) - len(missing)} cached, {len(loaded)} loaded")
 
-        logger.info(f"Generated and cached WebP for {file_path}")
-        return webp_bytes
+        cache_metrics.incr('thumb', 'bytes_served', sum(len(data) for data in thumbnails.values()))
+        return thumbnails
 
     @classmethod
-    def get_full_image(cls, file_path: str) -> Optional[bytes]:
+    def build_sprite(cls, thumbnails: Iterable[Tuple[int, bytes]], columns: int = None) -> Tuple[bytes, list]:
+        """
+        Pack thumbnails into a single sprite sheet.
+
+        Each thumbnail is placed at the top-left of a THUMBNAIL_SIZE cell,
+        in order, SPRITE_COLUMNS cells per row.
+
+        Args:
+            thumbnails: (image_id, thumbnail bytes) pairs in display order
+            columns: Cells per row (default SPRITE_COLUMNS)
+
+        Returns:
+            tuple: (sprite JPEG bytes, list of tiles with 'id', 'x', 'y', 'width', 'height')
+        """
+        thumbnails = list(thumbnails)
+        columns = max(1, columns or cls.SPRITE_COLUMNS)
+        cell_width, cell_height = cls.THUMBNAIL_SIZE
+        rows = max(1, -(-len(thumbnails) // columns))
+
+        decoded = [(image_id, Image.open(io.BytesIO(data))) for image_id, data in thumbnails]
+        mode = 'L' if all(img.mode == 'L' for _, img in decoded) else 'RGB'
+        sprite = Image.new(mode, (min(len(decoded), columns) * cell_width or cell_width, rows * cell_height))
+
+        tiles = []
+        for index, (image_id, img) in enumerate(decoded):
+            x = (index % columns) * cell_width
+            y = (index // columns) * cell_height
+            sprite.paste(img.convert(mode), (x, y))
+            tiles.append({'id': image_id, 'x': x, 'y': y, 'width': img.width, 'height': img.height})
+
+        return cls._image_to_bytes(sprite, 'JPEG', cls.JPEG_QUALITY), tiles
+
+    @classmethod
+    def get_sprite(cls, images: Iterable[Tuple[int, str]], max_workers: int = 8,
+                   namespaces: Optional[Dict[str, str]] = None) -> Tuple[bytes, list]:
+        """
+        Get (or build and cache) the sprite sheet for a list of images.
+
+        The cache key covers every image id, file path and namespace, so a
+        changed image list, a reprocessed image or an invalidated study
+        yields a new sprite.
+
+        Args:
+            images: (image_id, file_path) pairs in display order
+            max_workers: Threads used for thumbnail cache misses
+            namespaces: Optional file_path -> cache namespace
+
+        Returns:
+            tuple: (sprite JPEG bytes, tile manifest as from build_sprite)
+        """
+        images = list(images)
+        namespaces = namespaces or {}
+        signature = '|'.join(
+            f"{image_id}:{file_path}:{namespaces.get(file_path, '')}" for image_id, file_path in images
+        )
+        sprite_key = cls._generate_cache_key(cls.SPRITE_PREFIX, signature, 'sprite')
+        tiles_key = cls._generate_cache_key(cls.SPRITE_PREFIX, signature, 'tiles')
+
+        cached = cache.get_many([sprite_key, tiles_key])
+        if sprite_key in cached and tiles_key in cached:
+            return cached[sprite_key], json.loads(cached[tiles_key])
+
+        thumbnails = cls.get_thumbnails([file_path for _, file_path in images], max_workers, namespaces)
+        sprite, tiles = cls.build_sprite(
+            (image_id, thumbnails[file_path]) for image_id, file_path in images if file_path in thumbnails
+        )
+
+        cache.set_many({sprite_key: sprite, tiles_key: json.dumps(tiles).encode()}, cls.THUMBNAIL_TTL)
+        return sprite, tiles
+
+    @classmethod
+    def get_full_image(cls, file_path: str, namespace: str = '') -> Optional[bytes]:
         """
         Get full-quality image with caching.
         This is for the original/highest quality version.
 
         Args:
             file_path: Path to the original image
+            namespace: Cache namespace from cache_namespace()
 
         Returns:
             bytes: Full image data
         """
-        cache_key = cls._generate_cache_key(cls.FULL_IMAGE_PREFIX, file_path)
+        cache_key = cls._generate_cache_key(cls.FULL_IMAGE_PREFIX, file_path, namespace=namespace)
 
         # Try to get from cache
         cached_image = cache.get(cache_key)
         if cached_image:
             logger.debug(f"Full image cache HIT for {file_path}")
+            cache_metrics.lookup('full', hit=True, value=cached_image)
             return cached_image
 
         logger.debug(f"Full image cache MISS for {file_path}")
 
         # Load from storage
         try:
-            with default_storage.open(file_path, 'rb') as f:
-                image_data = f.read()
+            with cache_metrics.timed('full', 'storage_fetch'):
+                with default_storage.open(file_path, 'rb') as f:
+                    image_data = f.read()
+            cache_metrics.lookup('full', hit=False, value=image_data)
 
             # Cache it (full images have shorter TTL to save memory)
             cache.set(cache_key, image_data, cls.FULL_IMAGE_TTL)
@@ -269,51 +757,55 @@ class ImageCacheService:
             return None
 
     @classmethod
-    def invalidate_cache(cls, file_path: str) -> None:
+    def _variant_keys(cls, file_path: str, namespace: str = '') -> Dict[str, str]:
+        return {
+            'thumbnail': cls._generate_cache_key(cls.THUMBNAIL_PREFIX, file_path, 'thumb', namespace),
+            'preview': cls._generate_cache_key(cls.COMPRESSED_PREFIX, file_path, 'preview', namespace),
+            'webp': cls._generate_cache_key(cls.COMPRESSED_PREFIX, file_path, 'webp', namespace),
+            'full': cls._generate_cache_key(cls.FULL_IMAGE_PREFIX, file_path, namespace=namespace),
+        }
+
+    @classmethod
+    def invalidate_cache(cls, file_path: str, namespace: str = '') -> None:
         """
         Invalidate all cached versions of an image.
-        Call this when an image is updated or deleted.
+        Call this when an image is updated or deleted. To drop a whole
+        study, hospital or processing version use the invalidate_*
+        generation methods instead.
+
+        Only cache keys are dropped: the renditions precomputed in durable
+        storage are not regenerated on demand, so they are kept and are
+        replaced by reprocessing (reprocess_study_images).
 
         Args:
             file_path: Path to the image file
+            namespace: Cache namespace from cache_namespace()
         """
-        # Generate all possible cache keys
-        keys_to_delete = [
-            cls._generate_cache_key(cls.THUMBNAIL_PREFIX, file_path, 'thumb'),
-            cls._generate_cache_key(cls.COMPRESSED_PREFIX, file_path, 'preview'),
-            cls._generate_cache_key(cls.COMPRESSED_PREFIX, file_path, 'webp'),
-            cls._generate_cache_key(cls.FULL_IMAGE_PREFIX, file_path),
-        ]
-
-        # Delete all
-        cache.delete_many(keys_to_delete)
+        cache.delete_many(cls._variant_keys(file_path, namespace).values())
         logger.info(f"Invalidated cache for {file_path}")
 
     @classmethod
-    def get_cache_stats(cls, file_path: str) -> dict:
+    def get_cache_stats(cls, file_path: str, namespace: str = '') -> dict:
         """
         Get cache statistics for an image.
-        Useful for debugging and monitoring.
+        Useful for debugging and monitoring. Sizes come from the cache
+        (STRLEN), no payload is downloaded.
 
         Args:
             file_path: Path to the image file
+            namespace: Cache namespace from cache_namespace()
 
         Returns:
             dict: Cache status for each variant
         """
-        keys = {
-            'thumbnail': cls._generate_cache_key(cls.THUMBNAIL_PREFIX, file_path, 'thumb'),
-            'preview': cls._generate_cache_key(cls.COMPRESSED_PREFIX, file_path, 'preview'),
-            'webp': cls._generate_cache_key(cls.COMPRESSED_PREFIX, file_path, 'webp'),
-            'full': cls._generate_cache_key(cls.FULL_IMAGE_PREFIX, file_path),
-        }
+        keys = cls._variant_keys(file_path, namespace)
+        sizes = cache.sizes(keys.values())
 
         stats = {}
         for variant, key in keys.items():
-            cached_data = cache.get(key)
             stats[variant] = {
-                'cached': cached_data is not None,
-                'size_bytes': len(cached_data) if cached_data else 0,
+                'cached': key in sizes,
+                'size_bytes': sizes.get(key, 0),
             }
 
         return stats
@@ -1,8 +1,19 @@
 """
 Optimized image serving views with caching and progressive loading.
+
+Thumbnail, preview, WebP, negotiated, tile and full-image views are async: under ASGI one
+worker multiplexes many in-flight image requests, awaiting Redis directly
+and running storage reads and Pillow work in a bounded thread pool.
 """
+import hashlib
 import logging
-from django.http import HttpResponse, JsonResponse
+import re
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.cache import cache_page
 from django.views.decorators.csrf import csrf_exempt
@@ -11,12 +22,26 @@ from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from .models import DicomImage
 from .image_cache_service import ImageCacheService
+from .prefetch_service import SlicePrefetchService
+from .cache_metrics import cache_metrics
+from .render_service import DicomRenderService, OriginalPixelsUnavailable
+from .rendition_service import NegotiatedRenditionService
+from .tiered_cache import image_cache
+from .tile_service import DeepZoomTileService, TileNotFound
 
 logger = logging.getLogger(__name__)
 
+# Chunk size for streaming full images from storage
+FULL_IMAGE_CHUNK_SIZE = 256 * 1024
+
+
+def _viewer_id(request):
+    """Identify the viewer for scroll tracking: session cookie, else client address."""
+    return request.COOKIES.get(settings.SESSION_COOKIE_NAME) or request.META.get('REMOTE_ADDR', '')
+
 
 @require_http_methods(["GET"])
-def serve_thumbnail(request, image_id):
+async def serve_thumbnail(request, image_id):
     """
     Serve a thumbnail version of an image (200x200).
     This is cached in Redis for fast subsequent access.
@@ -25,10 +50,12 @@ def serve_thumbnail(request, image_id):
     """
     try:
         # Get the image object
-        image = DicomImage.objects.select_related('study').get(id=image_id)
+        image = await DicomImage.objects.select_related('study__patient').aget(id=image_id)
 
         # Get thumbnail from cache or generate
-        thumbnail_bytes = ImageCacheService.get_thumbnail(image.image_file.name)
+        thumbnail_bytes = await ImageCacheService.aget_thumbnail(
+            image.image_file.name, namespace=await ImageCacheService.acache_namespace(image)
+        )
 
         if not thumbnail_bytes:
             return HttpResponse(
@@ -57,19 +84,25 @@ def serve_thumbnail(request, image_id):
 
 
 @require_http_methods(["GET"])
-def serve_preview(request, image_id):
+async def serve_preview(request, image_id):
     """
     Serve a preview version of an image (800x800).
     Good balance between quality and file size.
 
+    The previews of the next slices (by instance number, or by slice location
+    with ?order=slice_location) are prefetched in the background so scrolling
+    through the study is served from the cache; ?prefetch=0 disables this.
+
     Usage: GET /api/images/{image_id}/preview/
     """
     try:
         # Get the image object
-        image = DicomImage.objects.select_related('study').get(id=image_id)
+        image = await DicomImage.objects.select_related('study__patient').aget(id=image_id)
 
         # Get preview from cache or generate
-        preview_bytes = ImageCacheService.get_preview(image.image_file.name)
+        preview_bytes = await ImageCacheService.aget_preview(
+            image.image_file.name, namespace=await ImageCacheService.acache_namespace(image)
+        )
 
         if not preview_bytes:
             return HttpResponse(
@@ -78,6 +111,11 @@ def serve_preview(request, image_id):
                 content_type='text/plain'
             )
 
+        if request.GET.get('prefetch') != '0':
+            await SlicePrefetchService.aschedule(
+                image, 'preview', _viewer_id(request), request.GET.get('order', 'instance_number')
+            )
+
         # Return preview with appropriate headers
         response = HttpResponse(preview_bytes, content_type='image/jpeg')
         response['Content-Disposition'] = f'inline; filename="preview_{image_id}.jpg"'
@@ -98,7 +136,7 @@ def serve_preview(request, image_id):
 
 
 @require_http_methods(["GET"])
-def serve_webp(request, image_id):
+async def serve_webp(request, image_id):
     """
     Serve a WebP compressed version of an image.
     WebP provides better compression than JPEG for modern browsers.
@@ -107,10 +145,12 @@ def serve_webp(request, image_id):
     """
     try:
         # Get the image object
-        image = DicomImage.objects.select_related('study').get(id=image_id)
+        image = await DicomImage.objects.select_related('study__patient').aget(id=image_id)
 
         # Get WebP from cache or generate
-        webp_bytes = ImageCacheService.get_compressed_webp(image.image_file.name)
+        webp_bytes = await ImageCacheService.aget_compressed_webp(
+            image.image_file.name, namespace=await ImageCacheService.acache_namespace(image)
+        )
 
         if not webp_bytes:
             return HttpResponse(
@@ -139,27 +179,176 @@ def serve_webp(request, image_id):
 
 
 @require_http_methods(["GET"])
-def serve_full_image(request, image_id):
+async def serve_rendition(request, image_id):
     """
-    Serve the full-quality original image with caching.
-    This should be loaded on-demand (not automatically).
-
-    Usage: GET /api/images/{image_id}/full/
+    Serve an image in the smallest format the client accepts.
+    AVIF, JPEG XL (if available), WebP or JPEG is picked from the Accept
+    header; each format is cached separately and responses vary on Accept.
+
+    Usage: GET /api/images/{image_id}/rendition/?size=preview&quality=standard
+
+    Query params (all optional):
+        size: preview (default, 800x800) or full
+        quality: standard (per-modality profile, default), diagnostic
+            (near-lossless, no chroma subsampling) or lossless (WebP or PNG).
+            Diagnostic and lossless renditions of DICOM uploads are rendered
+            from the stored original (404 if none is stored).
     """
+    size = request.GET.get('size', 'preview')
+    quality = request.GET.get('quality', 'standard')
+    if size not in NegotiatedRenditionService.SIZES or quality not in NegotiatedRenditionService.PREFERENCES:
+        return HttpResponse(
+            "size must be preview or full; quality must be standard, diagnostic or lossless",
+            status=400,
+            content_type='text/plain'
+        )
+
+    fmt = NegotiatedRenditionService.negotiate(request.META.get('HTTP_ACCEPT'), quality)
+    if fmt is None:
+        response = HttpResponse("No acceptable image format", status=406, content_type='text/plain')
+        patch_vary_headers(response, ['Accept'])
+        return response
+
     try:
         # Get the image object
-        image = DicomImage.objects.select_related('study').get(id=image_id)
+        image = await DicomImage.objects.select_related('study__patient').aget(id=image_id)
 
-        # Get full image from cache or storage
-        image_bytes = ImageCacheService.get_full_image(image.image_file.name)
+        image_bytes = await NegotiatedRenditionService.aget_rendition(
+            image, fmt, size, quality, namespace=await ImageCacheService.acache_namespace(image)
+        )
 
         if not image_bytes:
             return HttpResponse(
-                "Error loading image",
+                "Error generating rendition",
                 status=500,
                 content_type='text/plain'
             )
 
+        # Return rendition with appropriate headers
+        response = HttpResponse(image_bytes, content_type=NegotiatedRenditionService.FORMATS[fmt][1])
+        patch_vary_headers(response, ['Accept'])
+        response['Content-Disposition'] = f'inline; filename="{image_id}.{fmt}"'
+        response['Cache-Control'] = 'public, max-age=7200'  # Cache for 2 hours
+        response['X-Cache-Source'] = 'redis'
+
+        return response
+
+    except DicomImage.DoesNotExist:
+        return HttpResponse("Image not found", status=404, content_type='text/plain')
+    except OriginalPixelsUnavailable:
+        return HttpResponse(
+            f"No original DICOM stored for {quality} renditions of this image",
+            status=404,
+            content_type='text/plain'
+        )
+    except Exception as e:
+        logger.error(f"Error serving rendition for image {image_id}: {str(e)}")
+        return HttpResponse(
+            "Internal server error",
+            status=500,
+            content_type='text/plain'
+        )
+
+
+def _hash_file(file_name):
+    """SHA-256 of a stored file, read in chunks."""
+    hasher = hashlib.sha256()
+    with default_storage.open(file_name, 'rb') as f:
+        for chunk in f.chunks(FULL_IMAGE_CHUNK_SIZE):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+async def _image_etag(image):
+    """
+    Strong ETag for an image file, from its stored content hash.
+    Rows ingested before hashes were recorded are hashed once here.
+    """
+    if not image.image_sha256:
+        image.image_sha256 = await ImageCacheService.run_blocking(_hash_file, image.image_file.name)
+        await DicomImage.objects.filter(pk=image.pk).aupdate(image_sha256=image.image_sha256)
+
+    return f'"{image.image_sha256}"'
+
+
+def _parse_range(range_header, size):
+    """
+    Parse a single-range 'bytes=' Range header.
+
+    Returns:
+        tuple: (start, end) inclusive, None to serve the whole file
+        (absent, malformed or multi-range headers), or False if unsatisfiable
+    """
+    match = re.fullmatch(r'bytes=(\d*)-(\d*)', range_header.strip())
+    if not match or match.groups() == ('', ''):
+        return None
+
+    start, end = match.groups()
+    if start == '':
+        # Suffix range: the last N bytes
+        length = int(end)
+        if length == 0:
+            return False
+        return max(0, size - length), size - 1
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+async def _stream_file(file_name, start, length):
+    """Yield a byte range of a stored file in chunks, reading in the image pool."""
+    f = await ImageCacheService.run_blocking(default_storage.open, file_name, 'rb')
+    try:
+        await ImageCacheService.run_blocking(f.seek, start)
+        remaining = length
+        while remaining > 0:
+            chunk = await ImageCacheService.run_blocking(f.read, min(FULL_IMAGE_CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        await ImageCacheService.run_blocking(f.close)
+
+
+@require_http_methods(["GET", "HEAD"])
+async def serve_full_image(request, image_id):
+    """
+    Serve the full-quality original image, streamed from storage.
+    This should be loaded on-demand (not automatically).
+
+    Supports conditional requests (If-None-Match / If-Modified-Since, 304)
+    and single byte ranges (206), using the image's content hash as ETag.
+    With FULL_IMAGE_REDIRECT_TO_STORAGE enabled, clients are redirected to
+    the storage URL (presigned on private S3 buckets) instead.
+
+    Usage: GET /api/images/{image_id}/full/
+    """
+    try:
+        # Get the image object
+        image = await DicomImage.objects.only(
+            'id', 'image_file', 'image_sha256', 'file_size_bytes', 'uploaded_at'
+        ).aget(id=image_id)
+
+        etag = await _image_etag(image)
+        last_modified = int(image.uploaded_at.timestamp())
+
+        # 304 Not Modified / 412 Precondition Failed
+        not_modified = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if not_modified is not None:
+            not_modified['Cache-Control'] = 'public, max-age=3600'
+            return not_modified
+
+        if getattr(settings, 'FULL_IMAGE_REDIRECT_TO_STORAGE', False):
+            return HttpResponseRedirect(default_storage.url(image.image_file.name))
+
+        size = image.file_size_bytes or await ImageCacheService.run_blocking(
+            default_storage.size, image.image_file.name
+        )
+
         # Determine content type from file extension
         content_type = 'image/jpeg'  # Default
         if image.image_file.name.lower().endswith('.png'):
@@ -167,9 +356,171 @@ def serve_full_image(request, image_id):
         elif image.image_file.name.lower().endswith('.webp'):
             content_type = 'image/webp'
 
+        byte_range = None
+        range_header = request.META.get('HTTP_RANGE')
+        if range_header and request.META.get('HTTP_IF_RANGE', etag) == etag:
+            byte_range = _parse_range(range_header, size)
+
+        if byte_range is False:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+        start, end = byte_range or (0, size - 1)
+        length = end - start + 1
+
+        if request.method == 'HEAD':
+            response = HttpResponse(content_type=content_type)
+        else:
+            response = StreamingHttpResponse(
+                _stream_file(image.image_file.name, start, length), content_type=content_type
+            )
+            cache_metrics.incr('full', 'bytes_served', length)
+
+        if byte_range:
+            response.status_code = 206
+            response['Content-Range'] = f'bytes {start}-{end}/{size}'
+
         # Return full image with appropriate headers
-        response = HttpResponse(image_bytes, content_type=content_type)
+        response['Content-Length'] = str(length)
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
         response['Content-Disposition'] = f'inline; filename="full_{image_id}.jpg"'
+        response['Cache-Control'] = 'public, max-age=3600'  # Cache for 1 hour, revalidate by ETag
+        response['X-Cache-Source'] = 'storage'
+
+        return response
+
+    except DicomImage.DoesNotExist:
+        return HttpResponse("Image not found", status=404, content_type='text/plain')
+    except Exception as e:
+        logger.error(f"Error serving full image {image_id}: {str(e)}")
+        return HttpResponse(
+            "Internal server error",
+            status=500,
+            content_type='text/plain'
+        )
+
+
+async def _tile_version(image):
+    """Version token of an image's tiles (prefix of its content hash)."""
+    return (await _image_etag(image)).strip('"')[:16]
+
+
+@require_http_methods(["GET"])
+async def tile_descriptor(request, image_id):
+    """
+    Deep Zoom descriptor (DZI, JSON form) for tiled viewers.
+
+    Also returns the image's tile 'version'. Tiles requested with ?v=<version>
+    are served as immutable; OpenSeadragon carries the query string of the
+    descriptor URL over to every tile, so open the descriptor with it.
+
+    Usage: GET /api/images/{image_id}/tiles/
+    """
+    try:
+        image = await DicomImage.objects.select_related('study__patient').aget(id=image_id)
+
+        descriptor = await ImageCacheService.run_blocking(
+            DeepZoomTileService.descriptor,
+            image.image_file.name,
+            reverse('image-tiles', args=[image_id]),
+            await ImageCacheService.acache_namespace(image),
+        )
+        descriptor['version'] = await _tile_version(image)
+
+        response = JsonResponse(descriptor)
+        response['Cache-Control'] = 'public, max-age=3600'
+        return response
+
+    except DicomImage.DoesNotExist:
+        return HttpResponse("Image not found", status=404, content_type='text/plain')
+    except Exception as e:
+        logger.error(f"Error describing tiles of image {image_id}: {str(e)}")
+        return HttpResponse(
+            "Internal server error",
+            status=500,
+            content_type='text/plain'
+        )
+
+
+@require_http_methods(["GET"])
+async def serve_tile(request, image_id, level, x, y):
+    """
+    Serve one Deep Zoom tile (WebP), generated on first request and cached.
+
+    Clients fetch only the tiles covering their viewport at the zoom level
+    they display. With a current ?v=<version> (see the descriptor) the tile
+    is cached by clients for a year.
+
+    Usage: GET /api/images/{image_id}/tiles/{level}/{x}_{y}.webp
+    """
+    try:
+        image = await DicomImage.objects.select_related('study__patient').aget(id=image_id)
+
+        tile_bytes = await DeepZoomTileService.aget_tile(
+            image.image_file.name, level, x, y, namespace=await ImageCacheService.acache_namespace(image)
+        )
+
+        response = HttpResponse(tile_bytes, content_type=DeepZoomTileService.CONTENT_TYPE)
+        if request.GET.get('v') == await _tile_version(image):
+            # Versioned URL: a reprocessed image gets a new version
+            response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        else:
+            response['Cache-Control'] = 'public, max-age=3600'
+        response['X-Cache-Source'] = 'redis'
+
+        return response
+
+    except (DicomImage.DoesNotExist, TileNotFound):
+        return HttpResponse("Tile not found", status=404, content_type='text/plain')
+    except Exception as e:
+        logger.error(f"Error serving tile {level}/{x}_{y} of image {image_id}: {str(e)}")
+        return HttpResponse(
+            "Internal server error",
+            status=500,
+            content_type='text/plain'
+        )
+
+
+@require_http_methods(["GET"])
+def serve_render(request, image_id):
+    """
+    Render an image server-side at a given window/level.
+    Rendered output is cached in Redis per (image, wc, ww, size, format).
+
+    Usage: GET /api/images/{image_id}/render/?wc=40&ww=400&size=512&format=webp
+
+    Query params (all optional):
+        wc: Window center (defaults to the image's stored window)
+        ww: Window width
+        size: Longest edge in pixels
+        format: jpeg (default), png or webp
+    """
+    try:
+        window_center = float(request.GET['wc']) if request.GET.get('wc') else None
+        window_width = float(request.GET['ww']) if request.GET.get('ww') else None
+        size = int(request.GET['size']) if request.GET.get('size') else None
+    except ValueError:
+        return HttpResponse("wc, ww and size must be numeric", status=400, content_type='text/plain')
+
+    fmt = request.GET.get('format', 'jpeg').lower()
+    if fmt == 'jpg':
+        fmt = 'jpeg'
+
+    try:
+        # Get the image object
+        image = DicomImage.objects.select_related('study__patient').get(id=image_id)
+
+        image_bytes, content_type = DicomRenderService.render(
+            image, window_center, window_width, size=size, fmt=fmt,
+            namespace=ImageCacheService.cache_namespace(image)
+        )
+
+        # Return rendered image with appropriate headers
+        response = HttpResponse(image_bytes, content_type=content_type)
+        response['Content-Disposition'] = f'inline; filename="render_{image_id}.{fmt}"'
         response['Cache-Control'] = 'public, max-age=3600'  # Cache for 1 hour
         response['X-Cache-Source'] = 'redis'
 
@@ -177,8 +528,12 @@ def serve_full_image(request, image_id):
 
     except DicomImage.DoesNotExist:
         return HttpResponse("Image not found", status=404, content_type='text/plain')
+    except ValueError as e:
+        return HttpResponse(str(e), status=400, content_type='text/plain')
+    except OriginalPixelsUnavailable as e:
+        return HttpResponse(str(e), status=409, content_type='text/plain')
     except Exception as e:
-        logger.error(f"Error serving full image {image_id}: {str(e)}")
+        logger.error(f"Error rendering image {image_id}: {str(e)}")
         return HttpResponse(
             "Internal server error",
             status=500,
@@ -212,7 +567,9 @@ def image_metadata(request, image_id):
         image = DicomImage.objects.select_related('study', 'study__patient').get(id=image_id)
 
         # Get cache stats
-        cache_stats = ImageCacheService.get_cache_stats(image.image_file.name)
+        cache_stats = ImageCacheService.get_cache_stats(
+            image.image_file.name, namespace=ImageCacheService.cache_namespace(image)
+        )
 
         # Build metadata response
         metadata = {
@@ -228,6 +585,7 @@ def image_metadata(request, image_id):
                 "preview": f"/api/images/{image_id}/preview/",
                 "webp": f"/api/images/{image_id}/webp/",
                 "full": f"/api/images/{image_id}/full/",
+                "render": f"/api/images/{image_id}/render/",
             }
         }
 
@@ -250,10 +608,12 @@ def invalidate_cache(request, image_id):
     """
     try:
         # Get the image object
-        image = DicomImage.objects.get(id=image_id)
+        image = DicomImage.objects.select_related('study__patient').get(id=image_id)
 
         # Invalidate cache
-        ImageCacheService.invalidate_cache(image.image_file.name)
+        ImageCacheService.invalidate_cache(
+            image.image_file.name, namespace=ImageCacheService.cache_namespace(image)
+        )
 
         return Response({
             "success": True,
@@ -289,6 +649,10 @@ def cache_statistics(request):
             "backend": "redis",
             "host": cache_backend.client.connection_pool.connection_kwargs.get('host', 'unknown'),
             "db": cache_backend.client.connection_pool.connection_kwargs.get('db', 0),
+            # Image cache hit/miss counters per tier (this worker process)
+            "image_cache_tiers": image_cache.stats(),
+            # Per-variant image counters aggregated over all workers
+            "image_cache_metrics": cache_metrics.snapshot(),
         }
 
         # Try to get Redis INFO if available
@@ -324,3 +688,18 @@ def cache_statistics(request):
     except Exception as e:
         logger.error(f"Error getting cache statistics: {str(e)}")
         return Response({"error": "Could not retrieve cache statistics"}, status=500)
+
+
+@require_http_methods(["GET"])
+def image_cache_metrics(request):
+    """
+    Image cache counters in the Prometheus text format, aggregated over all
+    worker processes.
+
+    Usage: GET /api/metrics/
+    """
+    try:
+        return HttpResponse(cache_metrics.prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    except Exception as e:
+        logger.error(f"Error exporting image cache metrics: {str(e)}")
+        return HttpResponse("Could not retrieve metrics", status=500, content_type='text/plain')
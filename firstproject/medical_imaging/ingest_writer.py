@@ -0,0 +1,235 @@
+"""
+Batched database writer for DICOM ingest.
+Provides:
+- SOP Instance UID de-duplication with one IN query per batch
+- bulk_create of DicomImage rows in configurable chunk sizes
+- Storage of precomputed renditions alongside each image
+- Throttled TaskStatus progress updates
+
+Used by process_dicom_images_async to turn thousands of tiny per-slice
+transactions into a handful of batched round trips per study.
+"""
+import hashlib
+import logging
+import time
+from typing import Dict, List
+
+from django.core.files.base import ContentFile
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .image_cache_service import ImageCacheService
+from .models import DicomImage, TaskStatus
+
+logger = logging.getLogger(__name__)
+
+
+class DicomImageBatchWriter:
+    """
+    Buffers ingest results and writes them to the database in batches.
+
+    Files are stored before their rows are inserted; if the insert fails
+    the batch's files are deleted again. Run it in autocommit mode (not
+    inside an outer atomic block), otherwise a later rollback of the
+    outer transaction would leave the stored files without rows.
+    """
+
+    # Default rows per bulk_create batch
+    DEFAULT_BATCH_SIZE = 200
+
+    def __init__(self, study, batch_size: int = None):
+        """
+        Args:
+            study: ImagingStudy the images belong to
+            batch_size: Rows per bulk_create batch
+        """
+        self.study = study
+        self.batch_size = max(1, batch_size or self.DEFAULT_BATCH_SIZE)
+        self.created_images: List[Dict] = []
+        self.skipped_images: List[Dict] = []
+        self.errors: List[str] = []
+        self._pending: List[Dict] = []
+        self._seen_sop_uids = set()
+
+    def add(self, result: Dict) -> None:
+        """
+        Queue one ingest result; flushes automatically when a batch is full.
+
+        Args:
+            result: Result produced by the per-file ingest worker
+        """
+        if result['error']:
+            self.errors.append(result['error'])
+            return
+
+        self._pending.append(result)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write all queued results to the database."""
+        if not self._pending:
+            return
+
+        batch, self._pending = self._pending, []
+        batch = self._drop_duplicates(batch)
+        if not batch:
+            return
+
+        images = []
+        for result in batch:
+            try:
+                images.append((result, self._build_image(result)))
+            except Exception as e:
+                error_msg = f"Error processing {result['filename']}: {str(e)}"
+                logger.error(error_msg, exc_info=True)
+                self.errors.append(error_msg)
+
+        if not images:
+            return
+
+        try:
+            with transaction.atomic():
+                DicomImage.objects.bulk_create([image for _, image in images], batch_size=self.batch_size)
+        except IntegrityError:
+            # A concurrent writer got there first - fall back to row-by-row so
+            # only the conflicting files are reported
+            logger.warning(f"Bulk insert conflict for study {self.study.id}, retrying row by row")
+            self._create_individually(images)
+            return
+        except Exception:
+            # No row references the batch's files
+            for _, image in images:
+                self._discard_files(image)
+            raise
+
+        self._resolve_missing_ids([image for _, image in images])
+        for result, image in images:
+            self._record_created(result, image)
+
+    def _drop_duplicates(self, batch: List[Dict]) -> List[Dict]:
+        """Skip results whose SOP Instance UID is already stored or repeated in this upload."""
+        sop_uids = {r['fields']['sop_instance_uid'] for r in batch if r['fields'].get('sop_instance_uid')}
+        existing = set()
+        if sop_uids:
+            existing = set(
+                DicomImage.objects.filter(sop_instance_uid__in=sop_uids).values_list('sop_instance_uid', flat=True)
+            )
+
+        unique = []
+        for result in batch:
+            sop_uid = result['fields'].get('sop_instance_uid')
+            if sop_uid and (sop_uid in existing or sop_uid in self._seen_sop_uids):
+                self.skipped_images.append({
+                    'filename': result['filename'],
+                    'reason': 'Duplicate SOP Instance UID',
+                    'sop_instance_uid': sop_uid
+                })
+                logger.info(f"Skipping duplicate DICOM: {result['filename']} (SOP UID: {sop_uid})")
+                continue
+            if sop_uid:
+                self._seen_sop_uids.add(sop_uid)
+            unique.append(result)
+
+        return unique
+
+    def _build_image(self, result: Dict) -> DicomImage:
+        """Build an unsaved DicomImage and store its file."""
+        image = DicomImage(
+            study=self.study,
+            instance_number=result['instance_number'],
+            is_dicom=result['is_dicom'],
+            file_size_bytes=len(result['rendition']),
+            image_sha256=hashlib.sha256(result['rendition']).hexdigest(),
+            **result['fields']
+        )
+        image.image_file.save(result['rendition_name'], ContentFile(result['rendition']), save=False)
+        if result.get('renditions'):
+            try:
+                ImageCacheService.store_renditions(image.image_file.name, result['renditions'])
+            except Exception:
+                self._discard_files(image)
+                raise
+        return image
+
+    @staticmethod
+    def _discard_files(image: DicomImage) -> None:
+        """Delete the stored file and renditions of an image that has no row."""
+        try:
+            ImageCacheService.delete_renditions(image.image_file.name)
+            image.image_file.delete(save=False)
+        except Exception as e:
+            logger.warning(f"Could not delete files of unsaved image {image.image_file.name}: {str(e)}")
+
+    def _create_individually(self, images) -> None:
+        """Insert rows one at a time, recording per-file errors."""
+        for result, image in images:
+            # Discard any state left behind by the rolled-back bulk insert
+            image.pk = None
+            image._state.adding = True
+            try:
+                with transaction.atomic():
+                    image.save()
+                self._record_created(result, image)
+            except Exception as e:
+                error_msg = f"Error processing {result['filename']}: {str(e)}"
+                logger.error(error_msg)
+                self.errors.append(error_msg)
+                self._discard_files(image)
+
+    def _resolve_missing_ids(self, images: List[DicomImage]) -> None:
+        """Fetch primary keys on backends where bulk_create does not return them (MySQL)."""
+        missing = {image.instance_number: image for image in images if image.pk is None}
+        if not missing:
+            return
+
+        rows = DicomImage.objects.filter(
+            study=self.study, instance_number__in=list(missing)
+        ).values_list('instance_number', 'id')
+        for instance_number, pk in rows:
+            missing[instance_number].pk = pk
+
+    def _record_created(self, result: Dict, image: DicomImage) -> None:
+        self.created_images.append({
+            'id': image.pk,
+            'filename': result['filename'],
+            'instance_number': image.instance_number,
+        })
+        logger.info(f"Created image: {result['filename']}")
+
+
+class TaskProgressReporter:
+    """Persists TaskStatus.processed_items at most every N items or T seconds."""
+
+    # Default throttling
+    DEFAULT_EVERY_ITEMS = 25
+    DEFAULT_EVERY_SECONDS = 2.0
+
+    def __init__(self, task_status: TaskStatus, every_items: int = None, every_seconds: float = None):
+        """
+        Args:
+            task_status: TaskStatus row to update
+            every_items: Write after this many new items
+            every_seconds: Write after this many seconds
+        """
+        self.task_status = task_status
+        self.every_items = max(1, every_items or self.DEFAULT_EVERY_ITEMS)
+        self.every_seconds = self.DEFAULT_EVERY_SECONDS if every_seconds is None else every_seconds
+        self._written = task_status.processed_items
+        self._written_at = time.monotonic()
+
+    def update(self, processed: int) -> None:
+        """Record progress; writes to the database only when a threshold is reached."""
+        self.task_status.processed_items = processed
+        if (processed - self._written >= self.every_items
+                or time.monotonic() - self._written_at >= self.every_seconds):
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the current progress unconditionally."""
+        TaskStatus.objects.filter(pk=self.task_status.pk).update(
+            processed_items=self.task_status.processed_items,
+            updated_at=timezone.now(),
+        )
+        self._written = self.task_status.processed_items
+        self._written_at = time.monotonic()
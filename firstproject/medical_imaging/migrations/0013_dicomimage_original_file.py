@@ -0,0 +1,23 @@
+# Generated by Django 5.2.9 on 2026-10-18 22:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical_imaging', '0012_imagingstudy_processing_version_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dicomimage',
+            name='original_file',
+            field=models.FileField(blank=True, help_text='Original DICOM file, stored under a content-addressed key', max_length=255, upload_to='dicom_original/'),
+        ),
+        migrations.AddField(
+            model_name='dicomimage',
+            name='original_sha256',
+            field=models.CharField(blank=True, db_index=True, help_text='SHA-256 of the original DICOM file', max_length=64),
+        ),
+    ]
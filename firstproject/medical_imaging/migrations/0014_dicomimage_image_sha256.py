@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 22:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical_imaging', '0013_dicomimage_original_file'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dicomimage',
+            name='image_sha256',
+            field=models.CharField(blank=True, help_text='SHA-256 of image_file (used as its HTTP ETag)', max_length=64),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.9 on 2026-10-18 23:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('medical_imaging', '0014_dicomimage_image_sha256'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='dicomimage',
+            index=models.Index(fields=['study', 'slice_location'], name='medical_ima_study_i_a653d6_idx'),
+        ),
+    ]
@@ -153,6 +153,18 @@ class DicomImage(models.Model):
     )
 
     image_file = models.FileField(upload_to='dicom_image/%Y/%m/%d/')
+    original_file = models.FileField(
+        upload_to='dicom_original/',
+        max_length=255,
+        blank=True,
+        help_text='Original DICOM file, stored under a content-addressed key'
+    )
+    original_sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        help_text='SHA-256 of the original DICOM file'
+    )
     instance_number = models.IntegerField(
         validators=[MinValueValidator(1)],
         help_text='Image sequence number in study'
@@ -217,6 +229,11 @@ class DicomImage(models.Model):
 
     # File information
     file_size_bytes = models.BigIntegerField(default=0)
+    image_sha256 = models.CharField(
+        max_length=64,
+        blank=True,
+        help_text='SHA-256 of image_file (used as its HTTP ETag)'
+    )
     is_dicom = models.BooleanField(default=False, help_text='True if file is valid DICOM format')
     uploaded_at = models.DateTimeField(auto_now_add=True)
 
@@ -225,6 +242,7 @@ class DicomImage(models.Model):
         unique_together = ['study', 'instance_number']
         indexes = [
             models.Index(fields=['study', 'instance_number']),  # Fast image lookup
+            models.Index(fields=['study', 'slice_location']),  # Neighbouring slices by position
             models.Index(fields=['-uploaded_at']),  # Recent uploads
             models.Index(fields=['file_size_bytes']),  # Size-based queries
         ]
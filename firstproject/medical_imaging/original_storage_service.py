@@ -0,0 +1,91 @@
+"""
+Durable storage of original DICOM files.
+Provides:
+- Content-addressed storage keys (SHA-256 of the file)
+- Idempotent storage of originals during ingest (identical files stored once)
+- Reads of stored originals for re-rendering and reprocessing
+
+Keeping the source DICOM lets renditions be regenerated at any window,
+resolution or processing version without asking users to re-upload.
+"""
+import hashlib
+import logging
+from typing import Dict
+
+from django.core.files.storage import default_storage
+
+from .storage_service import StorageService
+
+logger = logging.getLogger(__name__)
+
+
+class DicomOriginalService:
+    """Service for storing and reading original DICOM files."""
+
+    # Storage prefix for original DICOM files
+    ORIGINALS_PREFIX = "dicom_original"
+
+    @classmethod
+    def original_key(cls, sha256: str) -> str:
+        """
+        Build the content-addressed storage key for a file.
+
+        Args:
+            sha256: Hex SHA-256 digest of the file content
+
+        Returns:
+            str: Storage key, fanned out by digest prefix
+        """
+        return f"{cls.ORIGINALS_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}.dcm"
+
+    @classmethod
+    def store_original(cls, content, sha256: str = None) -> Dict:
+        """
+        Store an original DICOM file under its content-addressed key.
+        Files already present (same content) are not written again.
+
+        The key is always the content key: concurrent ingests of the same
+        file (parallel pool workers) both write it in place, never to a
+        suffixed name, and identical bytes make the last write harmless.
+
+        Args:
+            content: File content (bytes or mmap)
+            sha256: Digest of the content if already known (e.g. from staging)
+
+        Returns:
+            dict: 'storage_key' and 'sha256' of the stored original
+        """
+        if not sha256:
+            sha256 = hashlib.sha256(content).hexdigest()
+
+        storage_key = cls.original_key(sha256)
+        if default_storage.exists(storage_key):
+            logger.debug(f"Original {storage_key} already stored")
+        else:
+            StorageService.write_replacing(storage_key, bytes(content))
+            logger.debug(f"Stored original DICOM as {storage_key}")
+
+        return {
+            'storage_key': storage_key,
+            'sha256': sha256,
+        }
+
+    @staticmethod
+    def read_original(image) -> bytes:
+        """
+        Read the stored original of an image.
+
+        Args:
+            image: DicomImage instance
+
+        Returns:
+            bytes: Original DICOM file content
+
+        Raises:
+            FileNotFoundError: If the image has no stored original
+        """
+        if not image.original_file:
+            raise FileNotFoundError(f"Image {image.pk} has no stored original")
+
+        with default_storage.open(image.original_file.name, 'rb') as f:
+            return f.read()
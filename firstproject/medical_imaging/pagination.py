@@ -0,0 +1,260 @@
+"""
+Keyset (cursor) pagination for high-volume list endpoints.
+Provides:
+- KeysetPagination: cursor pagination on a unique composite sort key
+- Optional result counts: exact (?count=exact) or estimated (?count=estimate)
+
+Page-number pagination runs COUNT(*) on every request and OFFSET-scans past
+every earlier row, so deep pages of the audit log or of a large study get
+slower the further you go. A cursor carries the sort key of the page
+boundary instead: each page is one index range scan
+(WHERE timestamp < ... ORDER BY timestamp DESC LIMIT n) and costs the same
+at any depth.
+"""
+import json
+import logging
+from typing import List, Optional, Tuple
+
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Cursor pagination following the view's `ordering`, keyed on every
+    ordering column.
+
+    DRF's CursorPagination keeps only the first ordering column in the
+    cursor and steps over ties with an OFFSET (capped at offset_cutoff), so
+    a non-unique sort key such as instance_number or study_date makes pages
+    scan, repeat or skip rows. Here the cursor holds the values of all
+    ordering columns, the primary key is appended when the ordering does
+    not already end with it, and the next page is a row-value comparison
+    ((a > x) OR (a = x AND b > y) ...), so positions are always unique.
+
+    Viewsets order by the leading column(s) of an existing index, e.g.
+    AuditLog by (-timestamp, -id), DicomImage by (study_id,
+    instance_number, id). Order by the foreign key column (study_id), not
+    the relation, which would sort by the related model's Meta.ordering.
+    No COUNT query runs unless the client asks for one.
+    """
+
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    # ?count=exact runs COUNT(*); ?count=estimate reads table statistics
+    # (unfiltered lists) or counts at most ESTIMATE_CAP rows
+    count_query_param = 'count'
+    COUNT_MODES = ('exact', 'estimate')
+    ESTIMATE_CAP = 10000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.count, self.count_estimated = self.get_count(queryset, request)
+
+        # CursorPagination.paginate_queryset with the composite position filter
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+
+        if reverse:
+            queryset = queryset.order_by(*self._reverse_ordering(self.ordering))
+        else:
+            queryset = queryset.order_by(*self.ordering)
+
+        if current_position is not None:
+            queryset = queryset.filter(self._after_position(self._decode_position(current_position), reverse))
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = list(results[:self.page_size])
+
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_ordering(self, request, queryset, view):
+        """The view's (or ?ordering=) ordering, ending with the primary key."""
+        ordering = super().get_ordering(request, queryset, view)
+        pk_name = queryset.model._meta.pk.name
+        if ordering[-1].lstrip('-') not in ('pk', pk_name):
+            # Same direction as the leading column, so an index on it can be walked backwards
+            ordering += (f"-{pk_name}" if ordering[0].startswith('-') else pk_name,)
+        return ordering
+
+    @staticmethod
+    def _reverse_ordering(ordering) -> Tuple[str, ...]:
+        return tuple(field[1:] if field.startswith('-') else f"-{field}" for field in ordering)
+
+    def _after_position(self, values: List[str], reverse: bool) -> Q:
+        """
+        Rows strictly after a position in the (possibly reversed) ordering.
+
+        Args:
+            values: Ordering column values of the position
+            reverse: Whether the cursor pages backwards
+
+        Returns:
+            Q: (a > x) OR (a = x AND b > y) OR ..., with < for descending columns
+        """
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if reverse != field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        return condition
+
+    def _decode_position(self, position: str) -> List[str]:
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def _get_position_from_instance(self, instance, ordering) -> str:
+        values = []
+        for field in ordering:
+            name = field.lstrip('-')
+            if isinstance(instance, dict):
+                value = instance[name]
+            else:
+                # Column value (e.g. study_id for 'study'), not the related object
+                value = instance.serializable_value(name)
+            values.append(str(value))
+        return json.dumps(values, separators=(',', ':'))
+
+    def get_count(self, queryset, request) -> Tuple[Optional[int], bool]:
+        """
+        Count requested with ?count=.
+
+        Returns:
+            tuple: (count or None if not requested, whether it is an estimate)
+        """
+        mode = request.query_params.get(self.count_query_param)
+        if mode == 'exact':
+            return queryset.count(), False
+        if mode == 'estimate':
+            return self.estimate_count(queryset)
+        return None, False
+
+    def estimate_count(self, queryset) -> Tuple[int, bool]:
+        """
+        Estimated number of rows in a queryset.
+
+        Unfiltered querysets use the table statistics kept by MySQL
+        (information_schema) or PostgreSQL (pg_class). Otherwise rows are
+        counted up to ESTIMATE_CAP, so the cost is bounded.
+
+        Returns:
+            tuple: (count, whether it is an estimate)
+        """
+        if not queryset.query.where:
+            estimate = self._table_estimate(queryset)
+            if estimate is not None:
+                return estimate, True
+
+        capped = queryset.order_by()[:self.ESTIMATE_CAP + 1].count()
+        if capped > self.ESTIMATE_CAP:
+            return self.ESTIMATE_CAP, True
+        return capped, False
+
+    @staticmethod
+    def _table_estimate(queryset) -> Optional[int]:
+        """Row count from the database's table statistics, if available."""
+        connection = connections[queryset.db]
+        table = queryset.model._meta.db_table
+        if connection.vendor == 'mysql':
+            sql = ("SELECT TABLE_ROWS FROM information_schema.TABLES "
+                   "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s")
+        elif connection.vendor == 'postgresql':
+            sql = "SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass"
+        else:
+            return None
+
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(sql, [table])
+                row = cursor.fetchone()
+        except DatabaseError as e:
+            logger.warning(f"Could not read table statistics for {table}: {e}")
+            return None
+
+        # PostgreSQL reports -1 for tables never analyzed
+        if row is None or row[0] is None or row[0] < 0:
+            return None
+        return int(row[0])
+
+    def get_paginated_response(self, data):
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            payload = {'count': self.count, 'count_estimated': self.count_estimated, **payload}
+        return Response(payload)
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties'] = {
+            'count': {
+                'type': 'integer',
+                'description': f'Only with ?{self.count_query_param}=exact or ?{self.count_query_param}=estimate',
+                'example': 123,
+            },
+            'count_estimated': {'type': 'boolean'},
+            **response_schema['properties'],
+        }
+        return response_schema
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append({
+            'name': self.count_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Include the number of results: exact (COUNT query) or estimate (cheap, approximate)',
+            'schema': {'type': 'string', 'enum': list(self.COUNT_MODES)},
+        })
+        return parameters
@@ -0,0 +1,201 @@
+"""
+Predictive slice prefetch for scrolling through a study.
+Provides:
+- Per-viewer scroll tracking (position, direction, adaptive window size)
+- Neighbour lookup by instance number or slice location
+- Background generation and caching of the slices a viewer will request next
+
+Radiologists scroll through slices in order. Each preview request moves the
+viewer's window: sequential scrolling doubles the number of slices loaded
+ahead (up to SLICE_PREFETCH_MAX_WINDOW), a reversal or a new viewer starts
+again from SLICE_PREFETCH_MIN_WINDOW. Slices behind the viewer are loaded too
+(a quarter of the window) so scrolling back is also served from the cache.
+
+Scroll state is kept per worker process; a viewer whose requests are spread
+over several workers only adapts more slowly.
+"""
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+
+from .image_cache_service import ImageCacheService
+from .models import DicomImage
+from .tiered_cache import ByteBudgetLRU
+
+logger = logging.getLogger(__name__)
+
+# Background pool for prefetches, separate from the image pool so that
+# prefetching never delays renditions a viewer is waiting for
+prefetch_executor = ThreadPoolExecutor(
+    max_workers=getattr(settings, 'SLICE_PREFETCH_WORKERS', 2), thread_name_prefix='slice-prefetch'
+)
+
+
+class SlicePrefetchService:
+    """Service for loading the neighbours of requested slices into the cache."""
+
+    # Orderings a viewer can scroll along
+    ORDERINGS = ('instance_number', 'slice_location')
+
+    # Seconds of inactivity after which a viewer's scroll state is forgotten
+    STATE_TTL = 300
+
+    # Seconds during which a prefetched slice is not scheduled again
+    RECENT_TTL = 60
+
+    # (viewer, study, ordering) -> (position, direction, window)
+    scroll_state = ByteBudgetLRU(getattr(settings, 'SLICE_PREFETCH_TRACKED_VIEWERS', 10000), sizeof=lambda state: 1)
+
+    # Slices prefetched recently by this process: (file_path, variant, namespace) -> True
+    recent = ByteBudgetLRU(getattr(settings, 'SLICE_PREFETCH_TRACKED_SLICES', 50000), sizeof=lambda value: 1)
+
+    _pending = set()
+    _pending_lock = threading.Lock()
+
+    @classmethod
+    def next_window(cls, viewer: str, study_id: int, ordering: str, position: float) -> Tuple[int, int]:
+        """
+        Update a viewer's scroll state with a new position.
+
+        Args:
+            viewer: Viewer identifier (session or client address)
+            study_id: ImagingStudy id
+            ordering: One of ORDERINGS
+            position: Value of the ordering field for the requested slice
+
+        Returns:
+            tuple: (direction: 1 or -1, number of slices to load ahead)
+        """
+        min_window = getattr(settings, 'SLICE_PREFETCH_MIN_WINDOW', 4)
+        max_window = getattr(settings, 'SLICE_PREFETCH_MAX_WINDOW', 32)
+        key = (viewer, study_id, ordering)
+
+        state = cls.scroll_state.get(key)
+        if state is None:
+            direction, window = 1, min_window
+        else:
+            last_position, direction, window = state
+            moved = (position > last_position) - (position < last_position)
+            if moved == direction:
+                # Scrolling on: the viewer will keep going, look further ahead
+                window = min(max_window, window * 2)
+            elif moved:
+                direction, window = moved, min_window
+
+        cls.scroll_state.set(key, (position, direction, window), cls.STATE_TTL)
+        return direction, window
+
+    @staticmethod
+    async def aneighbours(image, ordering: str, direction: int, ahead: int, behind: int) -> List[Tuple[str, str]]:
+        """
+        Slices next to an image, nearest first: `ahead` in the scroll
+        direction, then `behind` in the other.
+
+        Args:
+            image: Requested DicomImage
+            ordering: One of ORDERINGS
+            direction: 1 (increasing values) or -1
+            ahead: Slices to return in the scroll direction
+            behind: Slices to return against it
+
+        Returns:
+            list: (image_file, image_sha256) pairs
+        """
+        position = getattr(image, ordering)
+        images = DicomImage.objects.filter(study_id=image.study_id)
+
+        neighbours = []
+        for step, count in ((direction, ahead), (-direction, behind)):
+            if count <= 0:
+                continue
+            lookup, order = ('gt', ordering) if step > 0 else ('lt', f'-{ordering}')
+            queryset = (
+                images.filter(**{f'{ordering}__{lookup}': position})
+                .order_by(order)
+                .values_list('image_file', 'image_sha256')[:count]
+            )
+            neighbours.extend([row async for row in queryset])
+
+        return neighbours
+
+    @classmethod
+    def _prefetch(cls, file_path: str, variant: str, namespace: str) -> bool:
+        try:
+            return ImageCacheService.prefetch_variant(file_path, variant, namespace)
+        except Exception as e:
+            logger.warning(f"Prefetch of {variant} for {file_path} failed: {str(e)}")
+            return False
+        finally:
+            with cls._pending_lock:
+                cls._pending.discard((file_path, variant, namespace))
+
+    @classmethod
+    def submit(cls, file_path: str, variant: str, namespace: str = '') -> Optional[Future]:
+        """
+        Queue one prefetch in the background pool.
+
+        Slices already queued, or prefetched in the last RECENT_TTL seconds,
+        are skipped, and at most SLICE_PREFETCH_MAX_PENDING prefetches wait
+        at once so a fast scroll does not pile up slices it has passed.
+
+        Returns:
+            Future of prefetch_variant, or None if skipped
+        """
+        task = (file_path, variant, namespace)
+        if cls.recent.get(task):
+            return None
+
+        with cls._pending_lock:
+            if task in cls._pending or len(cls._pending) >= getattr(settings, 'SLICE_PREFETCH_MAX_PENDING', 64):
+                return None
+            cls._pending.add(task)
+
+        cls.recent.set(task, True, cls.RECENT_TTL)
+        return prefetch_executor.submit(cls._prefetch, file_path, variant, namespace)
+
+    @classmethod
+    async def aschedule(cls, image, variant: str, viewer: str, ordering: str = 'instance_number') -> List[Future]:
+        """
+        Prefetch the slices a viewer is likely to request after `image`.
+
+        Called after a slice has been served; only the neighbour query runs
+        before returning, the prefetches run in the background pool.
+
+        Args:
+            image: Requested DicomImage (study and patient select_related)
+            variant: Rendition variant to prefetch ('preview', 'thumb' or 'webp')
+            viewer: Viewer identifier (session or client address)
+            ordering: One of ORDERINGS; slices without a slice location
+                fall back to instance_number
+
+        Returns:
+            list: Futures of the queued prefetches
+        """
+        if not getattr(settings, 'SLICE_PREFETCH_ENABLED', True):
+            return []
+
+        if ordering not in cls.ORDERINGS or getattr(image, ordering) is None:
+            ordering = 'instance_number'
+
+        try:
+            direction, window = cls.next_window(viewer, image.study_id, ordering, getattr(image, ordering))
+            neighbours = await cls.aneighbours(image, ordering, direction, window, max(1, window // 4))
+            if not neighbours:
+                return []
+
+            study = image.study
+            scope = await ImageCacheService.ascope_namespace(
+                study.id, study.patient.hospital_id, study.processing_version
+            )
+        except Exception as e:
+            logger.warning(f"Could not schedule prefetch after image {image.id}: {str(e)}")
+            return []
+
+        futures = [
+            cls.submit(file_path, variant, ImageCacheService.content_namespace(scope, sha256))
+            for file_path, sha256 in neighbours
+        ]
+        return [future for future in futures if future is not None]
@@ -0,0 +1,225 @@
+"""
+Query shaping for the API viewsets.
+Provides:
+- Aggregate annotations (Count, Exists) read by the list and detail serializers
+- AnnotatedQuerysetMixin: viewsets declare the aggregates their serializers need
+- Prefetch of a patient's recent studies, already annotated
+- Study images without their DICOM tags
+- SparseQuerysetMixin: only() the columns a response renders (?fields=,
+  ?expand=), joining and prefetching only the relations it renders
+
+Computing aggregates in the page query replaces a COUNT (or existence)
+query per serialized row, so a page costs the same number of queries
+whatever its size.
+"""
+from typing import Iterable, Optional, Set
+
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Count, Exists, OuterRef, Prefetch
+
+from .models import DicomImage, Diagnosis, ImagingStudy
+
+
+# Hospital rows: number of patients
+HOSPITAL_ANNOTATIONS = {
+    'patient_count': Count('patients'),
+}
+
+# Study list rows: number of images and whether a diagnosis exists
+STUDY_LIST_ANNOTATIONS = {
+    'image_count': Count('images'),
+    'has_diagnosis': Exists(Diagnosis.objects.filter(study=OuterRef('pk'))),
+}
+
+# Patient detail: number of studies
+PATIENT_DETAIL_ANNOTATIONS = {
+    'total_studies': Count('imaging_studies'),
+}
+
+# Large columns left out of images nested in a study (full DICOM tag dump)
+IMAGE_DEFERRED_FIELDS = ('dicom_metadata',)
+
+# Studies shown in the patient detail view
+RECENT_STUDIES_LIMIT = 5
+
+
+def recent_studies_prefetch(limit: int = RECENT_STUDIES_LIMIT) -> Prefetch:
+    """
+    Prefetch each patient's most recent studies with the study list
+    annotations, into `recent_studies_list` (one query for all patients).
+
+    Args:
+        limit: Studies per patient
+
+    Returns:
+        Prefetch: For Patient querysets
+    """
+    return Prefetch(
+        'imaging_studies',
+        queryset=ImagingStudy.objects.annotate(**STUDY_LIST_ANNOTATIONS).order_by('-study_date')[:limit],
+        to_attr='recent_studies_list',
+    )
+
+
+def study_images_prefetch() -> Prefetch:
+    """
+    Prefetch a study's images without their DICOM tag JSON, which can run
+    to tens of KB per slice.
+
+    Returns:
+        Prefetch: For ImagingStudy querysets
+    """
+    return Prefetch('images', queryset=DicomImage.objects.defer(*IMAGE_DEFERRED_FIELDS))
+
+
+def diagnosis_prefetch() -> Prefetch:
+    """
+    Prefetch a study's diagnosis with its radiologist.
+
+    Returns:
+        Prefetch: For ImagingStudy querysets
+    """
+    return Prefetch('diagnosis', queryset=Diagnosis.objects.select_related('radiologist'))
+
+
+def source_path(model, source: str) -> Optional[str]:
+    """
+    ORM path of a serializer field source over concrete fields and forward
+    relations, e.g. 'hospital.name' -> 'hospital__name'.
+
+    Returns:
+        str: Path usable with only(), or None for anything else
+        (properties, methods, reverse relations, '*')
+    """
+    parts = source.split('.')
+    for position, part in enumerate(parts):
+        try:
+            field = model._meta.get_field(part)
+        except FieldDoesNotExist:
+            return None
+        if not field.concrete or field.many_to_many:
+            return None
+        if position < len(parts) - 1:
+            if not field.is_relation:
+                return None
+            model = field.related_model
+    return '__'.join(parts)
+
+
+def model_columns(model, serializer, handled: Iterable[str] = ()) -> Optional[Set[str]]:
+    """
+    Columns a serializer's fields read, as only() paths.
+
+    Fields whose source is not a model field declare their columns in
+    Meta.column_sources (e.g. {'full_name': ('first_name', 'last_name')}).
+
+    Args:
+        model: Model of the queryset
+        serializer: Serializer instance (fields already trimmed to the response)
+        handled: Field names loaded otherwise (annotations, prefetches)
+
+    Returns:
+        set: Column paths, or None if some field's columns are unknown
+    """
+    declared = getattr(serializer.Meta, 'column_sources', {})
+    columns = set()
+    for name, field in serializer.fields.items():
+        if name in handled:
+            continue
+        if name in declared:
+            columns.update(declared[name])
+            continue
+        path = source_path(model, field.source)
+        if path is None:
+            return None
+        columns.add(path)
+    return columns
+
+
+class AnnotatedQuerysetMixin:
+    """
+    Viewset mixin adding the aggregates its serializers read to get_queryset().
+
+    Viewsets declare `annotations` (name -> Count/Exists expression) or
+    override get_annotations() to vary them per action. Serializers read
+    them with AnnotatedCountField / AnnotatedExistsField.
+    """
+
+    annotations = {}
+
+    def get_annotations(self) -> dict:
+        """Annotations for the current action."""
+        return self.annotations
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        annotations = self.get_annotations()
+        if annotations:
+            queryset = queryset.annotate(**annotations)
+        return queryset
+
+
+class SparseQuerysetMixin(AnnotatedQuerysetMixin):
+    """
+    Viewset mixin loading only what a GET response renders.
+
+    The response serializer's fields (after ?fields= and ?expand=) decide:
+    - columns: only() those the fields read (see model_columns)
+    - joins: select_related only the relations those columns cross
+    - annotations and `field_prefetches` only for rendered fields
+
+    If the columns of some field cannot be worked out, all columns are
+    loaded (joins and prefetches are still trimmed).
+    """
+
+    # Actions whose responses are shaped
+    sparse_actions = ('list', 'retrieve')
+
+    # Field -> Prefetch factory, applied only when the field is rendered
+    field_prefetches = {}
+
+    def get_response_serializer(self):
+        """Serializer rendering this response, or None if it is not shaped."""
+        if self.request is None or self.request.method != 'GET' or self.action not in self.sparse_actions:
+            return None
+        if not hasattr(self, '_response_serializer'):
+            self._response_serializer = self.get_serializer()
+        return self._response_serializer
+
+    def get_annotations(self) -> dict:
+        serializer = self.get_response_serializer()
+        if serializer is None:
+            # Unshaped responses compute their values per object
+            return {}
+        return {name: value for name, value in super().get_annotations().items() if name in serializer.fields}
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer = self.get_response_serializer()
+        if serializer is None:
+            return queryset
+
+        rendered = serializer.fields
+        for name, prefetch in self.field_prefetches.items():
+            if name in rendered:
+                queryset = queryset.prefetch_related(prefetch())
+
+        handled = set(self.get_annotations()) | set(self.field_prefetches)
+        columns = model_columns(queryset.model, serializer, handled)
+        if columns is None:
+            return queryset
+
+        # Cursor pagination and ordering read the sort columns
+        ordering = getattr(self, 'ordering', None) or ()
+        if isinstance(ordering, str):
+            ordering = (ordering,)
+        columns.update(field.lstrip('-') for field in ordering)
+        ordering_fields = getattr(self, 'ordering_fields', None)
+        if isinstance(ordering_fields, (list, tuple)):
+            columns.update(ordering_fields)
+
+        joins = {column.rsplit('__', 1)[0] for column in columns if '__' in column}
+        queryset = queryset.select_related(None)
+        if joins:
+            queryset = queryset.select_related(*joins)
+        return queryset.only(*columns)
@@ -0,0 +1,270 @@
+"""
+Server-side window/level rendering for medical images.
+Provides:
+- Per-worker LRU cache of decoded pixel arrays (byte-budget eviction)
+- Window/level rendering from stored pixel data via DicomParsingService
+- Two-tier (process/Redis) caching of rendered output keyed by (image, wc, ww, size, format)
+
+Lets the viewer adjust window/level without shipping 16-bit DICOM data to
+the browser: only the final 8-bit rendition crosses the wire.
+"""
+import hashlib
+import io
+import logging
+import math
+from typing import Optional, Tuple
+
+import numpy as np
+import pydicom
+from PIL import Image
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from .cache_metrics import cache_metrics
+from .dicom_service import DicomParsingService
+from .tiered_cache import ByteBudgetLRU, image_cache as cache
+
+logger = logging.getLogger(__name__)
+
+
+class OriginalPixelsUnavailable(Exception):
+    """Raised when an image has no stored pixel data suitable for re-rendering."""
+
+
+class DicomRenderService:
+    """Service for rendering images at arbitrary window/level settings."""
+
+    # Cache key prefix
+    RENDER_PREFIX = "img_render"
+
+    # Supported output formats: name -> (PIL format, content type)
+    FORMATS = {
+        'jpeg': ('JPEG', 'image/jpeg'),
+        'png': ('PNG', 'image/png'),
+        'webp': ('WEBP', 'image/webp'),
+    }
+
+    # Output size bounds (longest edge, pixels)
+    MIN_SIZE = 16
+    MAX_SIZE = 4096
+
+    # Compression quality
+    JPEG_QUALITY = 90
+    WEBP_QUALITY = 85
+
+    # Cache TTL (in seconds)
+    RENDER_TTL = 3600
+
+    # Decoded pixel arrays, per worker process
+    pixel_cache = ByteBudgetLRU(
+        getattr(settings, 'RENDER_PIXEL_CACHE_BYTES', 256 * 1024 * 1024),
+        sizeof=lambda decoded: decoded[0].nbytes
+    )
+
+    @staticmethod
+    def _parse_window_value(value) -> Optional[float]:
+        """Parse a stored WindowCenter/WindowWidth string (first value of multi-valued tags)."""
+        if value in (None, ''):
+            return None
+        try:
+            return float(str(value).strip('[]').split(',')[0].split('\\')[0])
+        except ValueError:
+            return None
+
+    @classmethod
+    def default_window(cls, image) -> Tuple[Optional[float], Optional[float]]:
+        """
+        Window stored with the image at ingest.
+
+        Args:
+            image: DicomImage instance
+
+        Returns:
+            tuple: (window_center, window_width), either may be None
+        """
+        return cls._parse_window_value(image.window_center), cls._parse_window_value(image.window_width)
+
+    @classmethod
+    def _source_file(cls, image) -> str:
+        """Storage path of the file holding the image's source pixels."""
+        return image.original_file.name or image.image_file.name
+
+    @classmethod
+    def _source_id(cls, image) -> str:
+        """Stable identifier of the source content (digest for stored originals)."""
+        return image.original_sha256 or hashlib.md5(cls._source_file(image).encode()).hexdigest()
+
+    @classmethod
+    def load_pixels(cls, image) -> Tuple[np.ndarray, float, float, bool]:
+        """
+        Decode the stored pixel data of an image, using the per-worker LRU.
+
+        The stored original DICOM is preferred. DICOM sources keep their
+        stored integer values plus rescale slope and intercept so rendering
+        can use lookup tables. Regular images decode to 8-bit grayscale with
+        identity rescale. The rendered JPEG of a DICOM upload without a
+        stored original is not a valid source: its window is already baked in.
+
+        Args:
+            image: DicomImage instance
+
+        Returns:
+            tuple: (pixels, rescale_slope, rescale_intercept, invert)
+
+        Raises:
+            OriginalPixelsUnavailable: If no suitable source is stored
+        """
+        file_path = cls._source_file(image)
+        # Originals are content-addressed, so identical files share one entry
+        cache_key = image.original_sha256 or (image.pk, file_path)
+
+        cached = cls.pixel_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        with default_storage.open(file_path, 'rb') as f:
+            data = f.read()
+
+        try:
+            dataset = pydicom.dcmread(io.BytesIO(data))
+            pixels = dataset.pixel_array
+            if int(dataset.get('NumberOfFrames', 1) or 1) > 1:
+                # Multi-frame: render the first frame
+                pixels = pixels[0]
+            decoded = (
+                pixels,
+                float(dataset.get('RescaleSlope', 1)),
+                float(dataset.get('RescaleIntercept', 0)),
+                str(dataset.get('PhotometricInterpretation', '')) == 'MONOCHROME1',
+            )
+        except Exception:
+            if image.is_dicom:
+                raise OriginalPixelsUnavailable(
+                    f"Image {image.pk} only has a pre-windowed rendition stored"
+                )
+            decoded = (np.asarray(Image.open(io.BytesIO(data)).convert('L')), 1.0, 0.0, False)
+
+        cls.pixel_cache.set(cache_key, decoded)
+        return decoded
+
+    @staticmethod
+    def _full_range_window(pixels: np.ndarray, slope: float, intercept: float) -> Tuple[float, float]:
+        """Window covering the full pixel range of an image."""
+        lower = float(pixels.min()) * slope + intercept
+        upper = float(pixels.max()) * slope + intercept
+        return (lower + upper) / 2, upper - lower
+
+    @staticmethod
+    def _window_image(pixels: np.ndarray, window_center: float, window_width: float,
+                      slope: float, intercept: float, invert: bool) -> Image.Image:
+        """Apply a window to decoded pixels, giving an 8-bit PIL Image."""
+        rendered = DicomParsingService.render_window_stack(
+            pixels, {'custom': (window_center, window_width)},
+            rescale_slope=slope, rescale_intercept=intercept, invert=invert
+        )['custom']
+        return Image.fromarray(rendered, mode='RGB' if rendered.ndim == 3 else 'L')
+
+    @classmethod
+    def render_stored_window(cls, image) -> Image.Image:
+        """
+        Render the stored source pixels at the window stored with the image
+        (full pixel range if it has none), at full resolution.
+
+        Args:
+            image: DicomImage instance
+
+        Returns:
+            Image: 8-bit PIL Image
+
+        Raises:
+            OriginalPixelsUnavailable: If no suitable source is stored
+        """
+        pixels, slope, intercept, invert = cls.load_pixels(image)
+        window_center, window_width = cls.default_window(image)
+        if window_center is None or window_width is None:
+            window_center, window_width = cls._full_range_window(pixels, slope, intercept)
+        return cls._window_image(pixels, window_center, window_width, slope, intercept, invert)
+
+    @classmethod
+    def _render_cache_key(cls, image, window_center, window_width, size, fmt, namespace='') -> str:
+        prefix = f"{cls.RENDER_PREFIX}:{namespace}" if namespace else cls.RENDER_PREFIX
+        return (
+            f"{prefix}:{image.pk}:{cls._source_id(image)}:"
+            f"{window_center:g}:{window_width:g}:{size or 0}:{fmt}"
+        )
+
+    @classmethod
+    def render(cls, image, window_center: Optional[float] = None, window_width: Optional[float] = None,
+               size: Optional[int] = None, fmt: str = 'jpeg', namespace: str = '') -> Tuple[bytes, str]:
+        """
+        Render an image at the requested window/level, size and format.
+
+        Missing window values fall back to the image's stored window, then to
+        the full pixel range.
+
+        Args:
+            image: DicomImage instance
+            window_center: Window center (stored/HU units)
+            window_width: Window width
+            size: Longest output edge in pixels (None keeps original size)
+            fmt: Output format: jpeg, png or webp
+            namespace: Cache namespace (ImageCacheService.cache_namespace)
+
+        Returns:
+            tuple: (image bytes, content type)
+
+        Raises:
+            ValueError: For unsupported format or size
+            OriginalPixelsUnavailable: If no suitable source is stored
+        """
+        if fmt not in cls.FORMATS:
+            raise ValueError(f"Unsupported format '{fmt}'")
+        if size is not None and not cls.MIN_SIZE <= size <= cls.MAX_SIZE:
+            raise ValueError(f"size must be between {cls.MIN_SIZE} and {cls.MAX_SIZE}")
+        if any(v is not None and not math.isfinite(v) for v in (window_center, window_width)):
+            raise ValueError("wc and ww must be finite numbers")
+
+        pil_format, content_type = cls.FORMATS[fmt]
+
+        default_center, default_width = cls.default_window(image)
+        window_center = window_center if window_center is not None else default_center
+        window_width = window_width if window_width is not None else default_width
+
+        pixels = None
+        if window_center is None or window_width is None:
+            # No window anywhere - stretch the full range of this image
+            pixels, slope, intercept, invert = cls.load_pixels(image)
+            window_center, window_width = cls._full_range_window(pixels, slope, intercept)
+
+        cache_key = cls._render_cache_key(image, window_center, window_width, size, fmt, namespace)
+        cached = cache.get(cache_key)
+        if cached:
+            logger.debug(f"Render cache HIT for image {image.pk}")
+            cache_metrics.lookup('render', hit=True, value=cached)
+            return cached, content_type
+
+        with cache_metrics.timed('render', 'generation'):
+            if pixels is None:
+                pixels, slope, intercept, invert = cls.load_pixels(image)
+
+            output = cls._window_image(pixels, window_center, window_width, slope, intercept, invert)
+            if size and max(output.size) != size:
+                scale = size / max(output.size)
+                output = output.resize(
+                    (max(1, round(output.width * scale)), max(1, round(output.height * scale))),
+                    Image.Resampling.LANCZOS
+                )
+
+            buffer = io.BytesIO()
+            save_kwargs = {}
+            if pil_format == 'JPEG':
+                save_kwargs['quality'] = cls.JPEG_QUALITY
+            elif pil_format == 'WEBP':
+                save_kwargs['quality'] = cls.WEBP_QUALITY
+            output.save(buffer, format=pil_format, **save_kwargs)
+            image_bytes = buffer.getvalue()
+
+        cache.set(cache_key, image_bytes, cls.RENDER_TTL)
+        cache_metrics.lookup('render', hit=False, value=image_bytes)
+        logger.info(f"Rendered image {image.pk} at WC={window_center:g} WW={window_width:g}")
+        return image_bytes, content_type
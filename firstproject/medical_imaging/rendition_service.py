@@ -0,0 +1,298 @@
+"""
+Content-negotiated image renditions.
+Provides:
+- Output format selection (AVIF, JPEG XL, WebP, JPEG, PNG) from the Accept header
+- Per-modality quality profiles
+- Diagnostic (near-lossless) and lossless encoding modes, from the stored
+  original DICOM pixels
+- Two-tier (process/Redis) caching per size, quality mode and format
+
+One endpoint serves every client the smallest format it can decode: AVIF
+and WebP cut bytes per slice substantially against JPEG for modern
+browsers, older clients still get JPEG. JPEG XL is offered only when a
+Pillow JPEG XL plugin is installed.
+"""
+import io
+import logging
+from typing import Dict, Optional
+
+from PIL import Image, features
+
+from .cache_metrics import cache_metrics
+from .image_cache_service import ImageCacheService
+from .render_service import DicomRenderService, OriginalPixelsUnavailable
+from .tiered_cache import image_cache as cache
+
+logger = logging.getLogger(__name__)
+
+
+class NegotiatedRenditionService:
+    """Service for encoding images in the best format a client accepts."""
+
+    # Cache key prefix
+    RENDITION_PREFIX = "img_neg"
+
+    # Output formats: name -> (PIL format, content type)
+    FORMATS = {
+        'avif': ('AVIF', 'image/avif'),
+        'jxl': ('JXL', 'image/jxl'),
+        'webp': ('WEBP', 'image/webp'),
+        'jpeg': ('JPEG', 'image/jpeg'),
+        'png': ('PNG', 'image/png'),
+    }
+
+    # Candidate formats per quality mode, smallest output first. Used when
+    # the client accepts several formats equally. Lossless output is WebP
+    # (lossless mode) or PNG: AVIF's YUV conversion is not exactly lossless.
+    PREFERENCES = {
+        'standard': ('avif', 'jxl', 'webp', 'jpeg'),
+        'diagnostic': ('avif', 'jxl', 'webp', 'jpeg'),
+        'lossless': ('webp', 'png'),
+    }
+
+    # Formats some clients cannot decode: served only when their media type is
+    # listed explicitly, never through the image/* or */* wildcards
+    EXPLICIT_ONLY = ('avif', 'jxl', 'webp')
+
+    # Quality modes encoded from the original pixels: the stored JPEG of a
+    # DICOM upload is lossy and pre-windowed, useless for diagnostic reads
+    ORIGINAL_QUALITIES = ('diagnostic', 'lossless')
+
+    # Format served when the request has no Accept header
+    FALLBACK = {'standard': 'jpeg', 'diagnostic': 'jpeg', 'lossless': 'png'}
+
+    # Output sizes: name -> bounding box (None = full resolution)
+    SIZES = {
+        'preview': ImageCacheService.PREVIEW_SIZE,
+        'full': None,
+    }
+
+    # Lossy quality per modality and format ('standard' mode)
+    QUALITY_PROFILES = {
+        'default': {'avif': 60, 'jxl': 80, 'webp': 80, 'jpeg': 85},
+        # Smooth, low-noise cross-sections compress well
+        'CT': {'avif': 62, 'jxl': 82, 'webp': 82, 'jpeg': 85},
+        'MRI': {'avif': 62, 'jxl': 82, 'webp': 82, 'jpeg': 85},
+        # Fine trabecular and line detail in projection radiographs
+        'XRAY': {'avif': 70, 'jxl': 88, 'webp': 88, 'jpeg': 90},
+        # Speckle noise: higher quality mostly spends bytes on noise
+        'ULTRASOUND': {'avif': 55, 'jxl': 75, 'webp': 75, 'jpeg': 80},
+    }
+
+    # Near-lossless quality for diagnostic reads (no chroma subsampling)
+    DIAGNOSTIC_QUALITY = {'avif': 90, 'jxl': 95, 'webp': 95, 'jpeg': 95}
+
+    # Cache TTL (in seconds)
+    RENDITION_TTL = ImageCacheService.COMPRESSED_TTL
+
+    @classmethod
+    def is_available(cls, fmt: str) -> bool:
+        """Whether this Pillow build can encode a format."""
+        if fmt == 'avif':
+            return features.check('avif')
+        if fmt == 'webp':
+            return features.check('webp')
+        if fmt == 'jxl':
+            return 'JXL' in Image.SAVE
+        return True
+
+    @staticmethod
+    def parse_accept(accept: str) -> Dict[str, float]:
+        """
+        Parse an Accept header into media range -> q value.
+
+        Args:
+            accept: Accept header value
+
+        Returns:
+            dict: e.g. {'image/avif': 1.0, '*/*': 0.8}
+        """
+        ranges = {}
+        for item in accept.split(','):
+            media_range, *params = [part.strip() for part in item.split(';')]
+            if not media_range:
+                continue
+            q = 1.0
+            for param in params:
+                name, _, value = param.partition('=')
+                if name.strip().lower() == 'q':
+                    try:
+                        q = float(value)
+                    except ValueError:
+                        q = 0.0
+            ranges[media_range.lower()] = max(q, ranges.get(media_range.lower(), 0.0))
+        return ranges
+
+    @classmethod
+    def negotiate(cls, accept: Optional[str], quality: str = 'standard') -> Optional[str]:
+        """
+        Pick the output format for a request.
+
+        The format with the highest q value wins; ties go to the smaller
+        format (PREFERENCES order). An explicit media type overrides the
+        image/* and */* wildcards. AVIF, JPEG XL and WebP must be listed
+        explicitly: browsers send wildcards (e.g. Safari 13's
+        "image/png,image/*;q=0.8,*/*;q=0.5") without being able to decode
+        them, so wildcards only match JPEG and PNG.
+
+        Args:
+            accept: Accept header (None or empty: FALLBACK format)
+            quality: Quality mode ('standard', 'diagnostic' or 'lossless')
+
+        Returns:
+            str: Format name, or None if the client accepts none of the candidates
+        """
+        if not accept:
+            return cls.FALLBACK[quality]
+
+        ranges = cls.parse_accept(accept)
+        best, best_q = None, 0.0
+        for fmt in cls.PREFERENCES[quality]:
+            if not cls.is_available(fmt):
+                continue
+            content_type = cls.FORMATS[fmt][1]
+            if fmt in cls.EXPLICIT_ONLY:
+                q = ranges.get(content_type, 0.0)
+            else:
+                q = ranges.get(content_type, ranges.get('image/*', ranges.get('*/*', 0.0)))
+            if q > best_q:
+                best, best_q = fmt, q
+        return best
+
+    @classmethod
+    def encode(cls, image: Image.Image, fmt: str, quality: str = 'standard', modality: str = '') -> bytes:
+        """
+        Encode an image in a format and quality mode.
+
+        Args:
+            image: Decoded PIL Image
+            fmt: Format name (see FORMATS)
+            quality: 'standard' (modality profile), 'diagnostic' or 'lossless'
+            modality: Study modality selecting the quality profile
+
+        Returns:
+            bytes: Encoded image
+        """
+        pil_format = cls.FORMATS[fmt][0]
+        if quality == 'lossless':
+            save_kwargs = {'lossless': True, 'quality': 100, 'method': 4} if fmt == 'webp' else {}
+        else:
+            if quality == 'diagnostic':
+                level = cls.DIAGNOSTIC_QUALITY[fmt]
+            else:
+                level = cls.QUALITY_PROFILES.get(modality, cls.QUALITY_PROFILES['default'])[fmt]
+            save_kwargs = {'quality': level}
+            if fmt == 'avif':
+                save_kwargs['speed'] = ImageCacheService.AVIF_SPEED
+                if quality == 'diagnostic':
+                    save_kwargs['subsampling'] = '4:4:4'
+            elif fmt == 'jpeg':
+                save_kwargs['optimize'] = True
+                if quality == 'diagnostic':
+                    save_kwargs['subsampling'] = 0
+
+        buffer = io.BytesIO()
+        image.save(buffer, format=pil_format, **save_kwargs)
+        return buffer.getvalue()
+
+    @classmethod
+    def from_original(cls, image, quality: str) -> bool:
+        """Whether a quality mode is encoded from the image's original DICOM pixels."""
+        return quality in cls.ORIGINAL_QUALITIES and image.is_dicom
+
+    @classmethod
+    def _cache_key(cls, image, size: str, fmt: str, quality: str, namespace: str) -> str:
+        modality = image.study.modality
+        profile = modality if quality == 'standard' and modality in cls.QUALITY_PROFILES else ''
+        source = 'original' if cls.from_original(image, quality) else 'file'
+        return ImageCacheService._generate_cache_key(
+            cls.RENDITION_PREFIX, image.image_file.name, f"{size}.{quality}.{profile}.{source}.{fmt}", namespace
+        )
+
+    @classmethod
+    def _load_source(cls, image, quality: str) -> Optional[Image.Image]:
+        """
+        Decoded source of a rendition.
+
+        Diagnostic and lossless renditions of DICOM uploads are rendered from
+        the stored original at the stored window/level; other renditions
+        (and regular uploads, stored unchanged) decode the image file.
+
+        Raises:
+            OriginalPixelsUnavailable: If a DICOM upload has no stored original
+        """
+        if not cls.from_original(image, quality):
+            return ImageCacheService._load_image_from_storage(image.image_file.name)
+
+        if not image.original_file:
+            raise OriginalPixelsUnavailable(f"Image {image.pk} has no stored original for {quality} renditions")
+        return DicomRenderService.render_stored_window(image)
+
+    @classmethod
+    def _render(cls, image, size: str, fmt: str, quality: str) -> Optional[bytes]:
+        source = cls._load_source(image, quality)
+        if source is None:
+            return None
+
+        with cache_metrics.timed('rendition', 'generation'):
+            bounds = cls.SIZES[size]
+            if bounds and (source.width > bounds[0] or source.height > bounds[1]):
+                source.thumbnail(bounds, Image.Resampling.LANCZOS)
+            return cls.encode(source, fmt, quality, image.study.modality)
+
+    @classmethod
+    def get_rendition(cls, image, fmt: str, size: str = 'preview', quality: str = 'standard',
+                      namespace: str = '') -> Optional[bytes]:
+        """
+        Get (or encode and cache) an image in a negotiated format.
+
+        Each size, quality mode, quality profile and format is cached under
+        its own key; misses are single-flight.
+
+        Args:
+            image: DicomImage instance (with its study)
+            fmt: Format name from negotiate()
+            size: 'preview' or 'full'
+            quality: 'standard', 'diagnostic' or 'lossless'
+            namespace: Cache namespace from ImageCacheService.cache_namespace()
+
+        Returns:
+            bytes: Encoded image, or None if the image cannot be loaded
+
+        Raises:
+            ValueError: If size, quality or format is not supported
+            OriginalPixelsUnavailable: If a diagnostic or lossless rendition of
+                a DICOM upload is requested and its original is not stored
+        """
+        if size not in cls.SIZES:
+            raise ValueError(f"size must be one of: {', '.join(cls.SIZES)}")
+        if quality not in cls.PREFERENCES:
+            raise ValueError(f"quality must be one of: {', '.join(cls.PREFERENCES)}")
+        if fmt not in cls.PREFERENCES[quality] or not cls.is_available(fmt):
+            raise ValueError(f"Format {fmt} not available for {quality} quality")
+
+        missed = []
+
+        def load() -> Optional[bytes]:
+            missed.append(True)
+            return cls._render(image, size, fmt, quality)
+
+        data = cache.get_or_compute(cls._cache_key(image, size, fmt, quality, namespace), load, cls.RENDITION_TTL)
+        cache_metrics.lookup('rendition', hit=not missed, value=data)
+        return data
+
+    @classmethod
+    async def aget_rendition(cls, image, fmt: str, size: str = 'preview', quality: str = 'standard',
+                             namespace: str = '') -> Optional[bytes]:
+        """
+        Async get_rendition: hits are one non-blocking cache read, misses
+        are encoded in the image pool.
+        """
+        if size in cls.SIZES and quality in cls.PREFERENCES:
+            cached = await cache.aget_fresh(cls._cache_key(image, size, fmt, quality, namespace))
+            if cached:
+                # Local counters only (flushed by a background thread): safe on the event loop
+                cache_metrics.lookup('rendition', hit=True, value=cached)
+                return cached
+
+        return await ImageCacheService.run_blocking(cls.get_rendition, image, fmt, size, quality, namespace)
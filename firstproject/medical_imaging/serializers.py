@@ -2,12 +2,93 @@ from rest_framework import serializers
 from .models import Hospital, Patient, ImagingStudy, DicomImage, Diagnosis, AuditLog, ContactMessage, TaskStatus, PatientReport
 from django.contrib.auth.models import User
 
-class HospitalSerializer(serializers.ModelSerializer):
+
+class AnnotatedFieldMixin:
+    """
+    Read-only field whose value is annotated onto the instance by the
+    viewset queryset (see querysets.py). Instances loaded without the
+    annotation (e.g. just created) fall back to `fallback(instance)`.
+    """
+
+    def __init__(self, fallback, **kwargs):
+        self.fallback = fallback
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def get_attribute(self, instance):
+        try:
+            return getattr(instance, self.source)
+        except AttributeError:
+            return self.fallback(instance)
+
+
+class AnnotatedCountField(AnnotatedFieldMixin, serializers.IntegerField):
+    """Count annotated by the queryset (Count())"""
+
+
+class AnnotatedExistsField(AnnotatedFieldMixin, serializers.BooleanField):
+    """Flag annotated by the queryset (Exists())"""
+
+
+def requested_fieldset(request):
+    """
+    Sparse fieldset requested with ?fields= and ?expand= (comma-separated).
+
+    Returns:
+        tuple: (set of fields, or None for all fields; set of expanded fields)
+    """
+    # DRF Request or plain HttpRequest
+    params = getattr(request, 'query_params', getattr(request, 'GET', {}))
+
+    def names(param):
+        value = params.get(param, '')
+        return {name.strip() for name in value.split(',') if name.strip()}
+
+    return names('fields') or None, names('expand')
+
+
+class SparseFieldsetMixin:
+    """
+    Sparse fieldsets for GET responses.
+
+    ?fields=id,instance_number  only these fields
+    ?expand=dicom_metadata      also fields listed in Meta.expandable_fields,
+                                which are left out by default
+
+    Applies to the top-level serializer of a response (each item of a
+    top-level list); nested serializers keep their fields. Viewsets using
+    querysets.SparseQuerysetMixin load only the columns of the rendered
+    fields; fields not backed by a model field list theirs in
+    Meta.column_sources.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or request.method != 'GET' or not self._is_response_root():
+            return fields
+
+        only, expand = requested_fieldset(request)
+        for name in getattr(self.Meta, 'expandable_fields', ()):
+            if name not in expand:
+                fields.pop(name, None)
+        if only:
+            fields = {name: field for name, field in fields.items() if name in only}
+        return fields
+
+    def _is_response_root(self):
+        parent = self.parent
+        if isinstance(parent, serializers.ListSerializer):
+            parent = parent.parent
+        return parent is None
+
+
+class HospitalSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for Hospital model
     Converts Hospita objects to/from JSON
     """
-    patient_count = serializers.SerializerMethodField()
+    patient_count = AnnotatedCountField(lambda hospital: hospital.patients.count())
 
     class Meta: 
         model = Hospital
@@ -16,12 +97,8 @@ class HospitalSerializer(serializers.ModelSerializer):
             "patient_count"
         ]
         read_only_fields = ['created_at']
-    
-    def get_patient_count(self, obj):
-        """Count total patients in this hospital"""
-        return obj.patients.count()
-    
-class PatientListSerializer(serializers.ModelSerializer):
+
+class PatientListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
       """
       Lightweight serializer for patient list view
       Only includes essential fields for performance
@@ -35,6 +112,7 @@ class PatientListSerializer(serializers.ModelSerializer):
                     'date_of_birth', 'age', 'gender', 'phone', 'email', 'address',
                     'hospital', 'hospital_name', 'created_at']
           read_only_fields = ['full_name', 'created_at', 'age', 'hospital_name']
+          column_sources = {'full_name': ('first_name', 'last_name'), 'age': ('date_of_birth',)}
 
       def get_age(self, obj):
           """Calculate patient age in years"""
@@ -45,14 +123,14 @@ class PatientListSerializer(serializers.ModelSerializer):
           )
 
 
-class PatientDetailSerializer(serializers.ModelSerializer):
+class PatientDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
       """
       Detailed serializer for single patient view
       Includes related data like imaging studies count
       """
       hospital_name = serializers.CharField(source='hospital.name', read_only=True)
       age = serializers.SerializerMethodField()
-      total_studies = serializers.SerializerMethodField()
+      total_studies = AnnotatedCountField(lambda patient: patient.imaging_studies.count())
       recent_studies = serializers.SerializerMethodField()
 
       class Meta:
@@ -62,6 +140,7 @@ class PatientDetailSerializer(serializers.ModelSerializer):
                     'hospital', 'hospital_name', 'total_studies', 'recent_studies',
                     'created_at', 'updated_at']
           read_only_fields = ['full_name', 'created_at', 'updated_at']
+          column_sources = {'full_name': ('first_name', 'last_name'), 'age': ('date_of_birth',)}
 
       def get_age(self, obj):
           from datetime import date
@@ -70,18 +149,18 @@ class PatientDetailSerializer(serializers.ModelSerializer):
               (today.month, today.day) < (obj.date_of_birth.month, obj.date_of_birth.day)
           )
 
-      def get_total_studies(self, obj):
-          return obj.imaging_studies.count()
-
       def get_recent_studies(self, obj):
-          """Get 5 most recent studies"""
-          recent = obj.imaging_studies.all()[:5]
+          """Get 5 most recent studies (prefetched by the viewset when available)"""
+          recent = getattr(obj, 'recent_studies_list', None)
+          if recent is None:
+              recent = obj.imaging_studies.all()[:5]
           return ImagingStudyListSerializer(recent, many=True).data
 
 
-class DicomImageSerializer(serializers.ModelSerializer):
+class DicomImageSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
       """
       Serializer for DICOM images with full metadata support
+      The full tag dump (dicom_metadata) is only included with ?expand=dicom_metadata
       """
       image_url = serializers.SerializerMethodField()
 
@@ -105,6 +184,8 @@ class DicomImageSerializer(serializers.ModelSerializer):
               'file_size_bytes', 'is_dicom', 'uploaded_at'
           ]
           read_only_fields = ['uploaded_at', 'file_size_bytes']
+          expandable_fields = ['dicom_metadata']
+          column_sources = {'image_url': ('image_file',)}
 
       def get_image_url(self, obj):
           """Return full URL for the image file"""
@@ -115,7 +196,17 @@ class DicomImageSerializer(serializers.ModelSerializer):
           return None
 
 
-class DiagnosisSerializer(serializers.ModelSerializer):
+class DicomImageSummarySerializer(DicomImageSerializer):
+      """
+      DICOM image without the full metadata JSON, for images nested in a study
+      (the tags are served by /api/images/{id}/dicom-tags/)
+      """
+
+      class Meta(DicomImageSerializer.Meta):
+          fields = [field for field in DicomImageSerializer.Meta.fields if field != 'dicom_metadata']
+
+
+class DiagnosisSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
       """
       Serializer for Diagnosis
       """
@@ -126,16 +217,17 @@ class DiagnosisSerializer(serializers.ModelSerializer):
           fields = ['id', 'study', 'radiologist', 'radiologist_name', 'findings',
                     'impression', 'severity', 'recommendations', 'diagnosed_at', 'updated_at']
           read_only_fields = ['diagnosed_at', 'updated_at', 'study', 'radiologist', 'radiologist_name']
+          column_sources = {'radiologist_name': ('radiologist__first_name', 'radiologist__last_name')}
 
 
-class ImagingStudyListSerializer(serializers.ModelSerializer):
+class ImagingStudyListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
       """
       Lightweight serializer for imaging study list
       """
       patient_name = serializers.CharField(source='patient.full_name', read_only=True)
       patient_mrn = serializers.CharField(source='patient.medical_record_number', read_only=True)
-      image_count = serializers.SerializerMethodField()
-      has_diagnosis = serializers.SerializerMethodField()
+      image_count = AnnotatedCountField(lambda study: study.images.count())
+      has_diagnosis = AnnotatedExistsField(lambda study: hasattr(study, 'diagnosis'))
 
       class Meta:
           model = ImagingStudy
@@ -143,22 +235,17 @@ class ImagingStudyListSerializer(serializers.ModelSerializer):
                     'modality', 'body_part', 'status', 'clinical_notes', 'referring_physician',
                     'image_count', 'has_diagnosis', 'created_at']
           read_only_fields = ['created_at']
-
-      def get_image_count(self, obj):
-          return obj.images.count()
-
-      def get_has_diagnosis(self, obj):
-          return hasattr(obj, 'diagnosis')
+          column_sources = {'patient_name': ('patient__first_name', 'patient__last_name')}
 
 
-class ImagingStudyDetailSerializer(serializers.ModelSerializer):
+class ImagingStudyDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
       """
       Detailed serializer for single imaging study
-      Includes images and diagnosis
+      Includes the diagnosis, and the images with ?expand=images
       """
       patient_name = serializers.CharField(source='patient.full_name', read_only=True)
       patient_mrn = serializers.CharField(source='patient.medical_record_number', read_only=True)
-      images = DicomImageSerializer(many=True, read_only=True)
+      images = DicomImageSummarySerializer(many=True, read_only=True)
       diagnosis = DiagnosisSerializer(read_only=True)
 
       class Meta:
@@ -167,9 +254,11 @@ class ImagingStudyDetailSerializer(serializers.ModelSerializer):
                     'modality', 'body_part', 'status', 'referring_physician',
                     'clinical_notes', 'images', 'diagnosis', 'created_at', 'updated_at']
           read_only_fields = ['created_at', 'updated_at']
+          expandable_fields = ['images']
+          column_sources = {'patient_name': ('patient__first_name', 'patient__last_name')}
 
 
-class AuditLogSerializer(serializers.ModelSerializer):
+class AuditLogSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
       """
       Serializer for audit logs (read-only for compliance)
       """
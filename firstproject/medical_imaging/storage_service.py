@@ -0,0 +1,71 @@
+"""
+Deterministic writes to default_storage.
+Provides:
+- Writes that replace the file at a fixed key instead of saving a suffixed copy
+- Atomic replacement on the local filesystem (temporary file + rename)
+- The 'overwrite' storage alias for object stores (S3 with file_overwrite)
+
+Storage.save() never overwrites: when the key exists it picks a free name
+(key_AbC123.jpg). Renditions and content-addressed originals live at keys
+computed from the image, so they must be written in place.
+"""
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage, storages
+
+logger = logging.getLogger(__name__)
+
+
+class StorageService:
+    """Service for writing files under fixed storage keys."""
+
+    # settings.STORAGES alias of default_storage configured to overwrite
+    OVERWRITE_ALIAS = 'overwrite'
+
+    @classmethod
+    def write_replacing(cls, key: str, data: bytes) -> None:
+        """
+        Write data at a key, replacing any file already stored there.
+
+        Readers see either the old or the new bytes: on the local filesystem
+        the data goes to a temporary file that is renamed over the key, and
+        the 'overwrite' storage (S3) replaces the object with a single PUT.
+        Other backends fall back to delete() then save(), which leaves a
+        short window without a file.
+
+        Args:
+            key: Storage key
+            data: File content
+        """
+        try:
+            path = default_storage.path(key)
+        except NotImplementedError:
+            path = None
+
+        if path is not None:
+            cls._replace_local(path, data)
+        elif cls.OVERWRITE_ALIAS in settings.STORAGES:
+            storages[cls.OVERWRITE_ALIAS].save(key, ContentFile(data))
+        else:
+            default_storage.delete(key)
+            default_storage.save(key, ContentFile(data))
+
+    @staticmethod
+    def _replace_local(path: str, data: bytes) -> None:
+        """Write a temporary file next to path and rename it over path."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            permissions = getattr(settings, 'FILE_UPLOAD_PERMISSIONS', None)
+            if permissions is not None:
+                os.chmod(tmp_path, permissions)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
@@ -4,19 +4,29 @@ Enhanced with:
 - Idempotent locking
 - Structured audit logging
 - Correlation ID tracking for distributed tracing
+- Cache warming once a study finishes processing
 """
+from billiard import Pool as ProcessPool
 from celery import shared_task
+from django.conf import settings
 from django.core.files.base import ContentFile
-from django.core.files import File
 from django.core.cache import cache
 from django.db import transaction
-import tempfile
+from PIL import Image
+import hashlib
+import io
 import os
 import logging
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 from .models import ImagingStudy, DicomImage, TaskStatus, Patient, PatientReport, AuditLog
 from .dicom_service import DicomParsingService
+from .image_cache_service import ImageCacheService
+from .ingest_writer import DicomImageBatchWriter, TaskProgressReporter
+from .original_storage_service import DicomOriginalService
+from .upload_staging_service import UploadStagingService
 from .pdf_service import PatientReportGenerator
 from django.core.files.storage import default_storage
 from config.correlation_middleware import set_correlation_id, get_correlation_id
@@ -26,10 +36,181 @@ logger = logging.getLogger(__name__)
 # Lock timeout: 10 minutes (600 seconds)
 LOCK_TIMEOUT = 600
 
+# Warmup priorities (Redis broker: 0 is served first). Warmups of fresh uploads
+# go ahead of those queued in bulk by reprocessing.
+WARMUP_PRIORITY_UPLOAD = 3
+WARMUP_PRIORITY_REPROCESS = 9
+
 # Processing pipeline version (update when DICOM parsing logic changes)
 DICOM_PROCESSING_VERSION = "v1.2.0"
 
 
+@contextmanager
+def _open_file_content(file_data):
+    """
+    Yield the raw content of one uploaded file.
+
+    Staged uploads carry a storage key plus size and checksum, which are
+    verified on read (memory-mapped on local storage). Legacy messages
+    carry the bytes inline in 'content'.
+    """
+    if 'storage_key' in file_data:
+        with UploadStagingService.open_staged_buffer(
+            file_data['storage_key'],
+            expected_size=file_data.get('size'),
+            expected_sha256=file_data.get('sha256'),
+        ) as buffer:
+            yield buffer
+    else:
+        yield file_data['content']
+
+
+def _cleanup_staged_files(file_data_list):
+    """Delete the staged uploads referenced by a task's file list."""
+    storage_keys = [f['storage_key'] for f in file_data_list if 'storage_key' in f]
+    if storage_keys:
+        UploadStagingService.delete_staged_files(storage_keys)
+
+
+def _ingest_pool_size(file_count):
+    """Number of worker processes to use for a batch of files."""
+    workers = getattr(settings, 'DICOM_INGEST_WORKERS', 0) or os.cpu_count() or 1
+    return max(1, min(workers, file_count))
+
+
+def _ingest_file(file_data):
+    """
+    CPU-bound ingest of a single uploaded file.
+
+    Runs inside a pool worker process, so it must not touch the database.
+    Parses the DICOM dataset, extracts metadata, stores the original DICOM
+    and encodes the display rendition; the parent task persists the result
+    in the finalize step.
+
+    Args:
+        file_data: File entry from the task's file_data_list
+
+    Returns:
+        dict: 'filename', 'instance_number', 'is_dicom', 'fields' (DicomImage
+        field values), 'rendition' (bytes to store), 'rendition_name' and
+        'error' (message or None)
+    """
+    filename = file_data.get('filename', 'unknown')
+    result = {
+        'filename': filename,
+        'instance_number': file_data.get('instance_number'),
+        'is_dicom': False,
+        'fields': {},
+        'rendition': None,
+        'rendition_name': filename,
+        'renditions': {},
+        'error': None,
+    }
+
+    try:
+        with _open_file_content(file_data) as content:
+            # One read yields detection, metadata, pixels and the JPEG rendition
+            ingested = DicomParsingService.ingest(content, jpeg_quality=90)
+            result['is_dicom'] = ingested['is_dicom']
+
+            if ingested['metadata'] is not None:
+                result['fields'] = _image_fields_from_metadata(
+                    ingested['metadata'], str(ingested['dataset'].get('SOPInstanceUID', ''))
+                )
+
+            if ingested['is_dicom']:
+                # Keep the source so renditions can be regenerated without a re-upload
+                original = DicomOriginalService.store_original(content, file_data.get('sha256'))
+                result['fields']['original_file'] = original['storage_key']
+                result['fields']['original_sha256'] = original['sha256']
+
+            if ingested['rendition'] is not None:
+                result['rendition'] = ingested['rendition']
+                result['rendition_name'] = f"{filename}.jpg"
+            else:
+                # Regular image (non-DICOM or DICOM render failed): store the original
+                result['rendition'] = bytes(content)
+
+        if getattr(settings, 'INGEST_RENDITIONS_ENABLED', True):
+            result['renditions'] = _generate_renditions(ingested['image'], result['rendition'])
+
+    except Exception as e:
+        result['error'] = f"Error processing {filename}: {str(e)}"
+        logger.error(result['error'], exc_info=True)
+
+    return result
+
+
+def _generate_renditions(image, rendition):
+    """
+    Encode the thumbnail/preview/WebP/AVIF pyramid for one file.
+
+    Failures only cost the precomputed renditions (they are generated
+    lazily on first request instead), never the image itself.
+    """
+    try:
+        if image is None:
+            image = Image.open(io.BytesIO(rendition))
+        variants = list(ImageCacheService.LAZY_VARIANTS)
+        if getattr(settings, 'INGEST_RENDITIONS_AVIF', True):
+            variants.append('avif')
+        return ImageCacheService.generate_variants(image, variants)
+    except Exception as e:
+        logger.warning(f"Could not generate renditions: {str(e)}")
+        return {}
+
+
+def _image_fields_from_metadata(metadata, sop_uid):
+    """Map extracted DICOM metadata onto DicomImage field values."""
+    return {
+        'slice_thickness': metadata['spatial']['slice_thickness'],
+        'pixel_spacing': str(metadata['spatial']['pixel_spacing']),
+        'slice_location': metadata['spatial']['slice_location'],
+        'rows': metadata['image']['rows'],
+        'columns': metadata['image']['columns'],
+        'bits_allocated': metadata['image']['bits_allocated'],
+        'bits_stored': metadata['image']['bits_stored'],
+        'window_center': str(metadata['display']['window_center']),
+        'window_width': str(metadata['display']['window_width']),
+        'rescale_intercept': metadata['display']['rescale_intercept'],
+        'rescale_slope': metadata['display']['rescale_slope'],
+        'manufacturer': metadata['equipment']['manufacturer'],
+        'manufacturer_model': metadata['equipment']['model'],
+        'sop_instance_uid': sop_uid,
+        'dicom_metadata': metadata,
+    }
+
+
+def _run_ingest(file_data_list):
+    """
+    Run _ingest_file over a batch, in parallel when more than one worker is useful.
+
+    Uses billiard (Celery's multiprocessing fork) because prefork worker
+    children are daemonic and the stdlib pool refuses to start from them.
+
+    Yields:
+        dict: One _ingest_file result per file, in completion order
+    """
+    workers = _ingest_pool_size(len(file_data_list))
+
+    if workers <= 1:
+        for file_data in file_data_list:
+            yield _ingest_file(file_data)
+        return
+
+    chunksize = max(1, len(file_data_list) // (workers * 4))
+    pool = ProcessPool(processes=workers)
+    try:
+        for result in pool.imap_unordered(_ingest_file, file_data_list, chunksize):
+            yield result
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+
 @shared_task(
     bind=True,
     max_retries=3,
@@ -52,7 +233,8 @@ def process_dicom_images_async(self, study_id, file_data_list, user_id=None, cor
 
     Args:
         study_id: ID of the imaging study
-        file_data_list: List of dicts with 'filename', 'content', 'instance_number'
+        file_data_list: List of dicts with 'filename', 'instance_number' and either
+            'storage_key', 'size', 'sha256' (staged upload) or 'content' (inline bytes)
         user_id: ID of the user who initiated the task
         correlation_id: Correlation ID from the originating request (for tracing)
 
@@ -110,6 +292,7 @@ def process_dicom_images_async(self, study_id, file_data_list, user_id=None, cor
                 # Check if already completed (idempotency)
                 if study.status == 'completed':
                     logger.info(f"Study {study_id} already completed. Skipping.")
+                    _cleanup_staged_files(file_data_list)
                     return {
                         'status': 'already_completed',
                         'study_id': study_id
@@ -152,127 +335,29 @@ def process_dicom_images_async(self, study_id, file_data_list, user_id=None, cor
                     'error': 'Study not found',
                 }
             )
+            _cleanup_staged_files(file_data_list)
             return {'error': 'Study not found'}
 
-        created_images = []
-        skipped_images = []
-        errors = []
-
-        for idx, file_data in enumerate(file_data_list):
-            try:
-                # Update progress
-                task_status.processed_items = idx
-                task_status.save()
+        # Fan the CPU-bound per-file work (parse, windowing, JPEG encode) out
+        # to a process pool; results arrive as each file finishes and are
+        # written in bulk batches, with throttled progress updates.
+        writer = DicomImageBatchWriter(
+            study, batch_size=getattr(settings, 'DICOM_BULK_CREATE_BATCH_SIZE', None)
+        )
+        progress = TaskProgressReporter(
+            task_status,
+            every_items=getattr(settings, 'DICOM_PROGRESS_UPDATE_ITEMS', None),
+            every_seconds=getattr(settings, 'DICOM_PROGRESS_UPDATE_SECONDS', None),
+        )
+        for processed, result in enumerate(_run_ingest(file_data_list), start=1):
+            writer.add(result)
+            progress.update(processed)
+        writer.flush()
 
-                filename = file_data['filename']
-                content = file_data['content']
-                instance_number = file_data['instance_number']
-
-                # Create a temporary file from the content
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.dcm') as temp_file:
-                    temp_file.write(content)
-                    temp_path = temp_file.name
-
-                try:
-                    # Check if it's a DICOM file
-                    with open(temp_path, 'rb') as f:
-                        file_obj = File(f, name=filename)
-                        is_dicom = DicomParsingService.is_dicom_file(file_obj)
-
-                    image_data = {
-                        'study': study,
-                        'instance_number': instance_number,
-                        'is_dicom': is_dicom,
-                    }
-
-                    if is_dicom:
-                        # Parse DICOM metadata
-                        with open(temp_path, 'rb') as f:
-                            file_obj = File(f, name=filename)
-                            dicom_dataset, metadata = DicomParsingService.parse_dicom_file(file_obj)
-
-                        if dicom_dataset and metadata:
-                            # Check for duplicate SOP Instance UID
-                            sop_uid = str(dicom_dataset.get('SOPInstanceUID', ''))
-                            if sop_uid:
-                                existing_image = DicomImage.objects.filter(sop_instance_uid=sop_uid).first()
-                                if existing_image:
-                                    skipped_images.append({
-                                        'filename': filename,
-                                        'reason': 'Duplicate SOP Instance UID',
-                                        'sop_instance_uid': sop_uid
-                                    })
-                                    logger.info(f"Skipping duplicate DICOM: {filename} (SOP UID: {sop_uid})")
-                                    continue
-
-                            # Extract DICOM metadata
-                            image_data.update({
-                                'slice_thickness': metadata['spatial']['slice_thickness'],
-                                'pixel_spacing': str(metadata['spatial']['pixel_spacing']),
-                                'slice_location': metadata['spatial']['slice_location'],
-                                'rows': metadata['image']['rows'],
-                                'columns': metadata['image']['columns'],
-                                'bits_allocated': metadata['image']['bits_allocated'],
-                                'bits_stored': metadata['image']['bits_stored'],
-                                'window_center': str(metadata['display']['window_center']),
-                                'window_width': str(metadata['display']['window_width']),
-                                'rescale_intercept': metadata['display']['rescale_intercept'],
-                                'rescale_slope': metadata['display']['rescale_slope'],
-                                'manufacturer': metadata['equipment']['manufacturer'],
-                                'manufacturer_model': metadata['equipment']['model'],
-                                'sop_instance_uid': sop_uid,
-                                'dicom_metadata': metadata,
-                            })
-
-                            # Convert DICOM to PIL Image and save as JPEG
-                            pil_image = DicomParsingService.dicom_to_pil_image(dicom_dataset)
-
-                            if pil_image:
-                                # Save as JPEG in temp file
-                                jpeg_temp_path = temp_path + '.jpg'
-                                pil_image.save(jpeg_temp_path, 'JPEG', quality=90)
-
-                                # Read back and create DicomImage
-                                with open(jpeg_temp_path, 'rb') as f:
-                                    image = DicomImage.objects.create(
-                                        **image_data,
-                                        image_file=File(f, name=f"{filename}.jpg")
-                                    )
-                                    created_images.append({
-                                        'id': image.id,
-                                        'filename': filename,
-                                        'instance_number': image.instance_number,
-                                    })
-                                    logger.info(f"Created DICOM image: {filename}")
-
-                                # Clean up JPEG temp file
-                                os.unlink(jpeg_temp_path)
-                                continue
-
-                    # Regular image processing (non-DICOM or DICOM parse failed)
-                    with open(temp_path, 'rb') as f:
-                        image = DicomImage.objects.create(
-                            **image_data,
-                            image_file=File(f, name=filename)
-                        )
-                        created_images.append({
-                            'id': image.id,
-                            'filename': filename,
-                            'instance_number': image.instance_number,
-                        })
-                        logger.info(f"Created regular image: {filename}")
-
-                finally:
-                    # Clean up temp file
-                    if os.path.exists(temp_path):
-                        os.unlink(temp_path)
-
-            except Exception as e:
-                error_msg = f"Error processing {file_data.get('filename', 'unknown')}: {str(e)}"
-                logger.error(error_msg, exc_info=True)
-                errors.append(error_msg)
-                task_status.failed_items += 1
-                task_status.save()
+        created_images = sorted(writer.created_images, key=lambda img: img['instance_number'])
+        skipped_images = writer.skipped_images
+        errors = writer.errors
+        task_status.failed_items += len(errors)
 
         # Update final task status and study status
         task_status.processed_items = len(file_data_list)
@@ -304,6 +389,7 @@ def process_dicom_images_async(self, study_id, file_data_list, user_id=None, cor
             study.processing_version = DICOM_PROCESSING_VERSION  # Record processing version
             study.save()
             task_status.status = 'completed'
+            _queue_cache_warmup(study_id, WARMUP_PRIORITY_UPLOAD)
 
             # Create audit log for successful completion
             AuditLog.objects.create(
@@ -329,6 +415,9 @@ def process_dicom_images_async(self, study_id, file_data_list, user_id=None, cor
         }
         task_status.save()
 
+        # Staged uploads are no longer needed once every file has been handled
+        _cleanup_staged_files(file_data_list)
+
         return {
             'created_images': created_images,
             'skipped_images': skipped_images,
@@ -350,6 +439,11 @@ def process_dicom_images_async(self, study_id, file_data_list, user_id=None, cor
         except Exception as e:
             logger.error(f"Error updating failure state: {e}")
 
+        # Last attempt: nothing will read the staged uploads again
+        if self.request.retries >= self.max_retries:
+            logger.error(f"Giving up on study {study_id} after {self.request.retries} retries")
+            _cleanup_staged_files(file_data_list)
+
         # Retry with exponential backoff
         raise self.retry(exc=exc)
 
@@ -359,6 +453,249 @@ def process_dicom_images_async(self, study_id, file_data_list, user_id=None, cor
         logger.info(f"Released lock for study {study_id}")
 
 
+@shared_task(
+    bind=True,
+    max_retries=3,
+    autoretry_for=(Exception,),
+    retry_backoff=True,
+    retry_backoff_max=600,
+    retry_jitter=True
+)
+def reprocess_study_images(self, study_id):
+    """
+    Regenerate renditions and metadata of a study from its stored originals.
+
+    Runs the same per-file ingest as uploads, reading originals straight
+    from storage, so a new DICOM_PROCESSING_VERSION can be rolled out
+    without users re-uploading. Images without a stored original are left
+    untouched.
+
+    Args:
+        study_id: ID of the imaging study
+
+    Returns:
+        dict: Counts of reprocessed and skipped images and any errors
+    """
+    task_id = self.request.id
+    lock_key = f"dicom-processing-{study_id}"
+
+    if not cache.add(lock_key, task_id, LOCK_TIMEOUT):
+        existing_lock = cache.get(lock_key)
+        logger.warning(
+            f"Study {study_id} already being processed by task {existing_lock}. Skipping reprocess."
+        )
+        return {
+            'status': 'skipped',
+            'reason': 'already_processing',
+            'existing_task_id': existing_lock
+        }
+
+    try:
+        study = ImagingStudy.objects.select_related('patient').get(id=study_id)
+        images = {
+            image.instance_number: image
+            for image in study.images.exclude(original_file='')
+        }
+
+        file_data_list = [
+            {
+                'filename': os.path.basename(image.original_file.name),
+                'storage_key': image.original_file.name,
+                'sha256': image.original_sha256,
+                'instance_number': image.instance_number,
+            }
+            for image in images.values()
+        ]
+
+        updated_images = []
+        update_fields = {'image_file', 'file_size_bytes', 'image_sha256'}
+        old_files = []
+        errors = []
+        for result in _run_ingest(file_data_list):
+            if result['error'] or result['rendition'] is None:
+                errors.append(result['error'] or f"Could not render {result['filename']}")
+                continue
+
+            image = images[result['instance_number']]
+            old_files.append(image.image_file.name)
+            for field, value in result['fields'].items():
+                setattr(image, field, value)
+            update_fields.update(result['fields'])
+            image.file_size_bytes = len(result['rendition'])
+            image.image_sha256 = hashlib.sha256(result['rendition']).hexdigest()
+            image.image_file.save(result['rendition_name'], ContentFile(result['rendition']), save=False)
+            ImageCacheService.store_renditions(image.image_file.name, result['renditions'])
+            updated_images.append(image)
+
+        with transaction.atomic():
+            DicomImage.objects.bulk_update(
+                updated_images, sorted(update_fields),
+                batch_size=getattr(settings, 'DICOM_BULK_CREATE_BATCH_SIZE', None)
+            )
+            if not errors:
+                study.processing_version = DICOM_PROCESSING_VERSION
+                study.save(update_fields=['processing_version', 'updated_at'])
+
+        # Old renditions are replaced: one generation bump orphans every
+        # cached variant of the study, precomputed ones are deleted
+        ImageCacheService.invalidate_study(study_id)
+        for file_name in old_files:
+            ImageCacheService.delete_renditions(file_name)
+            default_storage.delete(file_name)
+        if updated_images:
+            _queue_cache_warmup(study_id, WARMUP_PRIORITY_REPROCESS)
+
+        AuditLog.objects.create(
+            actor_type='system',
+            action='process',
+            resource_type='ImagingStudy',
+            resource_id=study_id,
+            tenant_id=study.patient.hospital_id,
+            details={
+                'task_id': task_id,
+                'action': 'reprocess',
+                'processing_version': DICOM_PROCESSING_VERSION,
+                'images_reprocessed': len(updated_images),
+                'total_errors': len(errors),
+            }
+        )
+
+        logger.info(f"Reprocessed {len(updated_images)} images of study {study_id}")
+        return {
+            'study_id': study_id,
+            'reprocessed': len(updated_images),
+            'skipped': study.images.count() - len(images),
+            'errors': errors,
+            'processing_version': DICOM_PROCESSING_VERSION,
+        }
+
+    except ImagingStudy.DoesNotExist:
+        logger.error(f"Study {study_id} not found for reprocessing")
+        return {'error': 'Study not found'}
+
+    except Exception as exc:
+        logger.error(f"Reprocessing study {study_id} failed: {str(exc)}", exc_info=True)
+        raise self.retry(exc=exc)
+
+    finally:
+        cache.delete(lock_key)
+
+
+@shared_task
+def reprocess_outdated_studies():
+    """
+    Queue reprocessing for completed studies built by an older pipeline version.
+
+    Returns:
+        dict: Number of studies queued
+    """
+    study_ids = list(
+        ImagingStudy.objects.filter(status='completed', images__original_file__gt='')
+        .exclude(processing_version=DICOM_PROCESSING_VERSION)
+        .values_list('id', flat=True)
+        .distinct()
+    )
+
+    for study_id in study_ids:
+        reprocess_study_images.delay(study_id)
+
+    logger.info(f"Queued {len(study_ids)} studies for reprocessing to {DICOM_PROCESSING_VERSION}")
+    return {
+        'queued': len(study_ids),
+        'processing_version': DICOM_PROCESSING_VERSION,
+    }
+
+
+def _queue_cache_warmup(study_id, priority):
+    """
+    Queue warm_study_cache for a study once the current transaction commits.
+
+    Warmups go to CACHE_WARMUP_QUEUE so they only run on workers consuming
+    that queue, and expire if that worker falls behind. Failing to queue a
+    warmup is logged, never raised: the study is usable without it.
+    """
+    if not getattr(settings, 'CACHE_WARMUP_ENABLED', True):
+        return
+
+    def enqueue():
+        try:
+            warm_study_cache.apply_async(
+                args=[study_id],
+                queue=getattr(settings, 'CACHE_WARMUP_QUEUE', 'cache_warmup'),
+                priority=priority,
+                expires=getattr(settings, 'CACHE_WARMUP_EXPIRES', 3600),
+            )
+        except Exception as e:
+            logger.warning(f"Could not queue cache warmup for study {study_id}: {str(e)}")
+
+    transaction.on_commit(enqueue)
+
+
+@shared_task(bind=True, ignore_result=True, acks_late=True)
+def warm_study_cache(self, study_id):
+    """
+    Prefetch a processed study into the image cache before it is first viewed.
+
+    Thumbnails of every image (in batches, one cache round trip each) and
+    previews of the first CACHE_WARMUP_PREVIEW_COUNT slices are read from
+    their precomputed renditions, or generated, and stored in Redis under
+    the study's current cache namespace. Storage reads run on at most
+    CACHE_WARMUP_WORKERS threads.
+
+    Warming is best effort: errors are logged and the task is not retried.
+
+    Args:
+        study_id: ID of the imaging study
+
+    Returns:
+        dict: Counts of warmed thumbnails and previews
+    """
+    lock_key = f"cache-warmup-{study_id}"
+    if not cache.add(lock_key, self.request.id or 'eager', LOCK_TIMEOUT):
+        logger.info(f"Cache warmup for study {study_id} already running. Skipping.")
+        return {'status': 'skipped', 'reason': 'already_warming'}
+
+    try:
+        images = list(
+            DicomImage.objects.filter(study_id=study_id, study__status='completed')
+            .order_by('instance_number')
+            .values_list('image_file', 'image_sha256', 'study__patient__hospital_id', 'study__processing_version')
+        )
+        if not images:
+            return {'status': 'skipped', 'reason': 'no_images'}
+
+        hospital_id, processing_version = images[0][2:]
+        scope = ImageCacheService.scope_namespace(study_id, hospital_id, processing_version)
+        namespaces = {
+            path: ImageCacheService.content_namespace(scope, sha256)
+            for path, sha256, _, _ in images
+        }
+        paths = list(namespaces)
+        max_workers = max(1, getattr(settings, 'CACHE_WARMUP_WORKERS', 2))
+        batch_size = max(1, getattr(settings, 'CACHE_WARMUP_BATCH_SIZE', 200))
+
+        thumbnails = 0
+        for start in range(0, len(paths), batch_size):
+            batch = paths[start:start + batch_size]
+            thumbnails += len(ImageCacheService.get_thumbnails(batch, max_workers, namespaces))
+
+        preview_paths = paths[:max(0, getattr(settings, 'CACHE_WARMUP_PREVIEW_COUNT', 10))]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            previews = sum(1 for data in executor.map(
+                lambda path: ImageCacheService.get_preview(path, namespace=namespaces[path]), preview_paths
+            ) if data)
+
+        logger.info(f"Warmed cache for study {study_id}: {thumbnails} thumbnails, {previews} previews")
+        return {'study_id': study_id, 'thumbnails': thumbnails, 'previews': previews}
+
+    except Exception as e:
+        logger.warning(f"Cache warmup for study {study_id} failed: {str(e)}", exc_info=True)
+        return {'status': 'failed', 'error': str(e)}
+
+    finally:
+        cache.delete(lock_key)
+
+
 @shared_task(
     bind=True,
     max_retries=3,
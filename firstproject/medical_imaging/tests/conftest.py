@@ -0,0 +1,50 @@
+"""
+Shared fixtures for the medical_imaging tests.
+Provides:
+- media_root: image files stored under a temporary media root
+- study: a completed CT study with its hospital and patient
+- clear_caches: empty Django's cache and the local image cache tier
+"""
+import pytest
+from datetime import date
+from django.core.cache import cache
+from medical_imaging.models import Hospital, Patient, ImagingStudy
+from medical_imaging.tiered_cache import image_cache
+
+
+@pytest.fixture
+def media_root(settings, tmp_path):
+    """Store image files under a temporary media root"""
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def study():
+    hospital = Hospital.objects.create(
+        name="Test Hospital",
+        address="123 Test St",
+        contact_email="test@hospital.com",
+        contact_phone="1234567890"
+    )
+    patient = Patient.objects.create(
+        medical_record_number="MRN001",
+        first_name="John",
+        last_name="Doe",
+        date_of_birth=date(1990, 1, 1),
+        gender="M",
+        hospital=hospital
+    )
+    return ImagingStudy.objects.create(
+        patient=patient,
+        study_date=date.today(),
+        modality="CT",
+        body_part="Chest",
+        status="completed"
+    )
+
+
+@pytest.fixture
+def clear_caches():
+    cache.clear()
+    image_cache.clear_local()
@@ -0,0 +1,170 @@
+import threading
+import time
+import pytest
+from asgiref.sync import async_to_sync
+from unittest.mock import MagicMock, patch
+from PIL import Image as PILImage
+from django.core.cache import cache
+from django.test import Client
+from medical_imaging.cache_metrics import CacheMetrics, cache_metrics
+from medical_imaging.image_cache_service import ImageCacheService
+from medical_imaging.tiered_cache import image_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    cache_metrics.flush()
+    cache.clear()
+    image_cache.clear_local()
+
+
+@pytest.mark.unit
+class TestCacheMetrics:
+    """Test per-variant counters and their aggregation"""
+
+    def test_counters_aggregate_across_processes(self):
+        """Test counters of separate processes add up in Redis"""
+        worker_a = CacheMetrics(flush_interval=60)
+        worker_b = CacheMetrics(flush_interval=60)
+        worker_a.lookup('thumb', hit=True, value=b'x' * 100)
+        worker_b.lookup('thumb', hit=True, value=b'x' * 50)
+        worker_b.lookup('thumb', hit=False)
+        worker_b.flush()
+
+        thumb = worker_a.snapshot()['thumb']
+
+        assert thumb['hits'] == 2
+        assert thumb['misses'] == 1
+        assert thumb['bytes_served'] == 150
+        assert thumb['hit_rate'] == pytest.approx(0.6667)
+
+    def test_pending_counters_wait_for_interval(self):
+        metrics = CacheMetrics(flush_interval=60)
+        metrics.incr('preview', 'hits')
+
+        assert cache.get('img_metrics:preview:hits') is None
+
+    def test_recording_never_flushes_inline(self):
+        """Test a lookup only updates local counters, even when a flush is due"""
+        metrics = CacheMetrics(flush_interval=60)
+
+        with patch.object(image_cache, 'incr_many') as incr_many:
+            metrics.lookup('thumb', hit=True, value=b'x')
+
+        incr_many.assert_not_called()
+
+    def test_background_thread_flushes(self):
+        metrics = CacheMetrics(flush_interval=0.05)
+        metrics.incr('preview', 'hits')
+
+        deadline = time.monotonic() + 5
+        while cache.get('img_metrics:preview:hits') is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        assert cache.get('img_metrics:preview:hits') == 1
+
+    def test_flush_is_one_pipeline(self):
+        """Test all pending counters go to Redis in a single pipelined round trip"""
+        metrics = CacheMetrics(flush_interval=0)
+        metrics.lookup('thumb', hit=True, value=b'abc')
+        metrics.lookup('preview', hit=False)
+        client = MagicMock()
+
+        with patch('django_redis.get_redis_connection', return_value=client):
+            metrics.flush()
+
+        client.pipeline.assert_called_once_with(transaction=False)
+        pipeline = client.pipeline.return_value
+        increments = {call[0][0]: call[0][1] for call in pipeline.incrby.call_args_list}
+        assert increments == {
+            image_cache.redis.make_key('img_metrics:thumb:hits'): 1,
+            image_cache.redis.make_key('img_metrics:thumb:bytes_served'): 3,
+            image_cache.redis.make_key('img_metrics:preview:misses'): 1,
+        }
+        pipeline.execute.assert_called_once()
+
+    def test_timed_records_count_and_latency(self):
+        metrics = CacheMetrics(flush_interval=0)
+
+        with metrics.timed('webp', 'generation'):
+            pass
+
+        webp = metrics.snapshot()['webp']
+        assert webp['generations'] == 1
+        assert webp['avg_generation_ms'] is not None
+
+    def test_prometheus_exposition(self):
+        metrics = CacheMetrics(flush_interval=0)
+        metrics.lookup('thumb', hit=True, value=b'abc')
+
+        text = metrics.prometheus()
+
+        assert '# TYPE image_cache_lookups_total counter' in text
+        assert 'image_cache_lookups_total{variant="thumb",result="hit"} 1' in text
+        assert 'image_cache_bytes_served_total{variant="thumb"} 3' in text
+
+
+@pytest.mark.unit
+class TestAsyncInstrumentation:
+    """Test async cache hits record metrics without touching Redis"""
+
+    def test_async_hits_do_not_flush(self):
+        """Test Redis flushes only ever run on the background thread"""
+        metrics = CacheMetrics(flush_interval=0.001)
+        key = ImageCacheService._generate_cache_key(ImageCacheService.THUMBNAIL_PREFIX, 'scans/a.jpg', 'thumb', '')
+        image_cache.set(key, b'thumb', 60)
+        flushing_threads = set()
+
+        with patch('medical_imaging.image_cache_service.cache_metrics', metrics), \
+                patch.object(image_cache, 'incr_many',
+                             side_effect=lambda amounts: flushing_threads.add(threading.current_thread().name)):
+            for _ in range(20):
+                assert async_to_sync(ImageCacheService.aget_variant)('scans/a.jpg', 'thumb') == b'thumb'
+                time.sleep(0.002)
+
+        assert flushing_threads <= {'cache-metrics-flush'}
+
+
+@pytest.mark.unit
+class TestServiceInstrumentation:
+    """Test ImageCacheService records lookups per variant"""
+
+    @patch.object(ImageCacheService, '_read_rendition', return_value=None)
+    @patch.object(ImageCacheService, '_load_image_from_storage')
+    def test_miss_then_hit(self, mock_load, mock_read):
+        mock_load.return_value = PILImage.new('L', (300, 300))
+
+        thumbnail = ImageCacheService.get_thumbnail('scans/m.jpg')
+        ImageCacheService.get_thumbnail('scans/m.jpg')
+
+        thumb = cache_metrics.snapshot()['thumb']
+        assert thumb['misses'] == 1
+        assert thumb['hits'] == 1
+        assert thumb['generations'] == 1
+        assert thumb['bytes_served'] == 2 * len(thumbnail)
+
+    def test_cache_stats_do_not_download_payloads(self, monkeypatch):
+        """Test per-image stats check sizes instead of fetching values"""
+        key = ImageCacheService._generate_cache_key(ImageCacheService.THUMBNAIL_PREFIX, 'scans/n.jpg', 'thumb')
+        image_cache.set(key, b'x' * 42, 60)
+        monkeypatch.setattr(image_cache, 'get', lambda key: pytest.fail('payload fetched'))
+
+        stats = ImageCacheService.get_cache_stats('scans/n.jpg')
+
+        assert stats['thumbnail'] == {'cached': True, 'size_bytes': 42}
+        assert stats['preview'] == {'cached': False, 'size_bytes': 0}
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+class TestMetricsEndpoint:
+    """Test the Prometheus metrics endpoint"""
+
+    def test_metrics_endpoint(self):
+        cache_metrics.lookup('preview', hit=False, value=b'abcd')
+
+        response = Client().get('/api/metrics/')
+
+        assert response.status_code == 200
+        assert response['Content-Type'].startswith('text/plain; version=0.0.4')
+        assert b'image_cache_lookups_total{variant="preview",result="miss"} 1' in response.content
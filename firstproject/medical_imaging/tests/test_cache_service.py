@@ -2,7 +2,14 @@ import pytest
 from io import BytesIO
 from PIL import Image as PILImage
 from unittest.mock import Mock, patch, MagicMock
+from django.core.cache import cache
 from medical_imaging.image_cache_service import ImageCacheService
+from medical_imaging.tiered_cache import image_cache
+
+
+def compute_through(key, compute, timeout=None):
+    """Stand-in for a cache miss in get_or_compute/refresh"""
+    return compute()
 
 
 @pytest.mark.unit
@@ -54,19 +61,19 @@ class TestImageCacheService:
         """Test getting thumbnail from cache (cache hit)"""
         # Mock cache hit
         mock_cached_data = b'cached_thumbnail_data'
-        mock_cache.get.return_value = mock_cached_data
+        mock_cache.get_or_compute.return_value = mock_cached_data
 
         result = ImageCacheService.get_thumbnail('test/path.jpg')
 
         assert result == mock_cached_data
-        mock_cache.get.assert_called_once()
+        mock_cache.get_or_compute.assert_called_once()
 
     @patch('medical_imaging.image_cache_service.cache')
     @patch.object(ImageCacheService, '_load_image_from_storage')
     def test_get_thumbnail_cache_miss(self, mock_load, mock_cache):
         """Test getting thumbnail when not in cache (cache miss)"""
         # Mock cache miss
-        mock_cache.get.return_value = None
+        mock_cache.get_or_compute.side_effect = compute_through
 
         # Mock image loading
         mock_img = PILImage.new('RGB', (500, 500), color='green')
@@ -76,13 +83,14 @@ class TestImageCacheService:
 
         # Should load image and cache it
         mock_load.assert_called_once()
-        mock_cache.set.assert_called_once()
+        mock_cache.get_or_compute.assert_called_once()
         assert isinstance(result, bytes)
 
     @patch('medical_imaging.image_cache_service.cache')
     def test_get_thumbnail_force_regenerate(self, mock_cache):
         """Test force regenerate bypasses cache"""
-        mock_cache.get.return_value = b'old_cached_data'
+        mock_cache.get_or_compute.return_value = b'old_cached_data'
+        mock_cache.refresh.side_effect = compute_through
 
         with patch.object(ImageCacheService, '_load_image_from_storage') as mock_load:
             mock_img = PILImage.new('RGB', (500, 500), color='yellow')
@@ -90,8 +98,8 @@ class TestImageCacheService:
 
             result = ImageCacheService.get_thumbnail('test/path.jpg', force_regenerate=True)
 
-            # Should not call cache.get when force_regenerate=True
-            mock_cache.get.assert_not_called()
+            # Should not read the cache when force_regenerate=True
+            mock_cache.get_or_compute.assert_not_called()
             mock_load.assert_called_once()
 
     def test_thumbnail_size_constant(self):
@@ -156,7 +164,7 @@ class TestImageCacheServiceIntegration:
     def test_full_thumbnail_workflow(self, mock_load, mock_cache):
         """Test complete thumbnail generation workflow"""
         # Setup
-        mock_cache.get.return_value = None
+        mock_cache.get_or_compute.side_effect = compute_through
         mock_img = PILImage.new('RGB', (1000, 1000), color='red')
         mock_load.return_value = mock_img
 
@@ -166,10 +174,10 @@ class TestImageCacheServiceIntegration:
         # Verify
         assert result is not None
         assert isinstance(result, bytes)
-        mock_cache.set.assert_called_once()
+        mock_cache.get_or_compute.assert_called_once()
 
         # Verify cache key format
-        call_args = mock_cache.set.call_args
+        call_args = mock_cache.get_or_compute.call_args
         cache_key = call_args[0][0]
         assert cache_key.startswith('medical_imaging:')
 
@@ -177,7 +185,7 @@ class TestImageCacheServiceIntegration:
     @patch.object(ImageCacheService, '_load_image_from_storage')
     def test_preview_generation(self, mock_load, mock_cache):
         """Test preview image generation"""
-        mock_cache.get.return_value = None
+        mock_cache.get_or_compute.side_effect = compute_through
         mock_img = PILImage.new('RGB', (2000, 2000), color='blue')
         mock_load.return_value = mock_img
 
@@ -286,3 +294,159 @@ class TestImageCacheEdgeCases:
 
         assert isinstance(result1, bytes)
         assert isinstance(result2, bytes)
+
+
+@pytest.mark.unit
+@pytest.mark.usefixtures('media_root')
+class TestRenditionPyramid:
+    """Test precomputed renditions in durable storage"""
+
+    def test_generate_variants(self):
+        """Test all variants are derived from one decoded image"""
+        img = PILImage.new('L', (1000, 500), color=128)
+
+        renditions = ImageCacheService.generate_variants(img)
+
+        assert set(renditions) == {'thumb', 'preview', 'webp'}
+        assert PILImage.open(BytesIO(renditions['thumb'])).size == (200, 100)
+        assert PILImage.open(BytesIO(renditions['preview'])).size == (800, 400)
+        assert PILImage.open(BytesIO(renditions['webp'])).size == (1000, 500)
+
+    def test_generate_variants_keeps_grayscale(self):
+        """Test grayscale images are encoded single-channel"""
+        renditions = ImageCacheService.generate_variants(PILImage.new('L', (300, 300)), ['thumb', 'preview'])
+
+        assert PILImage.open(BytesIO(renditions['thumb'])).mode == 'L'
+        assert PILImage.open(BytesIO(renditions['preview'])).mode == 'L'
+
+    @patch('medical_imaging.image_cache_service.cache')
+    @patch.object(ImageCacheService, '_load_image_from_storage')
+    def test_miss_decodes_once_for_all_variants(self, mock_load, mock_cache):
+        """Test a miss caches sibling variants so they are not reloaded"""
+        mock_cache.get_or_compute.side_effect = compute_through
+        mock_load.return_value = PILImage.new('L', (1000, 1000))
+
+        ImageCacheService.get_thumbnail('scans/d.jpg')
+
+        mock_load.assert_called_once()
+        cached_keys = set()
+        for call in mock_cache.set_many.call_args_list:
+            cached_keys.update(call[0][0])
+        assert any(key.endswith(':preview') for key in cached_keys)
+        assert any(key.endswith(':webp') for key in cached_keys)
+
+    @patch('medical_imaging.image_cache_service.cache')
+    @patch.object(ImageCacheService, '_load_image_from_storage')
+    def test_stored_rendition_served_without_decode(self, mock_load, mock_cache):
+        """Test a cold cache is served from the stored rendition with one read"""
+        mock_cache.get_or_compute.side_effect = compute_through
+        ImageCacheService.store_renditions('scans/a.jpg', {'thumb': b'stored-thumb'})
+
+        result = ImageCacheService.get_thumbnail('scans/a.jpg')
+
+        assert result == b'stored-thumb'
+        mock_load.assert_not_called()
+        mock_cache.get_or_compute.assert_called_once()
+
+    @patch('medical_imaging.image_cache_service.cache')
+    @patch.object(ImageCacheService, '_load_image_from_storage')
+    def test_lazy_generation_is_cache_only(self, mock_load, mock_cache, media_root):
+        """Test renditions generated on demand are cached but not written to storage"""
+        mock_cache.get_or_compute.side_effect = compute_through
+        mock_load.return_value = PILImage.new('RGB', (500, 500), color='green')
+
+        assert ImageCacheService.get_preview('scans/b.jpg')
+        assert ImageCacheService._read_rendition('scans/b.jpg', 'preview') is None
+        assert not (media_root / ImageCacheService.RENDITIONS_PREFIX).exists()
+
+    def test_store_renditions_overwrites_in_place(self, media_root):
+        """Test re-storing a rendition replaces it under the same key"""
+        ImageCacheService.store_renditions('scans/e.jpg', {'thumb': b'old'})
+        ImageCacheService.store_renditions('scans/e.jpg', {'thumb': b'new'})
+
+        key = ImageCacheService._rendition_key('scans/e.jpg', 'thumb')
+        assert ImageCacheService._read_rendition('scans/e.jpg', 'thumb') == b'new'
+        assert [path.name for path in (media_root / key).parent.iterdir()] == [(media_root / key).name]
+
+    def test_invalidate_cache_keeps_renditions(self):
+        """Test invalidation drops cache keys but keeps precomputed renditions"""
+        ImageCacheService.store_renditions('scans/c.jpg', {'thumb': b'x', 'webp': b'y'})
+
+        ImageCacheService.invalidate_cache('scans/c.jpg')
+
+        assert ImageCacheService._read_rendition('scans/c.jpg', 'thumb') == b'x'
+        assert ImageCacheService._read_rendition('scans/c.jpg', 'webp') == b'y'
+
+    def test_delete_renditions(self):
+        ImageCacheService.store_renditions('scans/f.jpg', {'thumb': b'x'})
+
+        ImageCacheService.delete_renditions('scans/f.jpg')
+
+        assert ImageCacheService._read_rendition('scans/f.jpg', 'thumb') is None
+
+
+@pytest.mark.unit
+class TestCacheNamespaces:
+    """Test versioned, content-addressed keys and generation invalidation"""
+
+    @pytest.fixture(autouse=True)
+    def clear_caches(self):
+        cache.clear()
+        image_cache.clear_local()
+
+    def test_namespace_includes_version_scope_and_content(self):
+        scope = ImageCacheService.scope_namespace(7, 3, 'v1.2.0')
+        namespace = ImageCacheService.content_namespace(scope, 'ab' * 32)
+
+        assert namespace == f"v1.2.0.0:h3.0:s7.0:{'ab' * 8}"
+
+    def test_keys_differ_per_content_and_version(self):
+        """Test new content or processing version never reuses a key"""
+        old = ImageCacheService.content_namespace(ImageCacheService.scope_namespace(7, 3, 'v1'), 'a' * 64)
+        new_content = ImageCacheService.content_namespace(ImageCacheService.scope_namespace(7, 3, 'v1'), 'b' * 64)
+        new_version = ImageCacheService.content_namespace(ImageCacheService.scope_namespace(7, 3, 'v2'), 'a' * 64)
+
+        keys = {
+            ImageCacheService._generate_cache_key(ImageCacheService.THUMBNAIL_PREFIX, 'scan.jpg', 'thumb', namespace)
+            for namespace in (old, new_content, new_version)
+        }
+        assert len(keys) == 3
+
+    @pytest.mark.parametrize('invalidate, args', [
+        ('invalidate_study', (7,)),
+        ('invalidate_hospital', (3,)),
+        ('invalidate_processing_version', ('v1',)),
+    ])
+    def test_generation_bump_orphans_scope(self, invalidate, args):
+        """Test one bump invalidates the scope and leaves other studies alone"""
+        mine = ImageCacheService.scope_namespace(7, 3, 'v1')
+        other = ImageCacheService.scope_namespace(8, 4, 'v2')
+
+        getattr(ImageCacheService, invalidate)(*args)
+
+        assert ImageCacheService.scope_namespace(7, 3, 'v1') != mine
+        assert ImageCacheService.scope_namespace(8, 4, 'v2') == other
+
+    def test_bump_is_single_write(self, monkeypatch):
+        """Test invalidating a study does not enumerate keys"""
+        calls = []
+        monkeypatch.setattr(cache, 'set', lambda *args, **kwargs: calls.append(args))
+        monkeypatch.setattr(cache, 'delete_many', lambda *args: pytest.fail('keys enumerated'))
+
+        ImageCacheService.invalidate_study(7)
+
+        assert len(calls) == 1
+
+    @patch.object(ImageCacheService, '_read_rendition', return_value=None)
+    @patch.object(ImageCacheService, '_load_image_from_storage')
+    def test_invalidated_study_regenerates(self, mock_load, mock_read):
+        mock_load.return_value = PILImage.new('L', (300, 300))
+        namespace = ImageCacheService.scope_namespace(7, 3, 'v1')
+        ImageCacheService.get_thumbnail('scans/e.jpg', namespace=namespace)
+        ImageCacheService.get_thumbnail('scans/e.jpg', namespace=namespace)
+        assert mock_load.call_count == 1
+
+        ImageCacheService.invalidate_study(7)
+        ImageCacheService.get_thumbnail('scans/e.jpg', namespace=ImageCacheService.scope_namespace(7, 3, 'v1'))
+
+        assert mock_load.call_count == 2
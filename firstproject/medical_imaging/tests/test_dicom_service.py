@@ -40,6 +40,31 @@ class TestDicomParsingService:
         assert dataset is None
         assert metadata is None
 
+    def test_ingest_dicom_single_pass(self):
+        """Test single-pass ingest returns metadata, pixels and a JPEG rendition"""
+        from pathlib import Path
+
+        content = (Path(__file__).resolve().parent.parent / 'CT_small.dcm').read_bytes()
+
+        result = DicomParsingService.ingest(content)
+
+        assert result['is_dicom'] is True
+        assert result['metadata']['image']['rows'] == 128
+        assert result['pixels'].shape == (128, 128)
+        assert result['rendition'][:2] == b'\xff\xd8'
+
+    def test_ingest_non_dicom(self):
+        """Test single-pass ingest of a regular image"""
+        img = PILImage.new('RGB', (10, 10), color='red')
+        img_bytes = BytesIO()
+        img.save(img_bytes, format='PNG')
+
+        result = DicomParsingService.ingest(img_bytes.getvalue())
+
+        assert result['is_dicom'] is False
+        assert result['metadata'] is None
+        assert result['rendition'] is None
+
     def test_extract_metadata_structure(self):
         """Test metadata extraction returns correct structure"""
         # This test would require a real DICOM file
@@ -113,6 +138,52 @@ class TestDicomParsingService:
         assert result.dtype == np.uint8
         assert len(result.shape) == 2
 
+    def test_apply_windowing_zero_width(self):
+        """Test a degenerate window does not divide by zero"""
+        import numpy as np
+
+        result = DicomParsingService.apply_windowing(np.array([[0, 50, 100]]), 50, 0)
+
+        assert result.dtype == np.uint8
+        assert result.tolist() == [[0, 127, 255]]
+
+    def test_render_window_stack_matches_single_slice(self):
+        """Test LUT rendering of an int16 volume matches per-slice windowing"""
+        import numpy as np
+
+        volume = np.array([[[-1024, 0], [40, 3000]], [[-600, 200], [1000, -50]]], dtype=np.int16)
+
+        renditions = DicomParsingService.render_window_stack(
+            volume, ['lung', 'bone'], rescale_slope=1, rescale_intercept=-1024
+        )
+
+        assert set(renditions) == {'lung', 'bone'}
+        for name in ('lung', 'bone'):
+            center, width = DicomParsingService.WINDOW_PRESETS[name]
+            expected = DicomParsingService._apply_windowing(volume, center, width, rescale_intercept=-1024)
+            assert renditions[name].dtype == np.uint8
+            assert renditions[name].shape == volume.shape
+            assert (renditions[name] == expected).all()
+
+    def test_render_window_stack_float_volume(self):
+        """Test float volumes render all presets and support inversion"""
+        import numpy as np
+
+        volume = np.linspace(-1000, 1000, 24, dtype=np.float64).reshape(2, 3, 4)
+
+        normal = DicomParsingService.render_window_stack(volume)
+        inverted = DicomParsingService.render_window_stack(volume, invert=True)
+
+        assert set(normal) == set(DicomParsingService.WINDOW_PRESETS)
+        assert (inverted['soft_tissue'] == 255 - normal['soft_tissue']).all()
+
+    def test_render_window_stack_unknown_preset(self):
+        """Test unknown preset names are rejected"""
+        import numpy as np
+
+        with pytest.raises(ValueError):
+            DicomParsingService.render_window_stack(np.zeros((2, 2), dtype=np.int16), ['liver'])
+
 
 @pytest.mark.unit
 class TestDicomServiceHelpers:
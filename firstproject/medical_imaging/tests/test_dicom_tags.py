@@ -0,0 +1,117 @@
+import pytest
+from datetime import date
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from medical_imaging.models import Hospital, Patient, ImagingStudy, DicomImage
+
+
+TAGS = {'PatientName': 'DOE^JOHN', 'Modality': 'CT', 'KVP': '120'}
+
+
+@pytest.fixture
+def client():
+    client = APIClient()
+    user = User.objects.create_user(username='testuser', password='testpass123')
+    client.force_authenticate(user=user)
+    return client
+
+
+@pytest.fixture
+def image():
+    hospital = Hospital.objects.create(
+        name="Test Hospital",
+        address="123 Test St",
+        contact_email="test@hospital.com",
+        contact_phone="1234567890"
+    )
+    patient = Patient.objects.create(
+        medical_record_number="MRN001",
+        first_name="John",
+        last_name="Doe",
+        date_of_birth=date(1990, 1, 1),
+        gender="M",
+        hospital=hospital
+    )
+    study = ImagingStudy.objects.create(
+        patient=patient,
+        study_date=date.today(),
+        modality="CT",
+        body_part="Chest",
+        status="completed"
+    )
+    return DicomImage.objects.create(
+        study=study, instance_number=1, is_dicom=True, sop_instance_uid='1.2.3', dicom_metadata=TAGS
+    )
+
+
+def get_with_queries(client, url):
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+    assert response.status_code == 200, response.content
+    return response.data, [query['sql'] for query in context.captured_queries]
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+class TestLazyDicomMetadata:
+    """Test DICOM tags are only loaded when requested"""
+
+    def test_list_and_detail_leave_tags_out(self, client, image):
+        for url in ('/api/images/', f'/api/images/{image.id}/'):
+            data, queries = get_with_queries(client, url)
+            row = data['results'][0] if 'results' in data else data
+
+            assert 'dicom_metadata' not in row
+            assert row['sop_instance_uid'] == '1.2.3'
+            assert not any('dicom_metadata' in sql for sql in queries)
+
+    def test_expand(self, client, image):
+        data, queries = get_with_queries(client, f'/api/images/{image.id}/?expand=dicom_metadata')
+
+        assert data['dicom_metadata'] == TAGS
+        assert len(queries) == 1
+
+    def test_dicom_tags_endpoint(self, client, image):
+        data, queries = get_with_queries(client, f'/api/images/{image.id}/dicom-tags/')
+
+        assert data == {'id': image.id, 'sop_instance_uid': '1.2.3', 'is_dicom': True, 'dicom_metadata': TAGS}
+        assert len(queries) == 1
+
+    def test_dicom_tags_not_found(self, client):
+        assert client.get('/api/images/999999/dicom-tags/').status_code == 404
+
+    def test_study_detail_links_not_tags(self, client, image):
+        data = client.get(f'/api/studies/{image.study_id}/?expand=images').data
+
+        assert 'dicom_metadata' not in data['images'][0]
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+class TestSparseFieldsets:
+    """Test ?fields= on the image endpoints"""
+
+    def test_fields(self, client, image):
+        data = client.get('/api/images/?fields=id,instance_number').data
+
+        assert data['results'] == [{'id': image.id, 'instance_number': 1}]
+
+    def test_fields_with_expand(self, client, image):
+        data = client.get(f'/api/images/{image.id}/?fields=id,dicom_metadata&expand=dicom_metadata').data
+
+        assert data == {'id': image.id, 'dicom_metadata': TAGS}
+
+    def test_unknown_fields_ignored(self, client, image):
+        data = client.get(f'/api/images/{image.id}/?fields=id,nope').data
+
+        assert data == {'id': image.id}
+
+    def test_writes_unaffected(self, client, image):
+        """Test ?fields= does not drop input fields on updates"""
+        response = client.patch(f'/api/images/{image.id}/?fields=id', {'manufacturer': 'Acme'}, format='json')
+
+        assert response.status_code == 200
+        image.refresh_from_db()
+        assert image.manufacturer == 'Acme'
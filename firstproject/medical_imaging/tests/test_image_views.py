@@ -0,0 +1,225 @@
+import hashlib
+import pytest
+from io import BytesIO
+from PIL import Image as PILImage
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient, Client
+from rest_framework.test import APIClient
+from medical_imaging.image_cache_service import ImageCacheService
+from medical_imaging.models import DicomImage
+from medical_imaging.tiered_cache import image_cache
+
+
+CONTENT = bytes(range(256)) * 40
+
+
+@pytest.fixture
+def image(media_root, study):
+    image = DicomImage(study=study, instance_number=1)
+    image.image_file.save('scan.jpg', ContentFile(CONTENT), save=False)
+    image.save()
+    return image
+
+
+def full_url(image):
+    return f'/api/images/{image.id}/full/'
+
+
+def asgi_get(url, headers=None):
+    """GET through the ASGI handler and collect the (async) streamed body"""
+    async def request():
+        response = await AsyncClient().get(url, headers=headers)
+        if response.streaming:
+            return response, b''.join([chunk async for chunk in response.streaming_content])
+        return response, response.content
+
+    return async_to_sync(request)()
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+class TestServeFullImage:
+    """Test streaming, conditional and range requests for full images"""
+
+    def test_streams_full_image_with_validators(self, image):
+        """Test the full image is streamed with ETag and Last-Modified"""
+        response = Client().get(full_url(image))
+
+        assert response.status_code == 200
+        assert response.streaming
+        assert b''.join(response) == CONTENT
+        assert response['Content-Length'] == str(len(CONTENT))
+        assert response['Accept-Ranges'] == 'bytes'
+        assert response['ETag'] == f'"{hashlib.sha256(CONTENT).hexdigest()}"'
+        assert 'Last-Modified' in response
+
+    def test_missing_hash_is_stored(self, image):
+        """Test images without a stored hash get one on first request"""
+        Client().get(full_url(image))
+
+        image.refresh_from_db()
+        assert image.image_sha256 == hashlib.sha256(CONTENT).hexdigest()
+
+    def test_if_none_match_returns_304(self, image):
+        client = Client()
+        etag = client.get(full_url(image))['ETag']
+
+        response = client.get(full_url(image), HTTP_IF_NONE_MATCH=etag)
+
+        assert response.status_code == 304
+
+    def test_if_modified_since_returns_304(self, image):
+        client = Client()
+        last_modified = client.get(full_url(image))['Last-Modified']
+
+        response = client.get(full_url(image), HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        assert response.status_code == 304
+
+    def test_byte_range(self, image):
+        """Test a single range is served as partial content"""
+        response = Client().get(full_url(image), HTTP_RANGE='bytes=100-199')
+
+        assert response.status_code == 206
+        assert response['Content-Range'] == f'bytes 100-199/{len(CONTENT)}'
+        assert b''.join(response) == CONTENT[100:200]
+
+    def test_suffix_range(self, image):
+        response = Client().get(full_url(image), HTTP_RANGE='bytes=-10')
+
+        assert response.status_code == 206
+        assert b''.join(response) == CONTENT[-10:]
+
+    def test_unsatisfiable_range(self, image):
+        response = Client().get(full_url(image), HTTP_RANGE=f'bytes={len(CONTENT)}-')
+
+        assert response.status_code == 416
+        assert response['Content-Range'] == f'bytes */{len(CONTENT)}'
+
+    def test_stale_if_range_serves_full_image(self, image):
+        """Test a range for an outdated version returns the whole file"""
+        response = Client().get(full_url(image), HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+
+        assert response.status_code == 200
+        assert b''.join(response) == CONTENT
+
+    def test_redirect_to_storage(self, settings, image):
+        settings.FULL_IMAGE_REDIRECT_TO_STORAGE = True
+
+        response = Client().get(full_url(image))
+
+        assert response.status_code == 302
+        assert response['Location'].endswith(image.image_file.name)
+
+    def test_image_not_found(self, media_root):
+        assert Client().get('/api/images/999999/full/').status_code == 404
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+@pytest.mark.usefixtures('clear_caches')
+class TestAsyncImageViews:
+    """Test the image views through the ASGI handler"""
+
+    def test_full_image_range_streams_async(self, image):
+        response, body = asgi_get(full_url(image), headers={'Range': 'bytes=10-19'})
+
+        assert response.status_code == 206
+        assert body == CONTENT[10:20]
+
+    def test_thumbnail_miss_then_hit(self, media_root, study, monkeypatch):
+        """Test a miss is generated in the image pool and the hit skips it"""
+        image = DicomImage(study=study, instance_number=1)
+        image.image_file.save('slice.jpg', ContentFile(jpeg_bytes()), save=False)
+        image.save()
+
+        response, body = asgi_get(f'/api/images/{image.id}/thumbnail/')
+        assert response.status_code == 200
+        assert PILImage.open(BytesIO(body)).size == (200, 150)
+
+        monkeypatch.setattr(ImageCacheService, 'run_blocking', lambda *args: pytest.fail('not a cache hit'))
+        response, cached = asgi_get(f'/api/images/{image.id}/thumbnail/')
+        assert cached == body
+
+    def test_thumbnail_not_found(self, media_root):
+        response, _ = asgi_get('/api/images/999999/thumbnail/')
+
+        assert response.status_code == 404
+
+
+def jpeg_bytes(size=(400, 300), color='gray'):
+    img = PILImage.new('RGB', size, color=color)
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+class TestStudyThumbnails:
+    """Test the batched study thumbnails endpoint"""
+
+    @pytest.fixture
+    def client(self):
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user(username='viewer', password='pass12345'))
+        return client
+
+    @pytest.fixture
+    def images(self, media_root, study, clear_caches):
+        created = []
+        for i in range(1, 4):
+            image = DicomImage(study=study, instance_number=i)
+            image.image_file.save(f'slice{i}.jpg', ContentFile(jpeg_bytes()), save=False)
+            image.save()
+            created.append(image)
+        return created
+
+    def test_manifest_and_sprite(self, client, study, images, django_assert_max_num_queries):
+        """Test the manifest maps every image to a tile of the sprite"""
+        with django_assert_max_num_queries(3):
+            response = client.get(f'/api/studies/{study.id}/thumbnails/')
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data['count'] == 3
+        assert [tile['instance_number'] for tile in data['tiles']] == [1, 2, 3]
+        assert data['tiles'][1] == {'id': images[1].id, 'x': 200, 'y': 0, 'width': 200, 'height': 150,
+                                    'instance_number': 2}
+
+        sprite = client.get(data['sprite_url'])
+        assert sprite.status_code == 200
+        assert sprite['Content-Type'] == 'image/jpeg'
+        assert PILImage.open(BytesIO(sprite.content)).size == (600, 200)
+
+    def test_multipart_bundle(self, client, study, images):
+        response = client.get(f'/api/studies/{study.id}/thumbnails/?bundle=multipart')
+
+        assert response.status_code == 200
+        assert response['Content-Type'].startswith('multipart/mixed; boundary=')
+        assert response.content.count(b'Content-Type: image/jpeg') == 3
+        assert f'X-Image-Id: {images[0].id}'.encode() in response.content
+
+    def test_batch_uses_one_cache_lookup(self, study, images, monkeypatch):
+        """Test thumbnails are fetched with one get_many and misses generated once"""
+        paths = [image.image_file.name for image in images]
+        ImageCacheService.get_thumbnails(paths)
+
+        calls = []
+        original_get_many = image_cache.get_many
+        monkeypatch.setattr(image_cache, 'get_many', lambda keys: calls.append(list(keys)) or original_get_many(keys))
+        monkeypatch.setattr(ImageCacheService, '_load_thumbnail', lambda path: pytest.fail('cache miss'))
+
+        thumbnails = ImageCacheService.get_thumbnails(paths)
+
+        assert len(calls) == 1
+        assert set(thumbnails) == set(paths)
+
+    def test_pagination_and_errors(self, client, study, images):
+        response = client.get(f'/api/studies/{study.id}/thumbnails/?offset=1&limit=1')
+        assert [tile['id'] for tile in response.json()['tiles']] == [images[1].id]
+
+        assert client.get(f'/api/studies/{study.id}/thumbnails/?bundle=zip').status_code == 400
+        assert client.get('/api/studies/999999/thumbnails/').status_code == 404
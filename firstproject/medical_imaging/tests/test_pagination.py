@@ -0,0 +1,208 @@
+import pytest
+from datetime import date
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from medical_imaging.models import Hospital, Patient, ImagingStudy, DicomImage, AuditLog
+from medical_imaging.pagination import KeysetPagination
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(username='testuser', password='testpass123')
+
+
+@pytest.fixture
+def client(user):
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+@pytest.fixture
+def study():
+    hospital = Hospital.objects.create(
+        name="Test Hospital",
+        address="123 Test St",
+        contact_email="test@hospital.com",
+        contact_phone="1234567890"
+    )
+    patient = Patient.objects.create(
+        medical_record_number="MRN001",
+        first_name="John",
+        last_name="Doe",
+        date_of_birth=date(1990, 1, 1),
+        gender="M",
+        hospital=hospital
+    )
+    return ImagingStudy.objects.create(
+        patient=patient,
+        study_date=date.today(),
+        modality="CT",
+        body_part="Chest",
+        status="completed"
+    )
+
+
+@pytest.fixture
+def audit_logs(user):
+    return [
+        AuditLog.objects.create(user=user, action='view', resource_type='Patient', resource_id=i, tenant_id=i % 2)
+        for i in range(25)
+    ]
+
+
+def walk(client, url):
+    """Follow next links from url, returning every page's results"""
+    pages = []
+    while url:
+        response = client.get(url)
+        assert response.status_code == 200, response.content
+        pages.append(response.data['results'])
+        url = response.data['next']
+    return pages
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+class TestKeysetPagination:
+    """Test cursor pagination of audit logs, images and studies"""
+
+    def test_audit_log_pages_in_timestamp_order(self, client, audit_logs):
+        pages = walk(client, '/api/audit-logs/?page_size=10')
+
+        assert [len(page) for page in pages] == [10, 10, 5]
+        ids = [row['id'] for page in pages for row in page]
+        assert ids == [log.id for log in sorted(audit_logs, key=lambda log: (log.timestamp, log.id), reverse=True)]
+
+    def test_no_count_query_by_default(self, client, audit_logs):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get('/api/audit-logs/')
+
+        assert 'count' not in response.data
+        assert response.data['next'] is not None
+        assert not any('COUNT(' in query['sql'].upper() for query in context.captured_queries)
+
+    def test_previous_link(self, client, audit_logs):
+        first = client.get('/api/audit-logs/?page_size=10').data
+        second = client.get(first['next']).data
+
+        assert client.get(second['previous']).data['results'] == first['results']
+
+    def test_tenant_filter(self, client, audit_logs):
+        pages = walk(client, '/api/audit-logs/?tenant_id=1&page_size=5')
+
+        rows = [row for page in pages for row in page]
+        assert len(rows) == 12
+        assert {row['resource_id'] % 2 for row in rows} == {1}
+
+    def test_images_in_instance_order(self, client, study):
+        for number in (3, 1, 4, 2, 5):
+            DicomImage.objects.create(study=study, instance_number=number)
+
+        pages = walk(client, f'/api/images/?study={study.id}&page_size=2')
+
+        assert [[row['instance_number'] for row in page] for page in pages] == [[1, 2], [3, 4], [5]]
+
+    def test_studies_list(self, client, study):
+        data = client.get('/api/studies/').data
+
+        assert [row['id'] for row in data['results']] == [study.id]
+        assert data['next'] is None and data['previous'] is None
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+class TestRepeatedSortKeys:
+    """Test pages stay exact when the sort key repeats across page boundaries"""
+
+    @pytest.fixture
+    def studies(self, study):
+        """4 studies on the same date, each with instance numbers 1-5"""
+        studies = [study]
+        for _ in range(3):
+            studies.append(ImagingStudy.objects.create(
+                patient=study.patient,
+                study_date=study.study_date,
+                modality="CT",
+                body_part="Chest",
+                status="completed"
+            ))
+        for each in studies:
+            for number in range(1, 6):
+                DicomImage.objects.create(study=each, instance_number=number)
+        return studies
+
+    def test_images_across_studies(self, client, studies):
+        pages = walk(client, '/api/images/?page_size=3')
+
+        rows = [row for page in pages for row in page]
+        expected = DicomImage.objects.order_by('study_id', 'instance_number', 'id')
+        assert [row['id'] for row in rows] == [image.id for image in expected]
+        assert len(pages) == 7
+
+    def test_images_with_client_ordering(self, client, studies):
+        """Test ?ordering= on a repeated column gets the primary key as tiebreaker"""
+        pages = walk(client, '/api/images/?ordering=-instance_number&page_size=3')
+
+        rows = [row for page in pages for row in page]
+        assert len(rows) == len({row['id'] for row in rows}) == 20
+        assert [row['instance_number'] for row in rows] == sorted((row['instance_number'] for row in rows), reverse=True)
+
+    def test_studies_with_same_date(self, client, studies):
+        pages = walk(client, '/api/studies/?page_size=1')
+
+        assert [row['id'] for page in pages for row in page] == sorted((each.id for each in studies), reverse=True)
+
+    def test_audit_logs_with_same_timestamp(self, client, audit_logs):
+        AuditLog.objects.update(timestamp=audit_logs[0].timestamp)
+
+        pages = walk(client, '/api/audit-logs/?page_size=10')
+
+        assert [row['id'] for page in pages for row in page] == sorted((log.id for log in audit_logs), reverse=True)
+
+    def test_previous_links_walk_back(self, client, studies):
+        pages = walk(client, '/api/images/?page_size=3')
+        url = client.get('/api/images/?page_size=3').data['next']
+        for _ in range(len(pages) - 2):
+            url = client.get(url).data['next']
+
+        back = []
+        while url:
+            data = client.get(url).data
+            back.insert(0, data['results'])
+            url = data['previous']
+
+        assert back == pages
+
+    def test_invalid_cursor(self, client, studies):
+        response = client.get('/api/images/?cursor=cD1ub3Qtand)')
+
+        assert response.status_code == 404
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+class TestOptionalCounts:
+    """Test ?count=exact and ?count=estimate"""
+
+    def test_exact(self, client, audit_logs):
+        data = client.get('/api/audit-logs/?count=exact&tenant_id=0').data
+
+        assert data['count'] == 13
+        assert data['count_estimated'] is False
+
+    def test_estimate_below_cap_is_exact(self, client, audit_logs):
+        data = client.get('/api/audit-logs/?count=estimate&action=view').data
+
+        assert data['count'] == 25
+        assert data['count_estimated'] is False
+
+    def test_estimate_capped(self, client, audit_logs, monkeypatch):
+        monkeypatch.setattr(KeysetPagination, 'ESTIMATE_CAP', 10)
+
+        data = client.get('/api/audit-logs/?count=estimate').data
+
+        assert data['count'] == 10
+        assert data['count_estimated'] is True
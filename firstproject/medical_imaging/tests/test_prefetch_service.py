@@ -0,0 +1,136 @@
+import pytest
+from concurrent.futures import wait
+from io import BytesIO
+from unittest.mock import patch
+from PIL import Image as PILImage
+from asgiref.sync import async_to_sync
+from django.core.files.base import ContentFile
+from django.test import AsyncClient
+from medical_imaging.image_cache_service import ImageCacheService
+from medical_imaging.models import DicomImage
+from medical_imaging.prefetch_service import SlicePrefetchService
+from medical_imaging.tiered_cache import image_cache
+
+
+@pytest.fixture(autouse=True)
+def clear_state(clear_caches):
+    SlicePrefetchService.scroll_state.clear()
+    SlicePrefetchService.recent.clear()
+
+
+@pytest.fixture
+def slices(media_root, study):
+    """A study of 10 slices whose slice locations run opposite to instance numbers"""
+    buffer = BytesIO()
+    PILImage.new('L', (64, 64)).save(buffer, format='JPEG')
+    images = []
+    for i in range(1, 11):
+        image = DicomImage(study=study, instance_number=i, slice_location=100.0 - 5 * i)
+        image.image_file.save(f'slice{i}.jpg', ContentFile(buffer.getvalue()), save=False)
+        image.save()
+        images.append(image)
+    return images
+
+
+def schedule(image, viewer='viewer', ordering='instance_number'):
+    image = DicomImage.objects.select_related('study__patient').get(pk=image.pk)
+    futures = async_to_sync(SlicePrefetchService.aschedule)(image, 'preview', viewer, ordering)
+    wait(futures)
+    return futures
+
+
+def preview_cached(image):
+    image = DicomImage.objects.select_related('study__patient').get(pk=image.pk)
+    key = ImageCacheService._generate_cache_key(
+        ImageCacheService.LAZY_VARIANTS['preview'][0], image.image_file.name, 'preview',
+        ImageCacheService.cache_namespace(image)
+    )
+    return bool(image_cache.sizes([key]))
+
+
+@pytest.mark.unit
+class TestScrollWindow:
+    """Test the adaptive prefetch window"""
+
+    def test_sequential_scroll_grows_window(self, settings):
+        settings.SLICE_PREFETCH_MIN_WINDOW = 4
+        settings.SLICE_PREFETCH_MAX_WINDOW = 16
+
+        windows = [SlicePrefetchService.next_window('v', 1, 'instance_number', k)[1] for k in range(1, 6)]
+
+        assert windows == [4, 8, 16, 16, 16]
+
+    def test_reversal_resets_window(self):
+        """Test scrolling back flips the direction and starts small again"""
+        for k in (10, 11, 12):
+            SlicePrefetchService.next_window('v', 1, 'instance_number', k)
+
+        assert SlicePrefetchService.next_window('v', 1, 'instance_number', 11) == (-1, 4)
+        assert SlicePrefetchService.next_window('v', 1, 'instance_number', 10) == (-1, 8)
+
+    def test_viewers_are_tracked_separately(self):
+        SlicePrefetchService.next_window('a', 1, 'instance_number', 1)
+        SlicePrefetchService.next_window('a', 1, 'instance_number', 2)
+
+        assert SlicePrefetchService.next_window('b', 1, 'instance_number', 3) == (1, 4)
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+class TestSlicePrefetch:
+    """Test prefetching of neighbouring slices"""
+
+    def test_prefetches_ahead_and_behind(self, settings, slices):
+        """Test slices ahead of and behind the request are cached"""
+        settings.SLICE_PREFETCH_MIN_WINDOW = 4
+
+        futures = schedule(slices[4])
+
+        assert len(futures) == 5
+        assert [preview_cached(image) for image in slices] == [
+            False, False, False, True, False, True, True, True, True, False
+        ]
+
+    def test_slice_location_ordering(self, settings, slices):
+        """Test 'ahead' follows slice location, not instance number"""
+        settings.SLICE_PREFETCH_MIN_WINDOW = 2
+
+        schedule(slices[4], ordering='slice_location')
+
+        # Increasing slice location means decreasing instance number here
+        assert preview_cached(slices[3]) and preview_cached(slices[2])
+        assert preview_cached(slices[5])
+        assert not preview_cached(slices[6])
+
+    def test_cached_slices_are_not_regenerated(self, slices):
+        schedule(slices[0])
+        SlicePrefetchService.recent.clear()
+
+        with patch.object(ImageCacheService, '_get_variant') as mock_get_variant:
+            futures = schedule(slices[0], viewer='other')
+
+        assert futures
+        mock_get_variant.assert_not_called()
+
+    def test_recently_prefetched_slices_are_skipped(self, slices):
+        schedule(slices[0])
+
+        assert schedule(slices[0], viewer='other') == []
+
+    def test_disabled(self, settings, slices):
+        settings.SLICE_PREFETCH_ENABLED = False
+
+        assert schedule(slices[0]) == []
+
+    def test_preview_request_schedules_prefetch(self, slices):
+        """Test the preview view schedules prefetching unless disabled"""
+        async def get(url):
+            return await AsyncClient().get(url)
+
+        with patch.object(SlicePrefetchService, 'aschedule', return_value=[]) as mock_schedule:
+            assert async_to_sync(get)(f'/api/images/{slices[0].id}/preview/?order=slice_location').status_code == 200
+            async_to_sync(get)(f'/api/images/{slices[0].id}/preview/?prefetch=0')
+
+        mock_schedule.assert_called_once()
+        assert mock_schedule.call_args.args[1] == 'preview'
+        assert mock_schedule.call_args.args[3] == 'slice_location'
@@ -0,0 +1,219 @@
+import pytest
+from datetime import date
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from medical_imaging.models import Hospital, Patient, ImagingStudy, DicomImage, Diagnosis
+
+
+def capture_queries(client, url):
+    """SQL of the queries a GET request runs"""
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+    assert response.status_code == 200, response.content
+    return [query['sql'] for query in context.captured_queries]
+
+
+def count_queries(client, url):
+    """Number of SQL queries a GET request runs"""
+    return len(capture_queries(client, url))
+
+
+def assert_constant_queries(client, url, add_rows):
+    """
+    Assert a request runs the same number of queries for 2 rows as for 10,
+    i.e. serializing a row costs no query of its own.
+    """
+    add_rows(2)
+    small = count_queries(client, url)
+    add_rows(8)
+    large = count_queries(client, url)
+
+    assert small == large, f"{url}: {small} queries for 2 rows, {large} for 10"
+
+
+@pytest.fixture
+def client():
+    client = APIClient()
+    user = User.objects.create_user(username='testuser', password='testpass123')
+    client.force_authenticate(user=user)
+    return client
+
+
+@pytest.fixture
+def hospital():
+    return Hospital.objects.create(
+        name="Test Hospital",
+        address="123 Test St",
+        contact_email="test@hospital.com",
+        contact_phone="1234567890"
+    )
+
+
+@pytest.fixture
+def patient(hospital):
+    return Patient.objects.create(
+        medical_record_number="MRN001",
+        first_name="John",
+        last_name="Doe",
+        date_of_birth=date(1990, 1, 1),
+        gender="M",
+        hospital=hospital
+    )
+
+
+@pytest.fixture
+def add_studies(patient):
+    """Add studies, each with images and every other one with a diagnosis"""
+    def add(count, status='completed'):
+        for _ in range(count):
+            study = ImagingStudy.objects.create(
+                patient=patient,
+                study_date=date.today(),
+                modality="CT",
+                body_part="Chest",
+                status=status
+            )
+            for number in range(1, 4):
+                DicomImage.objects.create(
+                    study=study, instance_number=number, dicom_metadata={'PatientName': 'DOE^JOHN'}
+                )
+            if study.id % 2:
+                Diagnosis.objects.create(study=study, findings="Clear", impression="Normal")
+
+    return add
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+class TestListQueryCounts:
+    """Test list endpoints run a fixed number of queries per page"""
+
+    def test_hospital_list(self, client):
+        def add(count):
+            for _ in range(count):
+                hospital = Hospital.objects.create(name=f"Hospital {Hospital.objects.count()}")
+                Patient.objects.create(
+                    medical_record_number=f"MRN-{hospital.id}",
+                    first_name="Jane",
+                    last_name="Roe",
+                    date_of_birth=date(1985, 5, 5),
+                    gender="F",
+                    hospital=hospital
+                )
+
+        assert_constant_queries(client, '/api/hospitals/', add)
+
+    def test_patient_list(self, client, hospital):
+        def add(count):
+            for _ in range(count):
+                Patient.objects.create(
+                    medical_record_number=f"MRN-{Patient.objects.count()}",
+                    first_name="Jane",
+                    last_name="Roe",
+                    date_of_birth=date(1985, 5, 5),
+                    gender="F",
+                    hospital=hospital
+                )
+
+        assert_constant_queries(client, '/api/patients/', add)
+
+    def test_study_list(self, client, add_studies):
+        assert_constant_queries(client, '/api/studies/', add_studies)
+
+    def test_pending_studies(self, client, add_studies):
+        assert_constant_queries(client, '/api/studies/pending/', lambda count: add_studies(count, 'pending'))
+
+    def test_patient_studies(self, client, patient, add_studies):
+        assert_constant_queries(client, f'/api/patients/{patient.id}/studies/', add_studies)
+
+    def test_patient_detail(self, client, patient, add_studies):
+        assert_constant_queries(client, f'/api/patients/{patient.id}/', add_studies)
+
+    def test_study_detail(self, client, patient, add_studies):
+        add_studies(1)
+        study = ImagingStudy.objects.get()
+
+        def add_images(count):
+            start = study.images.count() + 1
+            for number in range(start, start + count):
+                DicomImage.objects.create(study=study, instance_number=number)
+
+        assert_constant_queries(client, f'/api/studies/{study.id}/?expand=images', add_images)
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+class TestStudyQueryShape:
+    """Test study endpoints load only the columns they serialize"""
+
+    def test_list_does_not_load_images(self, client, add_studies):
+        add_studies(3)
+
+        queries = capture_queries(client, '/api/studies/')
+
+        assert len(queries) == 1  # the page (cursor pagination runs no COUNT)
+        assert not any('dicom_metadata' in sql for sql in queries)
+
+    def test_detail_defers_dicom_metadata(self, client, add_studies):
+        add_studies(1)
+        study = ImagingStudy.objects.get()
+
+        queries = capture_queries(client, f'/api/studies/{study.id}/?expand=images')
+        data = client.get(f'/api/studies/{study.id}/?expand=images').data
+
+        assert not any('dicom_metadata' in sql for sql in queries)
+        assert len(data['images']) == 3
+        assert 'dicom_metadata' not in data['images'][0]
+        assert data['images'][0]['instance_number'] == 1
+
+    def test_detail_includes_diagnosis(self, client, add_studies):
+        add_studies(2)
+        study = ImagingStudy.objects.filter(diagnosis__isnull=False).get()
+
+        data = client.get(f'/api/studies/{study.id}/').data
+
+        assert data['diagnosis']['impression'] == "Normal"
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+class TestAnnotatedValues:
+    """Test annotated counts match the per-row values they replace"""
+
+    def test_study_counts(self, client, patient, add_studies):
+        add_studies(4)
+
+        response = client.get('/api/studies/')
+
+        for row in response.data['results']:
+            study = ImagingStudy.objects.get(id=row['id'])
+            assert row['image_count'] == study.images.count() == 3
+            assert row['has_diagnosis'] == Diagnosis.objects.filter(study=study).exists()
+
+    def test_patient_detail(self, client, patient, add_studies):
+        add_studies(7)
+
+        data = client.get(f'/api/patients/{patient.id}/').data
+
+        assert data['total_studies'] == 7
+        assert len(data['recent_studies']) == 5
+        assert all(study['image_count'] == 3 for study in data['recent_studies'])
+
+    def test_hospital_patient_count(self, client, hospital, patient):
+        data = client.get(f'/api/hospitals/{hospital.id}/').data
+
+        assert data['patient_count'] == 1
+
+    def test_created_hospital_falls_back(self, client):
+        """Test instances returned by create (not annotated) still get a count"""
+        response = client.post('/api/hospitals/', {
+            'name': "New Hospital",
+            'address': "1 Main St",
+            'contact_email': "new@hospital.com",
+            'contact_phone': "555"
+        })
+
+        assert response.status_code == 201
+        assert response.data['patient_count'] == 0
@@ -0,0 +1,135 @@
+import pytest
+from io import BytesIO
+from pathlib import Path
+from PIL import Image as PILImage
+from django.core.files.base import ContentFile
+from django.test import Client
+from medical_imaging.models import DicomImage
+from medical_imaging.original_storage_service import DicomOriginalService
+from medical_imaging.render_service import DicomRenderService, OriginalPixelsUnavailable
+
+
+CT_SMALL = Path(__file__).resolve().parent.parent / 'CT_small.dcm'
+
+
+@pytest.fixture(autouse=True)
+def clear_render_caches(clear_caches):
+    DicomRenderService.pixel_cache.clear()
+    yield
+    DicomRenderService.pixel_cache.clear()
+
+
+def make_image(study, filename, content, instance_number=1, **fields):
+    image = DicomImage(study=study, instance_number=instance_number, **fields)
+    image.image_file.save(filename, ContentFile(content), save=False)
+    image.save()
+    return image
+
+
+@pytest.fixture
+def dicom_image(media_root, study):
+    return make_image(study, 'ct.dcm', CT_SMALL.read_bytes(), is_dicom=True)
+
+
+def jpeg_bytes():
+    img = PILImage.new('RGB', (64, 32), color='gray')
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+@pytest.mark.django_db
+@pytest.mark.unit
+class TestDicomRenderService:
+    """Test window/level rendering from stored pixel data"""
+
+    def test_render_dicom_with_window(self, dicom_image):
+        """Test DICOM pixels are windowed and resized"""
+        image_bytes, content_type = DicomRenderService.render(
+            dicom_image, window_center=40, window_width=400, size=64, fmt='png'
+        )
+
+        assert content_type == 'image/png'
+        rendered = PILImage.open(BytesIO(image_bytes))
+        assert rendered.size == (64, 64)
+        assert rendered.mode == 'L'
+
+    def test_different_windows_render_differently(self, dicom_image):
+        """Test the window actually changes the output"""
+        soft, _ = DicomRenderService.render(dicom_image, 40, 400, fmt='png')
+        bone, _ = DicomRenderService.render(dicom_image, 400, 1800, fmt='png')
+
+        assert soft != bone
+
+    def test_rendered_output_is_cached(self, dicom_image, monkeypatch):
+        """Test repeated requests are served from the cache without decoding"""
+        first, _ = DicomRenderService.render(dicom_image, 40, 400, fmt='jpeg')
+        DicomRenderService.pixel_cache.clear()
+
+        def fail(*args, **kwargs):
+            raise AssertionError("pixels decoded on cache hit")
+
+        monkeypatch.setattr(DicomRenderService, 'load_pixels', fail)
+        second, _ = DicomRenderService.render(dicom_image, 40, 400, fmt='jpeg')
+
+        assert first == second
+
+    def test_decoded_pixels_reused(self, dicom_image):
+        """Test the per-worker LRU keeps decoded arrays between windows"""
+        DicomRenderService.render(dicom_image, 40, 400)
+        DicomRenderService.render(dicom_image, -600, 1500)
+
+        assert len(DicomRenderService.pixel_cache) == 1
+
+    def test_regular_image_renders_grayscale(self, media_root, study):
+        """Test non-DICOM images render from 8-bit grayscale"""
+        image = make_image(study, 'photo.jpg', jpeg_bytes())
+
+        image_bytes, _ = DicomRenderService.render(image, fmt='webp')
+
+        assert PILImage.open(BytesIO(image_bytes)).size == (64, 32)
+
+    def test_render_prefers_stored_original(self, media_root, study):
+        """Test DICOM uploads render from the stored original, not the JPEG"""
+        original = DicomOriginalService.store_original(CT_SMALL.read_bytes())
+        image = make_image(study, 'ct.dcm.jpg', jpeg_bytes(), is_dicom=True,
+                           original_file=original['storage_key'], original_sha256=original['sha256'])
+
+        image_bytes, _ = DicomRenderService.render(image, 40, 400, fmt='png')
+
+        assert PILImage.open(BytesIO(image_bytes)).size == (128, 128)
+
+    def test_dicom_without_original_pixels(self, media_root, study):
+        """Test pre-windowed renditions of DICOM uploads are rejected"""
+        image = make_image(study, 'ct.dcm.jpg', jpeg_bytes(), is_dicom=True,
+                           window_center='40', window_width='400')
+
+        with pytest.raises(OriginalPixelsUnavailable):
+            DicomRenderService.render(image)
+
+    def test_invalid_parameters(self, dicom_image):
+        with pytest.raises(ValueError):
+            DicomRenderService.render(dicom_image, fmt='gif')
+        with pytest.raises(ValueError):
+            DicomRenderService.render(dicom_image, size=100000)
+        with pytest.raises(ValueError):
+            DicomRenderService.render(dicom_image, window_center=float('nan'), window_width=400)
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+class TestRenderEndpoint:
+    """Test the /render/ image endpoint"""
+
+    def test_render_endpoint(self, dicom_image):
+        response = Client().get(f'/api/images/{dicom_image.id}/render/?wc=40&ww=400&size=32&format=webp')
+
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'image/webp'
+
+    def test_render_endpoint_errors(self, dicom_image):
+        client = Client()
+
+        assert client.get(f'/api/images/{dicom_image.id}/render/?wc=abc').status_code == 400
+        assert client.get(f'/api/images/{dicom_image.id}/render/?format=gif').status_code == 400
+        assert client.get('/api/images/999999/render/').status_code == 404
@@ -0,0 +1,178 @@
+import pytest
+from io import BytesIO
+from pathlib import Path
+from PIL import Image as PILImage
+from asgiref.sync import async_to_sync
+from django.core.files.base import ContentFile
+from django.test import AsyncClient
+from medical_imaging.models import DicomImage
+from medical_imaging.original_storage_service import DicomOriginalService
+from medical_imaging.render_service import DicomRenderService
+from medical_imaging.rendition_service import NegotiatedRenditionService
+
+
+CT_SMALL = Path(__file__).resolve().parent.parent / 'CT_small.dcm'
+
+CHROME_ACCEPT = 'image/avif,image/webp,image/apng,image/svg+xml,image/*,*/*;q=0.8'
+
+# Image Accept headers of browsers without AVIF support
+OLD_CHROME_ACCEPT = 'image/webp,image/apng,image/*,*/*;q=0.8'
+OLD_FIREFOX_ACCEPT = 'image/webp,*/*'
+OLD_SAFARI_ACCEPT = 'image/png,image/svg+xml,image/*;q=0.8,video/*;q=0.5,*/*;q=0.5'
+
+
+pytestmark = pytest.mark.usefixtures('clear_caches')
+
+
+@pytest.fixture
+def image(media_root, study):
+    buffer = BytesIO()
+    PILImage.linear_gradient('L').resize((1200, 900)).save(buffer, format='PNG')
+    image = DicomImage(study=study, instance_number=1)
+    image.image_file.save('slice.png', ContentFile(buffer.getvalue()), save=False)
+    image.save()
+    return image
+
+
+def make_dicom_image(study, **fields):
+    """DICOM upload stored as a small pre-windowed JPEG, like ingest does"""
+    buffer = BytesIO()
+    PILImage.new('L', (64, 64), color=128).save(buffer, format='JPEG', quality=90)
+    image = DicomImage(study=study, instance_number=2, is_dicom=True,
+                       window_center='40', window_width='400', **fields)
+    image.image_file.save('ct.dcm.jpg', ContentFile(buffer.getvalue()), save=False)
+    image.save()
+    return image
+
+
+def asgi_get(url, accept=None):
+    async def request():
+        return await AsyncClient().get(url, headers={'Accept': accept} if accept else None)
+
+    return async_to_sync(request)()
+
+
+@pytest.mark.unit
+class TestNegotiation:
+    """Test format selection from the Accept header"""
+
+    def test_modern_browser_gets_avif(self):
+        assert NegotiatedRenditionService.negotiate(CHROME_ACCEPT) == 'avif'
+
+    def test_explicit_types_beat_wildcards(self):
+        """Test WebP listed explicitly wins over AVIF matched only by */*"""
+        assert NegotiatedRenditionService.negotiate('image/webp,*/*;q=0.8') == 'webp'
+
+    def test_q_values(self):
+        assert NegotiatedRenditionService.negotiate('image/avif;q=0.5, image/jpeg') == 'jpeg'
+        assert NegotiatedRenditionService.negotiate('image/avif;q=0, image/webp;q=0.5, image/*') == 'jpeg'
+        assert NegotiatedRenditionService.negotiate('image/webp, image/*;q=0.5') == 'webp'
+
+    @pytest.mark.parametrize('accept, expected', [
+        ('*/*', 'jpeg'),
+        ('image/*', 'jpeg'),
+        (OLD_FIREFOX_ACCEPT, 'webp'),
+        (OLD_CHROME_ACCEPT, 'webp'),
+        (OLD_SAFARI_ACCEPT, 'jpeg'),
+    ])
+    def test_wildcards_never_pick_modern_formats(self, accept, expected):
+        """Test AVIF/JPEG XL/WebP are only served to clients that list them"""
+        assert NegotiatedRenditionService.negotiate(accept) == expected
+        assert NegotiatedRenditionService.negotiate(accept, 'diagnostic') == expected
+
+    @pytest.mark.parametrize('accept, expected', [
+        ('*/*', 'png'),
+        (OLD_FIREFOX_ACCEPT, 'webp'),
+        (OLD_SAFARI_ACCEPT, 'png'),
+    ])
+    def test_lossless_wildcards(self, accept, expected):
+        assert NegotiatedRenditionService.negotiate(accept, 'lossless') == expected
+
+    def test_fallback_and_not_acceptable(self):
+        assert NegotiatedRenditionService.negotiate(None) == 'jpeg'
+        assert NegotiatedRenditionService.negotiate(None, 'lossless') == 'png'
+        assert NegotiatedRenditionService.negotiate('application/json') is None
+
+    def test_lossless_never_picks_lossy_formats(self):
+        assert NegotiatedRenditionService.negotiate(CHROME_ACCEPT, 'lossless') == 'webp'
+        assert NegotiatedRenditionService.negotiate('image/jpeg, image/png', 'lossless') == 'png'
+
+    def test_lossless_webp_round_trips(self):
+        source = PILImage.linear_gradient('L')
+
+        encoded = NegotiatedRenditionService.encode(source, 'webp', 'lossless')
+
+        assert list(PILImage.open(BytesIO(encoded)).convert('L').getdata()) == list(source.getdata())
+
+    def test_modality_profiles(self):
+        """Test radiographs are encoded at a higher quality than ultrasound"""
+        source = PILImage.effect_noise((256, 256), 40)
+
+        xray = NegotiatedRenditionService.encode(source, 'jpeg', modality='XRAY')
+        ultrasound = NegotiatedRenditionService.encode(source, 'jpeg', modality='ULTRASOUND')
+
+        assert len(xray) > len(ultrasound)
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+class TestRenditionEndpoint:
+    """Test the negotiated /rendition/ endpoint"""
+
+    def test_negotiated_formats_with_vary(self, image):
+        url = f'/api/images/{image.id}/rendition/'
+
+        avif = asgi_get(url, CHROME_ACCEPT)
+        jpeg = asgi_get(url, 'image/jpeg')
+
+        assert avif.status_code == 200
+        assert avif['Content-Type'] == 'image/avif'
+        assert jpeg['Content-Type'] == 'image/jpeg'
+        assert 'Accept' in avif['Vary']
+        assert PILImage.open(BytesIO(jpeg.content)).size == (800, 600)
+
+    def test_formats_cached_separately(self, image, monkeypatch):
+        url = f'/api/images/{image.id}/rendition/?size=full'
+        webp = asgi_get(url, 'image/webp').content
+        jpeg = asgi_get(url, 'image/jpeg').content
+
+        monkeypatch.setattr(NegotiatedRenditionService, '_render', lambda *args: pytest.fail('cache miss'))
+
+        assert asgi_get(url, 'image/webp').content == webp
+        assert asgi_get(url, 'image/jpeg').content == jpeg
+        assert webp != jpeg
+
+    def test_lossless_full_image(self, image):
+        response = asgi_get(f'/api/images/{image.id}/rendition/?size=full&quality=lossless', CHROME_ACCEPT)
+
+        assert response['Content-Type'] == 'image/webp'
+        assert PILImage.open(BytesIO(response.content)).size == (1200, 900)
+
+    def test_lossless_dicom_from_original(self, image):
+        """Test lossless DICOM renditions come from the original pixels, not the JPEG"""
+        original = DicomOriginalService.store_original(CT_SMALL.read_bytes())
+        dicom = make_dicom_image(image.study, original_file=original['storage_key'],
+                                 original_sha256=original['sha256'])
+
+        response = asgi_get(f'/api/images/{dicom.id}/rendition/?size=full&quality=lossless', 'image/png')
+        rendered = PILImage.open(BytesIO(response.content))
+
+        assert response.status_code == 200
+        assert rendered.size == (128, 128)
+        assert list(rendered.getdata()) == list(DicomRenderService.render_stored_window(dicom).getdata())
+
+    def test_dicom_without_original(self, image):
+        """Test diagnostic and lossless renditions are refused without an original"""
+        dicom = make_dicom_image(image.study)
+        url = f'/api/images/{dicom.id}/rendition/'
+
+        assert asgi_get(f'{url}?quality=diagnostic', 'image/jpeg').status_code == 404
+        assert asgi_get(f'{url}?quality=lossless', 'image/png').status_code == 404
+        assert asgi_get(url, 'image/jpeg').status_code == 200
+
+    def test_errors(self, image):
+        url = f'/api/images/{image.id}/rendition/'
+
+        assert asgi_get(f'{url}?quality=best').status_code == 400
+        assert asgi_get(url, 'application/json').status_code == 406
+        assert asgi_get('/api/images/999999/rendition/').status_code == 404
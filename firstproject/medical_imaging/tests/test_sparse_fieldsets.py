@@ -0,0 +1,156 @@
+import pytest
+from datetime import date
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from medical_imaging.models import Hospital, Patient, ImagingStudy, DicomImage, Diagnosis, AuditLog
+from medical_imaging.querysets import source_path
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(username='testuser', password='testpass123')
+
+
+@pytest.fixture
+def client(user):
+    client = APIClient()
+    client.force_authenticate(user=user)
+    return client
+
+
+@pytest.fixture
+def patient():
+    hospital = Hospital.objects.create(
+        name="Test Hospital",
+        address="123 Test St",
+        contact_email="test@hospital.com",
+        contact_phone="1234567890"
+    )
+    return Patient.objects.create(
+        medical_record_number="MRN001",
+        first_name="John",
+        last_name="Doe",
+        date_of_birth=date(1990, 1, 1),
+        gender="M",
+        email="john@example.com",
+        address="1 Main St",
+        hospital=hospital
+    )
+
+
+@pytest.fixture
+def study(patient, user):
+    study = ImagingStudy.objects.create(
+        patient=patient,
+        study_date=date.today(),
+        modality="CT",
+        body_part="Chest",
+        status="completed"
+    )
+    DicomImage.objects.create(study=study, instance_number=1)
+    Diagnosis.objects.create(study=study, radiologist=user, findings="Clear", impression="Normal")
+    return study
+
+
+def get(client, url):
+    """Response data and the SQL of the queries the request ran"""
+    with CaptureQueriesContext(connection) as context:
+        response = client.get(url)
+    assert response.status_code == 200, response.content
+    return response.data, [query['sql'] for query in context.captured_queries]
+
+
+@pytest.mark.unit
+class TestSourcePath:
+    """Test serializer sources are mapped to only() paths"""
+
+    def test_model_fields(self):
+        assert source_path(Patient, 'email') == 'email'
+        assert source_path(Patient, 'hospital') == 'hospital'
+        assert source_path(Patient, 'hospital.name') == 'hospital__name'
+        assert source_path(DicomImage, 'study.patient.first_name') == 'study__patient__first_name'
+
+    def test_unmapped_sources(self):
+        assert source_path(Patient, 'full_name') is None
+        assert source_path(Patient, 'imaging_studies') is None
+        assert source_path(ImagingStudy, 'diagnosis') is None
+        assert source_path(Patient, '*') is None
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+class TestSparseResponses:
+    """Test ?fields= and ?expand= trim both the response and the SQL"""
+
+    def test_patient_list_fields(self, client, patient):
+        data, queries = get(client, '/api/patients/?fields=id,full_name,age')
+
+        assert data['results'] == [{'id': patient.id, 'full_name': "John Doe", 'age': data['results'][0]['age']}]
+        page = queries[-1]
+        assert 'first_name' in page and 'date_of_birth' in page
+        assert '"address"' not in page and '"email"' not in page
+        assert 'medical_imaging_hospital' not in page
+
+    def test_related_field_joins_only_when_requested(self, client, patient):
+        data, queries = get(client, '/api/patients/?fields=id,hospital_name')
+
+        assert data['results'][0]['hospital_name'] == "Test Hospital"
+        assert 'JOIN "medical_imaging_hospital"' in queries[-1]
+
+    def test_default_patient_list_unchanged(self, client, patient):
+        row = client.get('/api/patients/').data['results'][0]
+
+        assert row['address'] == "1 Main St"
+        assert row['hospital_name'] == "Test Hospital"
+
+    def test_unrequested_annotations_skipped(self, client, study):
+        data, queries = get(client, '/api/studies/?fields=id,status')
+
+        assert data['results'] == [{'id': study.id, 'status': "completed"}]
+        assert len(queries) == 1
+        assert 'medical_imaging_dicomimage' not in queries[0]
+        assert 'medical_imaging_diagnosis' not in queries[0]
+        assert 'medical_imaging_patient' not in queries[0]
+
+    def test_hospital_fields(self, client, patient):
+        data, queries = get(client, '/api/hospitals/?fields=id,name')
+
+        assert data['results'] == [{'id': patient.hospital_id, 'name': "Test Hospital"}]
+        assert 'medical_imaging_patient' not in ' '.join(queries)
+
+    def test_study_detail_images_expandable(self, client, study):
+        data, queries = get(client, f'/api/studies/{study.id}/')
+
+        assert 'images' not in data
+        assert data['diagnosis']['impression'] == "Normal"
+        assert not any('medical_imaging_dicomimage' in sql for sql in queries)
+
+        data, queries = get(client, f'/api/studies/{study.id}/?expand=images')
+
+        assert [image['instance_number'] for image in data['images']] == [1]
+
+    def test_study_detail_without_diagnosis(self, client, study):
+        data, queries = get(client, f'/api/studies/{study.id}/?fields=id,patient_name')
+
+        assert data == {'id': study.id, 'patient_name': "John Doe"}
+        assert len(queries) == 1
+        assert 'medical_imaging_diagnosis' not in queries[0]
+
+    def test_audit_log_fields_with_cursor(self, client, user):
+        for i in range(3):
+            AuditLog.objects.create(user=user, action='view', resource_type='Patient', resource_id=i)
+
+        data, queries = get(client, '/api/audit-logs/?fields=id,action&page_size=2')
+
+        assert [set(row) for row in data['results']] == [{'id', 'action'}] * 2
+        assert len(queries) == 1
+        assert 'auth_user' not in queries[0]
+        assert len(client.get(data['next']).data['results']) == 1
+
+    def test_diagnosis_fields(self, client, study):
+        data, queries = get(client, '/api/diagnoses/?fields=id,radiologist_name')
+
+        assert data['results'] == [{'id': study.diagnosis.id, 'radiologist_name': ''}]
+        assert len(queries) <= 2
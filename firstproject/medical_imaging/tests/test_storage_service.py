@@ -0,0 +1,42 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from django.core.files.storage import default_storage
+from medical_imaging.storage_service import StorageService
+
+
+@pytest.mark.unit
+@pytest.mark.usefixtures('media_root')
+class TestWriteReplacing:
+    """Test writes that replace the file at a fixed key"""
+
+    def test_local_write_replaces_in_place(self, media_root):
+        StorageService.write_replacing('renditions/a.jpg', b'old')
+        StorageService.write_replacing('renditions/a.jpg', b'new')
+
+        assert (media_root / 'renditions' / 'a.jpg').read_bytes() == b'new'
+        assert [path.name for path in (media_root / 'renditions').iterdir()] == ['a.jpg']
+
+    def test_object_store_uses_overwrite_storage(self, settings):
+        """Test non-local backends write through the 'overwrite' storage alias"""
+        settings.STORAGES = {**settings.STORAGES, 'overwrite': {'BACKEND': 'unused'}}
+        overwrite = MagicMock()
+
+        with patch.object(default_storage, 'path', side_effect=NotImplementedError), \
+                patch('medical_imaging.storage_service.storages', {'overwrite': overwrite}):
+            StorageService.write_replacing('renditions/b.jpg', b'data')
+
+        key, content = overwrite.save.call_args[0]
+        assert key == 'renditions/b.jpg'
+        assert content.read() == b'data'
+
+    def test_fallback_deletes_then_saves(self, settings):
+        """Test backends without an overwrite alias never get a suffixed copy"""
+        settings.STORAGES = {key: value for key, value in settings.STORAGES.items() if key != 'overwrite'}
+
+        with patch.object(default_storage, 'path', side_effect=NotImplementedError), \
+                patch.object(default_storage, 'delete') as delete, \
+                patch.object(default_storage, 'save') as save:
+            StorageService.write_replacing('renditions/c.jpg', b'data')
+
+        delete.assert_called_once_with('renditions/c.jpg')
+        assert save.call_args[0][0] == 'renditions/c.jpg'
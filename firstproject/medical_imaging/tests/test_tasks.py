@@ -0,0 +1,357 @@
+import hashlib
+import pytest
+from io import BytesIO
+from pathlib import Path
+from unittest.mock import patch
+from PIL import Image as PILImage
+from celery.exceptions import Retry
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
+from django.db import OperationalError
+from medical_imaging.models import ImagingStudy, DicomImage, TaskStatus
+from medical_imaging.tasks import process_dicom_images_async, reprocess_study_images, warm_study_cache, _ingest_file
+from medical_imaging.original_storage_service import DicomOriginalService
+from medical_imaging.image_cache_service import ImageCacheService
+from medical_imaging.ingest_writer import DicomImageBatchWriter, TaskProgressReporter
+from medical_imaging.tiered_cache import image_cache
+from medical_imaging.upload_staging_service import UploadStagingService
+
+
+CT_SMALL = Path(__file__).resolve().parent.parent / 'CT_small.dcm'
+
+
+@pytest.fixture
+def study(study):
+    """The shared study, not yet processed"""
+    study.status = 'pending'
+    study.save(update_fields=['status'])
+    return study
+
+
+def jpeg_bytes(color='red'):
+    img = PILImage.new('RGB', (64, 64), color=color)
+    buffer = BytesIO()
+    img.save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+
+@pytest.mark.unit
+class TestIngestFile:
+    """Test the per-file ingest worker function"""
+
+    def test_ingest_dicom_file(self):
+        """Test DICOM files are parsed and rendered to JPEG"""
+        result = _ingest_file({
+            'filename': 'ct.dcm',
+            'content': CT_SMALL.read_bytes(),
+            'instance_number': 1,
+        })
+
+        assert result['error'] is None
+        assert result['is_dicom'] is True
+        assert result['rendition_name'] == 'ct.dcm.jpg'
+        assert result['rendition'][:2] == b'\xff\xd8'
+        assert result['fields']['rows'] == 128
+        assert result['fields']['sop_instance_uid']
+
+    def test_ingest_stores_original(self, media_root):
+        """Test the source DICOM is stored under its content-addressed key"""
+        content = CT_SMALL.read_bytes()
+        result = _ingest_file({'filename': 'ct.dcm', 'content': content, 'instance_number': 1})
+
+        sha256 = hashlib.sha256(content).hexdigest()
+        assert result['fields']['original_sha256'] == sha256
+        assert result['fields']['original_file'] == DicomOriginalService.original_key(sha256)
+        assert (media_root / result['fields']['original_file']).read_bytes() == content
+
+    def test_concurrent_store_keeps_content_key(self, media_root):
+        """Test a writer that lost the exists() race still uses the content key"""
+        content = CT_SMALL.read_bytes()
+        first = DicomOriginalService.store_original(content)
+
+        with patch('medical_imaging.original_storage_service.default_storage.exists', return_value=False):
+            second = DicomOriginalService.store_original(content)
+
+        assert second['storage_key'] == first['storage_key']
+        stored = [path for path in media_root.rglob('*') if path.is_file()]
+        assert stored == [media_root / first['storage_key']]
+
+    def test_ingest_regular_image(self):
+        """Test non-DICOM files are stored unchanged"""
+        content = jpeg_bytes()
+        result = _ingest_file({'filename': 'photo.jpg', 'content': content, 'instance_number': 2})
+
+        assert result['is_dicom'] is False
+        assert result['rendition'] == content
+        assert result['fields'] == {}
+
+    def test_ingest_reports_errors(self):
+        """Test failures are returned rather than raised"""
+        result = _ingest_file({'filename': 'missing.dcm', 'storage_key': 'nope', 'instance_number': 3})
+
+        assert result['error'].startswith('Error processing missing.dcm')
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+class TestProcessDicomImagesTask:
+    """Test the DICOM ingest Celery task"""
+
+    def test_parallel_ingest_creates_images(self, settings, media_root, study):
+        """Test a batch processed by the worker pool is persisted in order"""
+        settings.DICOM_INGEST_WORKERS = 2
+        file_data_list = [
+            {'filename': 'ct.dcm', 'content': CT_SMALL.read_bytes(), 'instance_number': 1},
+            {'filename': 'a.jpg', 'content': jpeg_bytes('red'), 'instance_number': 2},
+            {'filename': 'b.jpg', 'content': jpeg_bytes('blue'), 'instance_number': 3},
+        ]
+
+        result = process_dicom_images_async.apply(args=[study.id, file_data_list]).get()
+
+        assert result['errors'] == []
+        assert [img['instance_number'] for img in result['created_images']] == [1, 2, 3]
+        assert DicomImage.objects.filter(study=study, is_dicom=True).count() == 1
+
+        study.refresh_from_db()
+        assert study.status == 'completed'
+
+        # Rendition pyramid precomputed for every image
+        for image in DicomImage.objects.filter(study=study):
+            assert ImageCacheService._read_rendition(image.image_file.name, 'thumb')
+            assert ImageCacheService._read_rendition(image.image_file.name, 'webp')
+
+        task_status = TaskStatus.objects.get(task_id=result['task_id'])
+        assert task_status.processed_items == 3
+        assert task_status.status == 'completed'
+
+    def test_duplicate_sop_uid_is_skipped(self, media_root, study):
+        """Test the same DICOM instance uploaded twice is stored once"""
+        content = CT_SMALL.read_bytes()
+        file_data_list = [
+            {'filename': 'ct1.dcm', 'content': content, 'instance_number': 1},
+            {'filename': 'ct2.dcm', 'content': content, 'instance_number': 2},
+        ]
+
+        result = process_dicom_images_async.apply(args=[study.id, file_data_list]).get()
+
+        assert len(result['created_images']) == 1
+        assert len(result['skipped_images']) == 1
+        assert result['skipped_images'][0]['reason'] == 'Duplicate SOP Instance UID'
+
+    def test_reprocess_from_stored_originals(self, media_root, study):
+        """Test a study is re-rendered from its originals without a re-upload"""
+        file_data_list = [{'filename': 'ct.dcm', 'content': CT_SMALL.read_bytes(), 'instance_number': 1}]
+        process_dicom_images_async.apply(args=[study.id, file_data_list]).get()
+
+        image = DicomImage.objects.get(study=study)
+        old_rendition = image.image_file.name
+        DicomImage.objects.filter(pk=image.pk).update(window_center='', rows=None)
+        ImagingStudy.objects.filter(pk=study.pk).update(processing_version='v0')
+
+        result = reprocess_study_images.apply(args=[study.id]).get()
+
+        assert result['reprocessed'] == 1
+        assert result['errors'] == []
+        image.refresh_from_db()
+        assert image.rows == 128
+        assert image.image_file.name != old_rendition
+        assert not (media_root / old_rendition).exists()
+        study.refresh_from_db()
+        assert study.processing_version == result['processing_version']
+
+    def test_staged_files_deleted_after_last_retry(self, media_root, study):
+        """Test staged uploads are removed once the task gives up"""
+        upload = SimpleUploadedFile('ct.dcm', CT_SMALL.read_bytes())
+        staged = UploadStagingService.stage_file(upload, study.id, UploadStagingService.new_batch_id())
+        file_data_list = [{'filename': 'ct.dcm', 'instance_number': 1, **staged}]
+
+        with patch('medical_imaging.tasks.TaskStatus.objects.get_or_create', side_effect=RuntimeError('db down')):
+            result = process_dicom_images_async.apply(args=[study.id, file_data_list])
+
+        assert isinstance(result.result, RuntimeError)
+        assert not (media_root / staged['storage_key']).exists()
+        study.refresh_from_db()
+        assert study.status == 'failed'
+
+    def test_staged_files_kept_while_retrying(self, media_root, study):
+        """Test staged uploads survive a failed attempt that will be retried"""
+        upload = SimpleUploadedFile('ct.dcm', CT_SMALL.read_bytes())
+        staged = UploadStagingService.stage_file(upload, study.id, UploadStagingService.new_batch_id())
+        file_data_list = [{'filename': 'ct.dcm', 'instance_number': 1, **staged}]
+
+        with patch('medical_imaging.tasks.TaskStatus.objects.get_or_create', side_effect=RuntimeError('db down')), \
+                patch.object(process_dicom_images_async, 'retry', side_effect=Retry()):
+            process_dicom_images_async.apply(args=[study.id, file_data_list])
+
+        assert (media_root / staged['storage_key']).exists()
+
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+@pytest.mark.usefixtures('clear_caches')
+class TestWarmStudyCache:
+    """Test the post-processing cache warmup"""
+
+    def process(self, study, count=3):
+        file_data_list = [
+            {'filename': f'{i}.jpg', 'content': jpeg_bytes(color), 'instance_number': i}
+            for i, color in zip(range(1, count + 1), ['red', 'green', 'blue', 'gray'])
+        ]
+        return process_dicom_images_async.apply(args=[study.id, file_data_list]).get()
+
+    def test_completed_study_queues_warmup(self, media_root, study, django_capture_on_commit_callbacks):
+        """Test the warmup is queued on its own queue once processing commits"""
+        with patch.object(warm_study_cache, 'apply_async') as mock_apply:
+            with django_capture_on_commit_callbacks(execute=True):
+                self.process(study)
+
+        mock_apply.assert_called_once()
+        assert mock_apply.call_args.kwargs['args'] == [study.id]
+        assert mock_apply.call_args.kwargs['queue'] == 'cache_warmup'
+
+    def test_warmup_disabled(self, settings, media_root, study, django_capture_on_commit_callbacks):
+        settings.CACHE_WARMUP_ENABLED = False
+
+        with django_capture_on_commit_callbacks() as callbacks:
+            self.process(study)
+
+        assert callbacks == []
+
+    def test_warms_thumbnails_and_first_previews(self, settings, media_root, study):
+        """Test viewer requests after the warmup are cache hits"""
+        settings.CACHE_WARMUP_PREVIEW_COUNT = 2
+        settings.CACHE_WARMUP_BATCH_SIZE = 2
+        self.process(study)
+
+        result = warm_study_cache.apply(args=[study.id]).get()
+
+        assert result['thumbnails'] == 3
+        assert result['previews'] == 2
+        images = DicomImage.objects.select_related('study__patient').filter(study=study).order_by('instance_number')
+        image_cache.clear_local()
+        with patch.object(ImageCacheService, '_read_rendition', side_effect=AssertionError('cache miss')):
+            for image in images:
+                namespace = ImageCacheService.cache_namespace(image)
+                assert ImageCacheService.get_thumbnail(image.image_file.name, namespace=namespace)
+                if image.instance_number <= 2:
+                    assert ImageCacheService.get_preview(image.image_file.name, namespace=namespace)
+
+    def test_concurrent_warmup_is_skipped(self, study):
+        cache.add(f"cache-warmup-{study.id}", 'other-task')
+
+        result = warm_study_cache.apply(args=[study.id]).get()
+
+        assert result == {'status': 'skipped', 'reason': 'already_warming'}
+
+
+def ingest_result(filename, instance_number, sop_uid=None, error=None):
+    """Build a result in the shape produced by _ingest_file"""
+    return {
+        'filename': filename,
+        'instance_number': instance_number,
+        'is_dicom': bool(sop_uid),
+        'fields': {'sop_instance_uid': sop_uid} if sop_uid else {},
+        'rendition': jpeg_bytes(),
+        'rendition_name': f'{filename}.jpg',
+        'error': error,
+    }
+
+
+@pytest.mark.django_db
+@pytest.mark.unit
+class TestDicomImageBatchWriter:
+    """Test the batched DicomImage writer"""
+
+    def test_bulk_insert_in_batches(self, media_root, study, django_assert_max_num_queries):
+        """Test rows are inserted with one dedup query and one insert per batch"""
+        writer = DicomImageBatchWriter(study, batch_size=10)
+
+        # 10 rows: 1 dedup IN query + savepoint/insert/release
+        with django_assert_max_num_queries(4):
+            for i in range(1, 11):
+                writer.add(ingest_result(f'slice{i}.dcm', i, sop_uid=f'1.2.3.{i}'))
+            writer.flush()
+
+        assert len(writer.created_images) == 10
+        assert all(img['id'] for img in writer.created_images)
+        assert DicomImage.objects.filter(study=study).count() == 10
+
+    def test_dedup_against_database_and_batch(self, media_root, study):
+        """Test duplicates in the DB and within the upload are skipped"""
+        writer = DicomImageBatchWriter(study, batch_size=2)
+        writer.add(ingest_result('a.dcm', 1, sop_uid='1.2.3'))
+        writer.add(ingest_result('b.dcm', 2, sop_uid='1.2.3'))
+        writer.add(ingest_result('c.dcm', 3, sop_uid='1.2.4'))
+        writer.flush()
+
+        second = DicomImageBatchWriter(study)
+        second.add(ingest_result('d.dcm', 4, sop_uid='1.2.4'))
+        second.flush()
+
+        assert [img['filename'] for img in writer.created_images] == ['a.dcm', 'c.dcm']
+        assert [s['filename'] for s in writer.skipped_images] == ['b.dcm']
+        assert second.created_images == []
+        assert second.skipped_images[0]['sop_instance_uid'] == '1.2.4'
+
+    def test_conflicting_batch_falls_back_to_single_rows(self, media_root, study):
+        """Test an instance_number conflict only fails the conflicting file"""
+        DicomImage.objects.create(study=study, instance_number=2, image_file='existing.jpg')
+
+        writer = DicomImageBatchWriter(study)
+        writer.add(ingest_result('a.jpg', 1))
+        writer.add(ingest_result('b.jpg', 2))
+        writer.flush()
+
+        assert [img['filename'] for img in writer.created_images] == ['a.jpg']
+        assert len(writer.errors) == 1
+        assert writer.errors[0].startswith('Error processing b.jpg')
+
+    def test_errors_are_collected(self, study):
+        """Test failed ingest results are reported without a DB write"""
+        writer = DicomImageBatchWriter(study)
+        writer.add(ingest_result('bad.dcm', 1, error='Error processing bad.dcm: boom'))
+        writer.flush()
+
+        assert writer.errors == ['Error processing bad.dcm: boom']
+        assert writer.created_images == []
+
+    def test_failed_insert_deletes_stored_files(self, media_root, study):
+        """Test files stored for a batch are removed when its insert fails"""
+        writer = DicomImageBatchWriter(study)
+        writer.add(ingest_result('a.jpg', 1))
+        writer.add(ingest_result('b.jpg', 2))
+
+        with patch.object(DicomImage.objects, 'bulk_create', side_effect=OperationalError('gone away')):
+            with pytest.raises(OperationalError):
+                writer.flush()
+
+        assert DicomImage.objects.filter(study=study).count() == 0
+        assert [path for path in media_root.rglob('*') if path.is_file()] == []
+
+
+@pytest.mark.django_db
+@pytest.mark.unit
+class TestTaskProgressReporter:
+    """Test throttled TaskStatus progress updates"""
+
+    def test_progress_written_every_n_items(self):
+        task_status = TaskStatus.objects.create(task_id='t1', task_name='test', total_items=10)
+        progress = TaskProgressReporter(task_status, every_items=5, every_seconds=3600)
+
+        for processed in range(1, 5):
+            progress.update(processed)
+        task_status.refresh_from_db()
+        assert task_status.processed_items == 0
+
+        progress.update(5)
+        task_status.refresh_from_db()
+        assert task_status.processed_items == 5
+
+    def test_progress_written_after_interval(self):
+        task_status = TaskStatus.objects.create(task_id='t2', task_name='test', total_items=10)
+        progress = TaskProgressReporter(task_status, every_items=100, every_seconds=0)
+
+        progress.update(1)
+        task_status.refresh_from_db()
+        assert task_status.processed_items == 1
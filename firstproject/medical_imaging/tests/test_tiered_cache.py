@@ -0,0 +1,207 @@
+import threading
+import time
+import pytest
+import numpy as np
+from unittest.mock import MagicMock, PropertyMock, patch
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from medical_imaging.tiered_cache import ByteBudgetLRU, TieredImageCache
+
+
+@pytest.mark.unit
+class TestByteBudgetLRU:
+    """Test the byte-bounded in-process LRU"""
+
+    def test_evicts_least_recently_used(self):
+        lru = ByteBudgetLRU(max_bytes=200)
+        lru.set('a', b'x' * 100)
+        lru.set('b', b'x' * 100)
+        lru.get('a')
+        lru.set('c', b'x' * 100)
+
+        assert lru.get('b') is None
+        assert lru.get('a') is not None
+        assert lru.current_bytes == 200
+
+    def test_oversized_values_not_cached(self):
+        lru = ByteBudgetLRU(max_bytes=10)
+        lru.set('a', b'x' * 100)
+
+        assert len(lru) == 0
+
+    def test_custom_sizeof(self):
+        """Test arrays are budgeted by their buffer size"""
+        lru = ByteBudgetLRU(max_bytes=150, sizeof=lambda value: value.nbytes)
+        lru.set('a', np.zeros(100, dtype=np.uint8))
+        lru.set('b', np.zeros(100, dtype=np.uint8))
+
+        assert len(lru) == 1
+        assert lru.current_bytes == 100
+
+    def test_expired_entries_are_misses(self):
+        lru = ByteBudgetLRU(max_bytes=100)
+        lru.set('a', b'x', timeout=0)
+
+        assert lru.get('a') is None
+        assert lru.misses == 1
+        assert lru.current_bytes == 0
+
+
+@pytest.mark.unit
+class TestTieredImageCache:
+    """Test the in-process tier in front of Redis"""
+
+    @pytest.fixture
+    def tiered(self):
+        cache.clear()
+        return TieredImageCache(alias='default', local_max_bytes=1024, local_ttl=60)
+
+    def test_local_hit_skips_redis(self, tiered):
+        tiered.set('k', b'thumb', 100)
+        cache.delete('k')
+
+        assert tiered.get('k') == b'thumb'
+        assert tiered.stats()['local']['hits'] == 1
+        assert tiered.stats()['redis']['hits'] == 0
+
+    def test_redis_hit_fills_local_tier(self, tiered):
+        cache.set('k', b'preview')
+
+        assert tiered.get('k') == b'preview'
+        assert tiered.get('k') == b'preview'
+
+        stats = tiered.stats()
+        assert stats['redis'] == {'alias': 'default', 'hits': 1, 'misses': 0}
+        assert stats['local']['hits'] == 1
+        assert stats['local']['misses'] == 1
+
+    def test_get_many_across_tiers(self, tiered):
+        tiered.set('a', b'1')
+        cache.set('b', b'2')
+
+        assert tiered.get_many(['a', 'b', 'c']) == {'a': b'1', 'b': b'2'}
+        assert tiered.stats()['redis']['misses'] == 1
+
+    def test_delete_many_clears_both_tiers(self, tiered):
+        tiered.set_many({'a': b'1', 'b': b'2'})
+        tiered.delete_many(['a', 'b'])
+
+        assert tiered.get('a') is None
+        assert cache.get('b') is None
+
+
+@pytest.mark.unit
+class TestSingleFlight:
+    """Test stampede protection in get_or_compute"""
+
+    @pytest.fixture
+    def tiered(self):
+        cache.clear()
+        return TieredImageCache(alias='default', local_max_bytes=1024, local_ttl=60,
+                                lock_timeout=10, lock_wait=5, early_refresh_beta=1.0)
+
+    def test_concurrent_misses_compute_once(self, tiered):
+        """Test simultaneous misses wait for one computation"""
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.2)
+            return b'thumb'
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(tiered.get_or_compute('k', compute, 100)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert results == [b'thumb'] * 5
+        assert len(calls) == 1
+        assert tiered.stats()['single_flight']['lock_waits'] == 4
+        assert cache.get('k:lock') is None
+
+    def test_waiter_computes_when_holder_gives_up(self, tiered):
+        """Test a waiter falls back to computing once the lock disappears"""
+        cache.add('k:lock', 'other', 10)
+        threading.Timer(0.1, cache.delete, ['k:lock']).start()
+
+        assert tiered.get_or_compute('k', lambda: b'mine', 100) == b'mine'
+        assert tiered.get('k') == b'mine'
+
+    def test_none_is_not_cached(self, tiered):
+        assert tiered.get_or_compute('k', lambda: None, 100) is None
+        assert cache.get('k') is None
+
+    def test_early_refresh_near_expiry(self, tiered, monkeypatch):
+        """Test a value about to expire is recomputed before it does"""
+        tiered.set('k', b'old', 100, delta=1000)
+        monkeypatch.setattr('medical_imaging.tiered_cache.random.random', lambda: 0.5)
+
+        assert tiered.get_or_compute('k', lambda: b'new', 100) == b'new'
+        assert tiered.stats()['single_flight']['early_refreshes'] == 1
+
+    def test_no_early_refresh_far_from_expiry(self, tiered):
+        tiered.set('k', b'old', 3600, delta=0.001)
+
+        assert tiered.get_or_compute('k', lambda: b'new', 3600) == b'old'
+
+    def test_early_refresh_skipped_while_locked(self, tiered, monkeypatch):
+        """Test other callers keep serving the current value during a refresh"""
+        tiered.set('k', b'old', 100, delta=1000)
+        monkeypatch.setattr('medical_imaging.tiered_cache.random.random', lambda: 0.5)
+        cache.add('k:lock', 'other', 10)
+
+        assert tiered.get_or_compute('k', lambda: b'new', 100) == b'old'
+
+    def test_early_refresh_disabled(self, tiered):
+        tiered.early_refresh_beta = 0
+        tiered.set('k', b'old', 100, delta=1000)
+
+        assert tiered.get_or_compute('k', lambda: b'new', 100) == b'old'
+
+    def test_release_is_compare_and_delete_on_redis(self, tiered):
+        """Test the lock is released by one script comparing the token in Redis"""
+        backend = MagicMock()
+        backend.make_key.side_effect = lambda key: f':1:{key}'
+        backend.client.encode.side_effect = lambda value: f'encoded-{value}'.encode()
+        client = MagicMock()
+
+        with patch.object(TieredImageCache, 'redis', new_callable=PropertyMock, return_value=backend), \
+                patch('django_redis.get_redis_connection', return_value=client):
+            tiered._release('k', 'token')
+
+        client.eval.assert_called_once_with(TieredImageCache.RELEASE_SCRIPT, 1, ':1:k:lock', b'encoded-token')
+        backend.get.assert_not_called()
+        backend.delete.assert_not_called()
+
+
+@pytest.mark.unit
+class TestAsyncReads:
+    """Test the async read path used by the ASGI views"""
+
+    @pytest.fixture
+    def tiered(self):
+        cache.clear()
+        return TieredImageCache(alias='default', local_max_bytes=1024, local_ttl=60)
+
+    def test_aget_many_across_tiers(self, tiered):
+        tiered.set('a', b'1')
+        cache.set('b', b'2')
+
+        assert async_to_sync(tiered.aget_many)(['a', 'b', 'c']) == {'a': b'1', 'b': b'2'}
+        assert tiered.get('b') == b'2'
+        assert tiered.stats()['local']['hits'] == 2
+
+    def test_aget_fresh_defers_early_refresh(self, tiered, monkeypatch):
+        """Test a drawn early refresh is left to the synchronous path"""
+        tiered.set('k', b'old', 100, delta=1000)
+
+        monkeypatch.setattr('medical_imaging.tiered_cache.random.random', lambda: 0.5)
+        assert async_to_sync(tiered.aget_fresh)('k') is None
+
+        tiered.early_refresh_beta = 0
+        assert async_to_sync(tiered.aget_fresh)('k') == b'old'
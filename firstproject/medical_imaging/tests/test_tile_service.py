@@ -0,0 +1,110 @@
+import pytest
+from io import BytesIO
+from PIL import Image as PILImage
+from asgiref.sync import async_to_sync
+from django.core.files.base import ContentFile
+from django.test import AsyncClient
+from medical_imaging.models import DicomImage
+from medical_imaging.tile_service import DeepZoomTileService, TileNotFound
+
+
+@pytest.fixture(autouse=True)
+def clear_tile_caches(clear_caches):
+    DeepZoomTileService.level_cache.clear()
+    yield
+    DeepZoomTileService.level_cache.clear()
+
+
+@pytest.fixture
+def large_image(media_root, study):
+    """A 1000x600 radiograph-like image"""
+    study.modality = "DX"
+    study.save(update_fields=['modality'])
+
+    buffer = BytesIO()
+    PILImage.linear_gradient('L').resize((1000, 600)).save(buffer, format='JPEG')
+    image = DicomImage(study=study, instance_number=1)
+    image.image_file.save('chest.jpg', ContentFile(buffer.getvalue()), save=False)
+    image.save()
+    return image
+
+
+def asgi_get(url):
+    async def request():
+        return await AsyncClient().get(url)
+
+    return async_to_sync(request)()
+
+
+@pytest.mark.unit
+class TestPyramidGeometry:
+    """Test Deep Zoom level and tile geometry"""
+
+    def test_levels(self):
+        assert DeepZoomTileService.max_level(1000, 600) == 10
+        assert DeepZoomTileService.max_level(1024, 1024) == 10
+        assert DeepZoomTileService.level_size(1000, 600, 10) == (1000, 600)
+        assert DeepZoomTileService.level_size(1000, 600, 9) == (500, 300)
+        assert DeepZoomTileService.level_size(1000, 600, 0) == (1, 1)
+
+    def test_tile_boxes_overlap_neighbours(self):
+        assert DeepZoomTileService.tile_box(1000, 600, 0, 0) == (0, 0, 257, 257)
+        assert DeepZoomTileService.tile_box(1000, 600, 1, 1) == (255, 255, 513, 513)
+        assert DeepZoomTileService.tile_box(1000, 600, 3, 2) == (767, 511, 1000, 600)
+
+    def test_out_of_range(self):
+        with pytest.raises(TileNotFound):
+            DeepZoomTileService.level_size(1000, 600, 11)
+        with pytest.raises(TileNotFound):
+            DeepZoomTileService.tile_box(1000, 600, 4, 0)
+
+
+@pytest.mark.django_db
+@pytest.mark.integration
+class TestDeepZoomTiles:
+    """Test lazily generated, cached tiles"""
+
+    def test_tile_generated_and_cached(self, large_image, monkeypatch):
+        """Test a tile is cut from its level once, then served from the cache"""
+        path = large_image.image_file.name
+
+        tile = DeepZoomTileService.get_tile(path, 9, 1, 0)
+
+        assert PILImage.open(BytesIO(tile)).size == (245, 257)
+        monkeypatch.setattr(DeepZoomTileService, '_render_tile', lambda *args: pytest.fail('tile regenerated'))
+        assert DeepZoomTileService.get_tile(path, 9, 1, 0) == tile
+
+    def test_level_decoded_once_for_its_tiles(self, large_image):
+        path = large_image.image_file.name
+
+        DeepZoomTileService.get_tile(path, 10, 0, 0)
+        DeepZoomTileService.get_tile(path, 10, 1, 0)
+
+        assert len(DeepZoomTileService.level_cache) == 1
+
+    def test_descriptor_endpoint(self, large_image):
+        response = asgi_get(f'/api/images/{large_image.id}/tiles/')
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data['Image']['Size'] == {'Width': '1000', 'Height': '600'}
+        assert data['Image']['TileSize'] == '256'
+        assert data['Image']['Url'] == f'/api/images/{large_image.id}/tiles/'
+        assert len(data['version']) == 16
+
+    def test_versioned_tile_is_immutable(self, large_image):
+        """Test tiles requested with the current version get long-lived headers"""
+        version = asgi_get(f'/api/images/{large_image.id}/tiles/').json()['version']
+
+        response = asgi_get(f'/api/images/{large_image.id}/tiles/8/0_0.webp?v={version}')
+        assert response.status_code == 200
+        assert response['Content-Type'] == 'image/webp'
+        assert response['Cache-Control'] == 'public, max-age=31536000, immutable'
+
+        unversioned = asgi_get(f'/api/images/{large_image.id}/tiles/8/0_0.webp')
+        assert unversioned['Cache-Control'] == 'public, max-age=3600'
+
+    def test_tile_outside_pyramid(self, large_image):
+        assert asgi_get(f'/api/images/{large_image.id}/tiles/11/0_0.webp').status_code == 404
+        assert asgi_get(f'/api/images/{large_image.id}/tiles/9/5_0.webp').status_code == 404
+        assert asgi_get('/api/images/999999/tiles/0/0_0.webp').status_code == 404
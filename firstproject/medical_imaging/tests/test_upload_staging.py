@@ -0,0 +1,93 @@
+import hashlib
+import pytest
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from medical_imaging.upload_staging_service import UploadStagingService, StagedFileError
+from medical_imaging.tasks import _open_file_content
+
+
+@pytest.fixture
+def staging_storage(settings, tmp_path):
+    """Point default_storage at a temporary media root"""
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+
+@pytest.mark.unit
+class TestUploadStagingService:
+    """Test staging of uploaded files in storage"""
+
+    def test_stage_file_records_size_and_checksum(self, staging_storage):
+        """Test staged files report size and SHA-256 of the content"""
+        content = b'DICM' * 1000
+        upload = SimpleUploadedFile('slice 001.dcm', content)
+
+        staged = UploadStagingService.stage_file(upload, 42, 'batch1')
+
+        assert staged['size'] == len(content)
+        assert staged['sha256'] == hashlib.sha256(content).hexdigest()
+        assert staged['storage_key'].startswith('upload_staging/42/batch1/')
+        assert default_storage.exists(staged['storage_key'])
+
+    def test_stage_file_streams_in_chunks(self, staging_storage, monkeypatch):
+        """Test content larger than one chunk is staged intact"""
+        monkeypatch.setattr(UploadStagingService, 'CHUNK_SIZE', 16)
+        content = bytes(range(256)) * 4
+        upload = SimpleUploadedFile('big.dcm', content)
+
+        staged = UploadStagingService.stage_file(upload, 1, 'batch')
+        data = UploadStagingService.read_staged_file(
+            staged['storage_key'], staged['size'], staged['sha256']
+        )
+
+        assert data == content
+
+    def test_read_staged_file_checksum_mismatch(self, staging_storage):
+        """Test tampered or truncated staged files are rejected"""
+        staged = UploadStagingService.stage_file(SimpleUploadedFile('a.dcm', b'abc'), 1, 'b')
+
+        with pytest.raises(StagedFileError):
+            UploadStagingService.read_staged_file(staged['storage_key'], expected_sha256='0' * 64)
+
+        with pytest.raises(StagedFileError):
+            UploadStagingService.read_staged_file(staged['storage_key'], expected_size=4)
+
+    def test_read_missing_staged_file(self, staging_storage):
+        """Test missing staged files raise StagedFileError"""
+        with pytest.raises(StagedFileError):
+            UploadStagingService.read_staged_file('upload_staging/missing.dcm')
+
+    def test_delete_staged_files(self, staging_storage):
+        """Test cleanup removes staged files"""
+        staged = UploadStagingService.stage_file(SimpleUploadedFile('a.dcm', b'abc'), 1, 'b')
+
+        deleted = UploadStagingService.delete_staged_files([staged['storage_key']])
+
+        assert deleted == 1
+        assert not default_storage.exists(staged['storage_key'])
+
+    def test_open_staged_buffer_is_memory_mapped(self, staging_storage):
+        """Test local staged files are verified and mapped without copying"""
+        import mmap
+
+        staged = UploadStagingService.stage_file(SimpleUploadedFile('a.dcm', b'mapped'), 1, 'b')
+
+        with UploadStagingService.open_staged_buffer(
+            staged['storage_key'], staged['size'], staged['sha256']
+        ) as buffer:
+            assert isinstance(buffer, mmap.mmap)
+            assert buffer[:] == b'mapped'
+
+        with pytest.raises(StagedFileError):
+            with UploadStagingService.open_staged_buffer(staged['storage_key'], staged['size'], '0' * 64):
+                pass
+
+    def test_open_file_content_staged_and_inline(self, staging_storage):
+        """Test the task accepts both staged and inline file entries"""
+        staged = UploadStagingService.stage_file(SimpleUploadedFile('a.dcm', b'staged'), 1, 'b')
+        staged['filename'] = 'a.dcm'
+
+        with _open_file_content(staged) as content:
+            assert content[:] == b'staged'
+        with _open_file_content({'content': b'inline'}) as content:
+            assert content == b'inline'
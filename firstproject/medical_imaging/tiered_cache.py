@@ -0,0 +1,609 @@
+"""
+Two-tier cache for encoded image bytes.
+Provides:
+- Per-process LRU with byte-budget eviction (tier 1)
+- Redis without compression for media values (tier 2)
+- Hit/miss counters per tier
+- Single-flight recomputation with probabilistic early refresh
+- Generation counters for O(1) invalidation of key namespaces
+- Async reads (redis.asyncio) for the ASGI image views
+
+JPEG/WebP renditions are already compressed, so zlib on the default cache
+only costs CPU. Hot renditions are served from process memory, skipping
+the Redis round trip entirely.
+
+When a popular key expires, get_or_compute lets one caller (holding a short
+Redis lock) regenerate it while the others poll for the result. Keys set
+with a recompute cost are refreshed early, before they expire, by a caller
+chosen at random with a probability that rises towards expiry (XFetch).
+"""
+import asyncio
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional
+
+import redis.asyncio as aioredis
+from django.conf import settings
+from django.core.cache import caches
+
+logger = logging.getLogger(__name__)
+
+
+class ByteBudgetLRU:
+    """Thread-safe LRU bounded by the total size of its values, with optional expiry."""
+
+    def __init__(self, max_bytes: int, sizeof: Callable = len):
+        """
+        Args:
+            max_bytes: Total size budget
+            sizeof: Function returning the size of a value in bytes
+        """
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.monotonic():
+                self._remove(key)
+                entry = None
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, timeout: float = None) -> None:
+        """
+        Store a value. Values larger than the whole budget are not cached.
+
+        Args:
+            key: Cache key
+            value: Value to store
+            timeout: Seconds until expiry (None = until evicted)
+        """
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+
+        expires_at = time.monotonic() + timeout if timeout is not None else None
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, size, expires_at)
+            self.current_bytes += size
+
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def delete(self, key) -> None:
+        with self._lock:
+            self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def _remove(self, key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.current_bytes -= entry[1]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class TieredImageCache:
+    """
+    Cache with the django cache API (get/set/get_many/set_many/delete_many)
+    backed by a per-process LRU in front of an uncompressed Redis alias.
+
+    Local entries live at most LOCAL_TTL seconds, which bounds how long
+    another process can serve a value that was deleted elsewhere.
+    """
+
+    # Suffixes of the companion keys used by get_or_compute
+    META_SUFFIX = ':xf'
+    LOCK_SUFFIX = ':lock'
+
+    # Deletes a lock only if it still holds the caller's token, in one step
+    RELEASE_SCRIPT = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then "
+        "return redis.call('del', KEYS[1]) end "
+        "return 0"
+    )
+
+    # How often waiters check for a value being computed elsewhere (seconds)
+    POLL_INTERVAL = 0.05
+
+    # Most generation counters memoised per process
+    GENERATION_MEMO_SIZE = 10000
+
+    def __init__(self, alias: str, local_max_bytes: int, local_ttl: float,
+                 lock_timeout: float = 30, lock_wait: float = 5, early_refresh_beta: float = 1.0,
+                 generation_ttl: float = 1):
+        """
+        Args:
+            alias: Name of the Redis cache in settings.CACHES (falls back to 'default')
+            local_max_bytes: Byte budget of the in-process tier
+            local_ttl: Maximum lifetime of in-process entries (seconds)
+            lock_timeout: Lifetime of a recompute lock, in case its holder dies (seconds)
+            lock_wait: How long waiters poll before computing themselves (seconds)
+            early_refresh_beta: XFetch aggressiveness (0 disables early refresh)
+            generation_ttl: How long a process reuses generation counters it read (seconds)
+        """
+        self.alias = alias
+        self.local_ttl = local_ttl
+        self.generation_ttl = generation_ttl
+        self.generations = ByteBudgetLRU(self.GENERATION_MEMO_SIZE, sizeof=lambda value: 1)
+        self._async_client = None
+        self._async_loop = None
+        self.lock_timeout = lock_timeout
+        self.lock_wait = lock_wait
+        self.early_refresh_beta = early_refresh_beta
+        self.local = ByteBudgetLRU(local_max_bytes)
+        self.redis_hits = 0
+        self.redis_misses = 0
+        self.computes = 0
+        self.early_refreshes = 0
+        self.lock_waits = 0
+
+    @property
+    def _alias_in_use(self) -> str:
+        return self.alias if self.alias in settings.CACHES else 'default'
+
+    @property
+    def redis(self):
+        return caches[self._alias_in_use]
+
+    def _local_timeout(self, timeout):
+        return self.local_ttl if timeout is None else min(timeout, self.local_ttl)
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+
+        value = self.redis.get(key)
+        if value is None:
+            self.redis_misses += 1
+            return None
+
+        self.redis_hits += 1
+        self.local.set(key, value, self.local_ttl)
+        return value
+
+    def get_many(self, keys: Iterable[str]) -> Dict:
+        found = {}
+        remote_keys = []
+        for key in keys:
+            value = self.local.get(key)
+            if value is not None:
+                found[key] = value
+            else:
+                remote_keys.append(key)
+
+        if remote_keys:
+            remote = self.redis.get_many(remote_keys)
+            self.redis_hits += len(remote)
+            self.redis_misses += len(remote_keys) - len(remote)
+            for key, value in remote.items():
+                self.local.set(key, value, self.local_ttl)
+            found.update(remote)
+
+        return found
+
+    def _with_meta(self, mapping: Dict, timeout, delta: Optional[float]) -> Dict:
+        """Add early-refresh metadata ("<expiry>:<recompute seconds>") for each key."""
+        if delta is None or timeout is None:
+            return mapping
+        meta = f"{time.time() + timeout:.3f}:{delta:.3f}".encode()
+        entries = dict(mapping)
+        for key in mapping:
+            entries[f"{key}{self.META_SUFFIX}"] = meta
+        return entries
+
+    def set(self, key, value, timeout=None, delta: Optional[float] = None) -> None:
+        """
+        Args:
+            key: Cache key
+            value: Value to store
+            timeout: Seconds until expiry
+            delta: Seconds it took to compute the value; enables early refresh
+        """
+        if delta is not None:
+            self.set_many({key: value}, timeout, delta)
+            return
+        self.redis.set(key, value, timeout)
+        self.local.set(key, value, self._local_timeout(timeout))
+
+    def set_many(self, mapping: Dict, timeout=None, delta: Optional[float] = None) -> None:
+        mapping = self._with_meta(mapping, timeout, delta)
+        self.redis.set_many(mapping, timeout)
+        for key, value in mapping.items():
+            self.local.set(key, value, self._local_timeout(timeout))
+
+    def delete(self, key) -> None:
+        self.delete_many([key])
+
+    def delete_many(self, keys: Iterable[str]) -> None:
+        keys = list(keys)
+        keys += [f"{key}{self.META_SUFFIX}" for key in keys]
+        for key in keys:
+            self.local.delete(key)
+        self.redis.delete_many(keys)
+
+    def _should_refresh_early(self, meta: Optional[bytes]) -> bool:
+        """
+        XFetch: refresh when now - delta * beta * ln(rand) >= expiry.
+
+        Expensive values and values close to expiry are refreshed sooner;
+        the randomness spreads refreshes so only about one caller does it.
+        """
+        if not meta or self.early_refresh_beta <= 0:
+            return False
+        try:
+            expiry, delta = (float(part) for part in meta.decode().split(':'))
+        except ValueError:
+            return False
+        gap = -delta * self.early_refresh_beta * math.log(1.0 - random.random())
+        return time.time() + gap >= expiry
+
+    def _acquire(self, key: str) -> Optional[str]:
+        token = uuid.uuid4().hex
+        if self.redis.add(f"{key}{self.LOCK_SUFFIX}", token, self.lock_timeout):
+            return token
+        return None
+
+    def _release(self, key: str, token: str) -> None:
+        lock_key = f"{key}{self.LOCK_SUFFIX}"
+        redis = self.redis
+        try:
+            from django_redis import get_redis_connection
+            client = get_redis_connection(self._alias_in_use)
+        except (ImportError, NotImplementedError):
+            # Backends without scripting (local memory): check, then delete
+            if redis.get(lock_key) == token:
+                redis.delete(lock_key)
+            return
+
+        # Compare-and-delete in Redis, so a lock that expired and was taken by
+        # someone else between the check and the delete is left alone
+        client.eval(self.RELEASE_SCRIPT, 1, redis.make_key(lock_key), redis.client.encode(token))
+
+    def refresh(self, key: str, compute: Callable, timeout=None):
+        """
+        Compute a value and store it with its recompute cost (no locking).
+
+        Args:
+            key: Cache key
+            compute: Callable returning the value, or None if it cannot be produced
+            timeout: Seconds until expiry
+
+        Returns:
+            The computed value (None values are not cached)
+        """
+        started = time.monotonic()
+        value = compute()
+        self.computes += 1
+        if value is not None:
+            self.set(key, value, timeout, delta=time.monotonic() - started)
+        return value
+
+    def _locked_refresh(self, key: str, compute: Callable, timeout, token: str):
+        try:
+            return self.refresh(key, compute, timeout)
+        finally:
+            self._release(key, token)
+
+    def get_or_compute(self, key: str, compute: Callable, timeout=None):
+        """
+        Read-through get with single-flight recomputation.
+
+        On a miss, the caller that takes the key's lock computes the value;
+        concurrent callers poll Redis for it for up to lock_wait seconds and
+        only compute it themselves if it does not appear. A hit that draws
+        an early refresh recomputes under the same lock while other callers
+        keep getting the current value.
+
+        Args:
+            key: Cache key
+            compute: Callable returning the value, or None if it cannot be produced
+            timeout: Seconds until expiry
+
+        Returns:
+            Cached or computed value (None if compute returned None)
+        """
+        meta_key = f"{key}{self.META_SUFFIX}"
+        found = self.get_many([key, meta_key])
+        value = found.get(key)
+
+        if value is not None:
+            if not self._should_refresh_early(found.get(meta_key)):
+                return value
+            token = self._acquire(key)
+            if token is None:
+                return value
+            self.early_refreshes += 1
+            logger.debug(f"Early refresh of {key}")
+            return self._locked_refresh(key, compute, timeout, token)
+
+        token = self._acquire(key)
+        if token is not None:
+            return self._locked_refresh(key, compute, timeout, token)
+
+        # Someone else is computing it: wait for their result
+        self.lock_waits += 1
+        lock_key = f"{key}{self.LOCK_SUFFIX}"
+        deadline = time.monotonic() + self.lock_wait
+        while time.monotonic() < deadline:
+            time.sleep(self.POLL_INTERVAL)
+            value = self.redis.get(key)
+            if value is not None:
+                self.local.set(key, value, self._local_timeout(timeout))
+                return value
+            if self.redis.get(lock_key) is None:
+                break
+
+        logger.debug(f"No result for {key} from the lock holder, computing it")
+        return self.refresh(key, compute, timeout)
+
+    def sizes(self, keys: Iterable[str]) -> Dict[str, int]:
+        """
+        Stored size of each key without downloading values.
+
+        On django-redis this is one pipelined STRLEN per key (the size of the
+        serialized value, a few bytes more than the payload). Other backends
+        fall back to fetching the values.
+
+        Args:
+            keys: Cache keys
+
+        Returns:
+            dict: key -> size in bytes, for keys that exist
+        """
+        keys = list(keys)
+        redis = self.redis
+        try:
+            from django_redis import get_redis_connection
+            client = get_redis_connection(self._alias_in_use)
+        except (ImportError, NotImplementedError):
+            return {key: len(value) for key, value in redis.get_many(keys).items()}
+
+        pipeline = client.pipeline()
+        for key in keys:
+            pipeline.strlen(redis.make_key(key))
+        return {key: length for key, length in zip(keys, pipeline.execute()) if length}
+
+    def incr_many(self, amounts: Dict[str, int]) -> None:
+        """
+        Add to several integer counters in one round trip.
+
+        On django-redis this is one pipeline of INCRBY (missing counters start
+        at 0 and never expire). Other backends fall back to incr per key.
+
+        Args:
+            amounts: key -> increment
+        """
+        redis = self.redis
+        try:
+            from django_redis import get_redis_connection
+            client = get_redis_connection(self._alias_in_use)
+        except (ImportError, NotImplementedError):
+            for key, amount in amounts.items():
+                try:
+                    redis.incr(key, amount)
+                except ValueError:
+                    # First increment: create the counter (never expires)
+                    redis.add(key, 0, None)
+                    redis.incr(key, amount)
+            return
+
+        pipeline = client.pipeline(transaction=False)
+        for key, amount in amounts.items():
+            pipeline.incrby(redis.make_key(key), amount)
+        pipeline.execute()
+
+    def get_generations(self, keys: Iterable[str]) -> Dict[str, str]:
+        """
+        Current value of generation counters ('0' for counters never bumped).
+
+        Values are read from Redis in one round trip and reused by this
+        process for generation_ttl seconds, so a bump made elsewhere is seen
+        within that delay.
+
+        Args:
+            keys: Generation counter keys
+
+        Returns:
+            dict: key -> generation
+        """
+        found = {}
+        remote_keys = []
+        for key in keys:
+            value = self.generations.get(key)
+            if value is not None:
+                found[key] = value
+            else:
+                remote_keys.append(key)
+
+        if remote_keys:
+            remote = self.redis.get_many(remote_keys)
+            for key in remote_keys:
+                found[key] = str(remote.get(key, 0))
+                self.generations.set(key, found[key], self.generation_ttl)
+
+        return found
+
+    def bump_generation(self, key: str) -> str:
+        """
+        Move a generation counter forward, orphaning every key built from it.
+
+        A single SET of a random 64-bit value. Generations are not ordered;
+        a new one only has to differ from every value used before, which a
+        clock reading does not guarantee across hosts (or after the clock is
+        stepped back) and INCR does not guarantee once Redis evicts the
+        counter. Orphaned keys are never read again and expire through
+        their TTL.
+
+        Args:
+            key: Generation counter key
+
+        Returns:
+            str: New generation
+        """
+        generation = uuid.uuid4().hex[:16]
+        self.redis.set(key, generation, None)
+        self.generations.set(key, generation, self.generation_ttl)
+        return generation
+
+    def _get_async_client(self):
+        """
+        redis.asyncio client for the Redis alias, bound to the first event
+        loop that asks for one (the ASGI server loop).
+
+        Returns None on other loops (async views run through async_to_sync
+        under WSGI get a new loop per request) and for non django-redis
+        backends; callers then use the cache's own async API.
+        """
+        loop = asyncio.get_running_loop()
+        if self._async_loop is None:
+            redis = self.redis
+            if not hasattr(redis, 'client'):
+                return None
+            alias_settings = settings.CACHES[self._alias_in_use]
+            location = alias_settings['LOCATION']
+            options = alias_settings.get('OPTIONS', {})
+            self._async_client = aioredis.from_url(
+                location[0] if isinstance(location, (list, tuple)) else location,
+                password=options.get('PASSWORD'),
+                socket_timeout=options.get('SOCKET_TIMEOUT'),
+                socket_connect_timeout=options.get('SOCKET_CONNECT_TIMEOUT'),
+                max_connections=options.get('CONNECTION_POOL_KWARGS', {}).get('max_connections'),
+            )
+            self._async_loop = loop
+
+        return self._async_client if self._async_loop is loop else None
+
+    async def _aredis_get_many(self, keys: list) -> Dict:
+        client = self._get_async_client()
+        if client is None:
+            return await self.redis.aget_many(keys)
+
+        redis = self.redis
+        values = await client.mget([redis.make_key(key) for key in keys])
+        return {key: redis.client.decode(value) for key, value in zip(keys, values) if value is not None}
+
+    async def aget_many(self, keys: Iterable[str]) -> Dict:
+        """Async get_many: the local tier, then one non-blocking Redis MGET."""
+        found = {}
+        remote_keys = []
+        for key in keys:
+            value = self.local.get(key)
+            if value is not None:
+                found[key] = value
+            else:
+                remote_keys.append(key)
+
+        if remote_keys:
+            remote = await self._aredis_get_many(remote_keys)
+            self.redis_hits += len(remote)
+            self.redis_misses += len(remote_keys) - len(remote)
+            for key, value in remote.items():
+                self.local.set(key, value, self.local_ttl)
+            found.update(remote)
+
+        return found
+
+    async def aget_fresh(self, key: str):
+        """
+        Async read for the hot path of get_or_compute.
+
+        Returns:
+            The cached value, or None on a miss or when this caller drew an
+            early refresh; the caller then falls back to get_or_compute
+            (in a thread), which handles locking and recomputation.
+        """
+        found = await self.aget_many([key, f"{key}{self.META_SUFFIX}"])
+        value = found.get(key)
+        if value is None or self._should_refresh_early(found.get(f"{key}{self.META_SUFFIX}")):
+            return None
+        return value
+
+    async def aget_generations(self, keys: Iterable[str]) -> Dict[str, str]:
+        """Async get_generations."""
+        found = {}
+        remote_keys = []
+        for key in keys:
+            value = self.generations.get(key)
+            if value is not None:
+                found[key] = value
+            else:
+                remote_keys.append(key)
+
+        if remote_keys:
+            remote = await self._aredis_get_many(remote_keys)
+            for key in remote_keys:
+                found[key] = str(remote.get(key, 0))
+                self.generations.set(key, found[key], self.generation_ttl)
+
+        return found
+
+    def clear_local(self) -> None:
+        """Drop the in-process tier (Redis is left untouched)."""
+        self.local.clear()
+        self.generations.clear()
+
+    def stats(self) -> Dict:
+        """
+        Hit/miss counters per tier for this process.
+
+        Returns:
+            dict: 'local' and 'redis' tier statistics
+        """
+        return {
+            'local': {
+                'hits': self.local.hits,
+                'misses': self.local.misses,
+                'items': len(self.local),
+                'size_bytes': self.local.current_bytes,
+                'max_bytes': self.local.max_bytes,
+            },
+            'redis': {
+                'alias': self.alias,
+                'hits': self.redis_hits,
+                'misses': self.redis_misses,
+            },
+            'single_flight': {
+                'computes': self.computes,
+                'early_refreshes': self.early_refreshes,
+                'lock_waits': self.lock_waits,
+            },
+        }
+
+
+# Shared instance for rendered image bytes
+image_cache = TieredImageCache(
+    alias=getattr(settings, 'IMAGE_CACHE_ALIAS', 'images'),
+    local_max_bytes=getattr(settings, 'IMAGE_LOCAL_CACHE_BYTES', 64 * 1024 * 1024),
+    local_ttl=getattr(settings, 'IMAGE_LOCAL_CACHE_TTL', 300),
+    lock_timeout=getattr(settings, 'IMAGE_CACHE_LOCK_TIMEOUT', 30),
+    lock_wait=getattr(settings, 'IMAGE_CACHE_LOCK_WAIT', 5),
+    early_refresh_beta=getattr(settings, 'IMAGE_CACHE_EARLY_REFRESH_BETA', 1.0),
+    generation_ttl=getattr(settings, 'IMAGE_CACHE_GENERATION_TTL', 1),
+)
@@ -0,0 +1,237 @@
+"""
+Deep-zoom tile pyramid for large images.
+Provides:
+- Deep Zoom (DZI) geometry: pyramid levels, tile grid and overlap
+- Lazy generation of individual WebP tiles
+- Per-worker LRU of decoded pyramid levels (byte-budget eviction)
+- Two-tier (process/Redis) caching of tiles, single-flight on misses
+
+Large DX/CR radiographs (and pathology-sized images) exceed PREVIEW_SIZE by
+far. Tiled viewers such as OpenSeadragon request only the tiles covering
+their viewport at the zoom level they display, instead of choosing between
+a blurry preview and a full download.
+"""
+import io
+import json
+import logging
+from typing import Tuple
+
+from PIL import Image
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from .cache_metrics import cache_metrics
+from .image_cache_service import ImageCacheService
+from .tiered_cache import ByteBudgetLRU, image_cache as cache
+
+logger = logging.getLogger(__name__)
+
+
+class TileNotFound(Exception):
+    """Raised for a level or tile position outside an image's pyramid."""
+
+
+class DeepZoomTileService:
+    """Service for serving images as Deep Zoom tile pyramids."""
+
+    # Cache key prefixes
+    TILE_PREFIX = "img_tile"
+    DIMENSIONS_PREFIX = "img_dims"
+
+    # Pyramid layout (Deep Zoom defaults)
+    TILE_SIZE = 256
+    OVERLAP = 1
+    FORMAT = 'webp'
+    CONTENT_TYPE = 'image/webp'
+    WEBP_QUALITY = 80
+
+    # Cache TTLs (in seconds)
+    TILE_TTL = 86400  # 24 hours
+    DIMENSIONS_TTL = 86400
+
+    # Decoded pyramid levels, per worker process
+    level_cache = ByteBudgetLRU(
+        getattr(settings, 'TILE_LEVEL_CACHE_BYTES', 256 * 1024 * 1024),
+        sizeof=lambda image: image.width * image.height * len(image.getbands())
+    )
+
+    @staticmethod
+    def max_level(width: int, height: int) -> int:
+        """Index of the full-resolution level: ceil(log2(longest edge))."""
+        return (max(width, height, 1) - 1).bit_length()
+
+    @classmethod
+    def level_size(cls, width: int, height: int, level: int) -> Tuple[int, int]:
+        """
+        Size of a pyramid level; each level halves the next (rounding up).
+
+        Args:
+            width: Full-resolution width
+            height: Full-resolution height
+            level: Level (0 is 1x1, max_level is full resolution)
+
+        Returns:
+            tuple: (width, height) of the level
+
+        Raises:
+            TileNotFound: If the level is outside the pyramid
+        """
+        top = cls.max_level(width, height)
+        if not 0 <= level <= top:
+            raise TileNotFound(f"Level {level} outside 0-{top}")
+        scale = 2 ** (top - level)
+        return -(-width // scale), -(-height // scale)
+
+    @classmethod
+    def tile_box(cls, level_width: int, level_height: int, x: int, y: int) -> Tuple[int, int, int, int]:
+        """
+        Pixel box of a tile within its level, including the overlap with
+        its neighbours.
+
+        Raises:
+            TileNotFound: If (x, y) is outside the level's tile grid
+        """
+        columns = -(-level_width // cls.TILE_SIZE)
+        rows = -(-level_height // cls.TILE_SIZE)
+        if not (0 <= x < columns and 0 <= y < rows):
+            raise TileNotFound(f"Tile {x}_{y} outside {columns}x{rows} grid")
+
+        left = x * cls.TILE_SIZE - (cls.OVERLAP if x else 0)
+        top = y * cls.TILE_SIZE - (cls.OVERLAP if y else 0)
+        right = min(level_width, (x + 1) * cls.TILE_SIZE + cls.OVERLAP)
+        bottom = min(level_height, (y + 1) * cls.TILE_SIZE + cls.OVERLAP)
+        return left, top, right, bottom
+
+    @classmethod
+    def dimensions(cls, file_path: str, namespace: str = '') -> Tuple[int, int]:
+        """
+        Full-resolution size of an image, read from its header once and cached.
+
+        Args:
+            file_path: Path to the image
+            namespace: Cache namespace from ImageCacheService.cache_namespace()
+
+        Returns:
+            tuple: (width, height)
+        """
+        key = ImageCacheService._generate_cache_key(cls.DIMENSIONS_PREFIX, file_path, 'dims', namespace)
+
+        def load() -> bytes:
+            with default_storage.open(file_path, 'rb') as f:
+                # Only the header is parsed
+                return json.dumps(Image.open(f).size).encode()
+
+        width, height = json.loads(cache.get_or_compute(key, load, cls.DIMENSIONS_TTL))
+        return width, height
+
+    @classmethod
+    def descriptor(cls, file_path: str, tiles_url: str, namespace: str = '') -> dict:
+        """
+        Deep Zoom descriptor (DZI, JSON form) of an image.
+
+        Args:
+            file_path: Path to the image
+            tiles_url: URL tiles are served under ('{tiles_url}{level}/{x}_{y}.webp')
+            namespace: Cache namespace
+
+        Returns:
+            dict: DZI 'Image' descriptor
+        """
+        width, height = cls.dimensions(file_path, namespace)
+        return {
+            'Image': {
+                'xmlns': 'http://schemas.microsoft.com/deepzoom/2008',
+                'Url': tiles_url,
+                'Format': cls.FORMAT,
+                'Overlap': str(cls.OVERLAP),
+                'TileSize': str(cls.TILE_SIZE),
+                'Size': {'Width': str(width), 'Height': str(height)},
+            }
+        }
+
+    @classmethod
+    def _level_image(cls, file_path: str, level: int, size: Tuple[int, int], namespace: str) -> Image.Image:
+        """
+        Decoded pixels of one pyramid level, using the per-worker LRU.
+
+        JPEG sources are decoded directly at a reduced scale (DCT scaling)
+        where the level allows, then resized to the exact level size.
+        """
+        cache_key = (file_path, namespace, level)
+        cached = cls.level_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        with default_storage.open(file_path, 'rb') as f:
+            data = f.read()
+
+        image = Image.open(io.BytesIO(data))
+        image.draft(image.mode, size)
+        image = ImageCacheService._prepare_mode(image)
+        if image.size != size:
+            image = image.resize(size, Image.Resampling.LANCZOS)
+        else:
+            image.load()
+
+        cls.level_cache.set(cache_key, image)
+        return image
+
+    @classmethod
+    def _render_tile(cls, file_path: str, level: int, x: int, y: int, namespace: str) -> bytes:
+        width, height = cls.dimensions(file_path, namespace)
+        size = cls.level_size(width, height, level)
+        box = cls.tile_box(*size, x, y)
+
+        with cache_metrics.timed('tile', 'generation'):
+            tile = cls._level_image(file_path, level, size, namespace).crop(box)
+            return ImageCacheService._image_to_bytes(tile, 'WEBP', cls.WEBP_QUALITY)
+
+    @classmethod
+    def _tile_key(cls, file_path: str, level: int, x: int, y: int, namespace: str) -> str:
+        return ImageCacheService._generate_cache_key(cls.TILE_PREFIX, file_path, f'{level}/{x}_{y}', namespace)
+
+    @classmethod
+    def get_tile(cls, file_path: str, level: int, x: int, y: int, namespace: str = '') -> bytes:
+        """
+        Get one tile, generating it on a cache miss (single-flight).
+
+        Args:
+            file_path: Path to the image
+            level: Pyramid level
+            x: Tile column
+            y: Tile row
+            namespace: Cache namespace from ImageCacheService.cache_namespace()
+
+        Returns:
+            bytes: WebP tile
+
+        Raises:
+            TileNotFound: If the level or tile is outside the pyramid
+        """
+        # Validate before the single-flight lock so bad requests fail fast
+        width, height = cls.dimensions(file_path, namespace)
+        cls.tile_box(*cls.level_size(width, height, level), x, y)
+
+        missed = []
+
+        def load() -> bytes:
+            missed.append(True)
+            return cls._render_tile(file_path, level, x, y, namespace)
+
+        data = cache.get_or_compute(cls._tile_key(file_path, level, x, y, namespace), load, cls.TILE_TTL)
+        cache_metrics.lookup('tile', hit=not missed, value=data)
+        return data
+
+    @classmethod
+    async def aget_tile(cls, file_path: str, level: int, x: int, y: int, namespace: str = '') -> bytes:
+        """
+        Async get_tile: hits are one non-blocking cache read, misses are
+        generated in the image pool.
+        """
+        cached = await cache.aget_fresh(cls._tile_key(file_path, level, x, y, namespace))
+        if cached:
+            # Local counters only (flushed by a background thread): safe on the event loop
+            cache_metrics.lookup('tile', hit=True, value=cached)
+            return cached
+
+        return await ImageCacheService.run_blocking(cls.get_tile, file_path, level, x, y, namespace)
@@ -0,0 +1,207 @@
+"""
+Upload staging service for DICOM series uploads.
+Provides:
+- Chunked streaming of uploaded files into a staging area in default_storage
+- SHA-256 checksums and sizes computed while streaming
+- Verified reads of staged files from Celery workers
+- Cleanup of staged files once a study has been ingested
+
+Staging keeps raw file bytes out of the Celery message: the task only receives
+storage keys, sizes and checksums, so broker memory stays flat no matter how
+large the series is.
+"""
+import hashlib
+import logging
+import mmap
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterable
+
+from django.core.files.storage import default_storage
+from django.utils.text import get_valid_filename
+
+logger = logging.getLogger(__name__)
+
+
+class StagedFileError(Exception):
+    """Raised when a staged file is missing or fails its integrity check."""
+
+
+class UploadStagingService:
+    """Service for staging uploaded files in storage before async processing."""
+
+    # Storage prefix for staged uploads
+    STAGING_PREFIX = "upload_staging"
+
+    # Streaming chunk size (1 MB)
+    CHUNK_SIZE = 1024 * 1024
+
+    @staticmethod
+    def new_batch_id() -> str:
+        """
+        Generate a unique identifier for one upload request.
+
+        Returns:
+            str: Batch identifier used to group staged files
+        """
+        return uuid.uuid4().hex
+
+    @classmethod
+    def _staging_key(cls, study_id: int, batch_id: str, filename: str) -> str:
+        """
+        Build the storage key for a staged file.
+
+        Args:
+            study_id: ID of the imaging study
+            batch_id: Upload batch identifier
+            filename: Original filename
+
+        Returns:
+            str: Storage key inside the staging area
+        """
+        safe_name = get_valid_filename(filename) or 'upload'
+        return f"{cls.STAGING_PREFIX}/{study_id}/{batch_id}/{uuid.uuid4().hex[:8]}_{safe_name}"
+
+    @classmethod
+    def stage_file(cls, uploaded_file, study_id: int, batch_id: str) -> Dict:
+        """
+        Stream an uploaded file into the staging area.
+
+        The file is read in chunks to compute its size and checksum, then
+        handed to the storage backend, which streams it again from Django's
+        upload handler (memory or temp file) without building a bytes copy.
+
+        Args:
+            uploaded_file: Django UploadedFile from request.FILES
+            study_id: ID of the imaging study
+            batch_id: Upload batch identifier
+
+        Returns:
+            dict: 'storage_key', 'size' and 'sha256' of the staged file
+        """
+        hasher = hashlib.sha256()
+        size = 0
+
+        uploaded_file.seek(0)
+        for chunk in uploaded_file.chunks(cls.CHUNK_SIZE):
+            hasher.update(chunk)
+            size += len(chunk)
+        uploaded_file.seek(0)
+
+        storage_key = default_storage.save(
+            cls._staging_key(study_id, batch_id, uploaded_file.name),
+            uploaded_file
+        )
+
+        logger.debug(f"Staged upload {uploaded_file.name} as {storage_key} ({size} bytes)")
+        return {
+            'storage_key': storage_key,
+            'size': size,
+            'sha256': hasher.hexdigest(),
+        }
+
+    @classmethod
+    def read_staged_file(cls, storage_key: str, expected_size: int = None,
+                         expected_sha256: str = None) -> bytes:
+        """
+        Read a staged file and verify its integrity.
+
+        Args:
+            storage_key: Storage key returned by stage_file
+            expected_size: Size recorded at staging time (optional)
+            expected_sha256: Checksum recorded at staging time (optional)
+
+        Returns:
+            bytes: File content
+
+        Raises:
+            StagedFileError: If the file is missing or does not match
+        """
+        hasher = hashlib.sha256()
+        buffer = bytearray()
+
+        try:
+            with default_storage.open(storage_key, 'rb') as f:
+                for chunk in f.chunks(cls.CHUNK_SIZE):
+                    hasher.update(chunk)
+                    buffer.extend(chunk)
+        except (FileNotFoundError, OSError) as e:
+            raise StagedFileError(f"Staged file {storage_key} could not be read: {str(e)}")
+
+        if expected_size is not None and len(buffer) != expected_size:
+            raise StagedFileError(
+                f"Staged file {storage_key} size mismatch: expected {expected_size}, got {len(buffer)}"
+            )
+
+        if expected_sha256 and hasher.hexdigest() != expected_sha256:
+            raise StagedFileError(f"Staged file {storage_key} checksum mismatch")
+
+        return bytes(buffer)
+
+    @classmethod
+    @contextmanager
+    def open_staged_buffer(cls, storage_key: str, expected_size: int = None,
+                           expected_sha256: str = None):
+        """
+        Open a staged file as a verified read-only buffer.
+
+        On local storage the file is memory-mapped, so it is checksummed and
+        parsed in place without being copied into the worker's heap. Remote
+        storage (S3) falls back to read_staged_file.
+
+        Args:
+            storage_key: Storage key returned by stage_file
+            expected_size: Size recorded at staging time (optional)
+            expected_sha256: Checksum recorded at staging time (optional)
+
+        Yields:
+            mmap or bytes: File content
+
+        Raises:
+            StagedFileError: If the file is missing or does not match
+        """
+        try:
+            local_path = default_storage.path(storage_key)
+        except NotImplementedError:
+            local_path = None
+
+        if not local_path or not expected_size:
+            yield cls.read_staged_file(storage_key, expected_size, expected_sha256)
+            return
+
+        try:
+            f = open(local_path, 'rb')
+        except OSError as e:
+            raise StagedFileError(f"Staged file {storage_key} could not be read: {str(e)}")
+
+        with f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            if len(buffer) != expected_size:
+                raise StagedFileError(
+                    f"Staged file {storage_key} size mismatch: expected {expected_size}, got {len(buffer)}"
+                )
+            if expected_sha256 and hashlib.sha256(buffer).hexdigest() != expected_sha256:
+                raise StagedFileError(f"Staged file {storage_key} checksum mismatch")
+
+            yield buffer
+
+    @staticmethod
+    def delete_staged_files(storage_keys: Iterable[str]) -> int:
+        """
+        Delete staged files once they are no longer needed.
+        Failures are logged, never raised, so cleanup cannot fail a task.
+
+        Args:
+            storage_keys: Storage keys to delete
+
+        Returns:
+            int: Number of files deleted
+        """
+        deleted = 0
+        for storage_key in storage_keys:
+            try:
+                default_storage.delete(storage_key)
+                deleted += 1
+            except Exception as e:
+                logger.warning(f"Could not delete staged file {storage_key}: {str(e)}")
+
+        return deleted
@@ -19,10 +19,15 @@ from .image_views import (
     serve_thumbnail,
     serve_preview,
     serve_webp,
+    serve_rendition,
     serve_full_image,
+    serve_render,
+    tile_descriptor,
+    serve_tile,
     image_metadata,
     invalidate_cache,
     cache_statistics,
+    image_cache_metrics,
 )
 from .health_views import health_check, liveness_probe, readiness_probe
 
@@ -57,8 +62,13 @@ urlpatterns = [
     path('images/<int:image_id>/thumbnail/', serve_thumbnail, name='image-thumbnail'),
     path('images/<int:image_id>/preview/', serve_preview, name='image-preview'),
     path('images/<int:image_id>/webp/', serve_webp, name='image-webp'),
+    path('images/<int:image_id>/rendition/', serve_rendition, name='image-rendition'),
     path('images/<int:image_id>/full/', serve_full_image, name='image-full'),
+    path('images/<int:image_id>/render/', serve_render, name='image-render'),
+    path('images/<int:image_id>/tiles/', tile_descriptor, name='image-tiles'),
+    path('images/<int:image_id>/tiles/<int:level>/<int:x>_<int:y>.webp', serve_tile, name='image-tile'),
     path('images/<int:image_id>/metadata/', image_metadata, name='image-metadata'),
     path('images/<int:image_id>/invalidate-cache/', invalidate_cache, name='invalidate-cache'),
     path('images/cache-stats/', cache_statistics, name='cache-statistics'),
+    path('metrics/', image_cache_metrics, name='image-cache-metrics'),
 ]
@@ -1,3 +1,6 @@
+import uuid
+from urllib.parse import urlencode
+
 from django.shortcuts import render
 
 # Create your views here.
@@ -5,6 +8,8 @@ from rest_framework import viewsets, permissions, filters, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django_filters.rest_framework import DjangoFilterBackend
+from django.conf import settings
+from django.http import HttpResponse
 from django.utils import timezone
 from django.db.models import Count, Q, Max
 from drf_spectacular.utils import extend_schema, extend_schema_view, OpenApiParameter, OpenApiExample
@@ -12,6 +17,13 @@ from drf_spectacular.types import OpenApiTypes
 
 from .models import Hospital, Patient, ImagingStudy, DicomImage, Diagnosis, AuditLog, ContactMessage, TaskStatus
 from .throttling import UploadRateThrottle
+from .pagination import KeysetPagination
+from .upload_staging_service import UploadStagingService
+from .image_cache_service import ImageCacheService
+from .querysets import (
+    SparseQuerysetMixin, HOSPITAL_ANNOTATIONS, PATIENT_DETAIL_ANNOTATIONS, STUDY_LIST_ANNOTATIONS,
+    diagnosis_prefetch, recent_studies_prefetch, study_images_prefetch,
+)
 from .serializers import (
     HospitalSerializer,
     PatientListSerializer,
@@ -27,6 +39,16 @@ from .serializers import (
 )
 
 
+# ?fields= / ?expand= on list and detail responses (SparseFieldsetMixin)
+SPARSE_FIELDSET_PARAMETERS = [
+    OpenApiParameter('fields', OpenApiTypes.STR, description='Comma-separated fields to return (default: all)'),
+    OpenApiParameter('expand', OpenApiTypes.STR, description='Comma-separated optional fields to include (e.g. images, dicom_metadata)'),
+]
+
+# Maximum images per batched thumbnail request
+THUMBNAIL_BATCH_MAX_IMAGES = 500
+
+
 @extend_schema_view(
     list=extend_schema(
         tags=['Hospitals'],
@@ -35,6 +57,7 @@ from .serializers import (
         parameters=[
             OpenApiParameter('search', OpenApiTypes.STR, description='Search by hospital name or contact email'),
             OpenApiParameter('ordering', OpenApiTypes.STR, description='Order by: name, created_at, -name, -created_at'),
+            *SPARSE_FIELDSET_PARAMETERS,
         ]
     ),
     create=extend_schema(
@@ -45,7 +68,8 @@ from .serializers import (
     retrieve=extend_schema(
         tags=['Hospitals'],
         summary='Get hospital details',
-        description='Retrieve detailed information about a specific hospital including patient count.'
+        description='Retrieve detailed information about a specific hospital including patient count.',
+        parameters=SPARSE_FIELDSET_PARAMETERS
     ),
     update=extend_schema(
         tags=['Hospitals'],
@@ -63,7 +87,7 @@ from .serializers import (
         description='Remove a hospital from the system.'
     ),
 )
-class HospitalViewSet(viewsets.ModelViewSet):
+class HospitalViewSet(SparseQuerysetMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing hospitals and healthcare facilities.
 
@@ -75,6 +99,7 @@ class HospitalViewSet(viewsets.ModelViewSet):
     """
     queryset = Hospital.objects.all()
     serializer_class = HospitalSerializer
+    annotations = HOSPITAL_ANNOTATIONS
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [filters.SearchFilter, filters.OrderingFilter]
     search_fields = ['name', 'contact_email']
@@ -92,6 +117,7 @@ class HospitalViewSet(viewsets.ModelViewSet):
             OpenApiParameter('gender', OpenApiTypes.STR, description='Filter by gender (M/F/O)'),
             OpenApiParameter('search', OpenApiTypes.STR, description='Search by name, medical record number, or email'),
             OpenApiParameter('ordering', OpenApiTypes.STR, description='Order by: last_name, created_at, date_of_birth (prefix with - for descending)'),
+            *SPARSE_FIELDSET_PARAMETERS,
         ]
     ),
     create=extend_schema(
@@ -102,7 +128,8 @@ class HospitalViewSet(viewsets.ModelViewSet):
     retrieve=extend_schema(
         tags=['Patients'],
         summary='Get patient details',
-        description='Retrieve detailed information about a specific patient including all imaging studies.'
+        description='Retrieve detailed information about a specific patient including all imaging studies.',
+        parameters=SPARSE_FIELDSET_PARAMETERS
     ),
     update=extend_schema(
         tags=['Patients'],
@@ -120,7 +147,7 @@ class HospitalViewSet(viewsets.ModelViewSet):
         description='Remove a patient from the system.'
     ),
 )
-class PatientViewSet(viewsets.ModelViewSet):
+class PatientViewSet(SparseQuerysetMixin, viewsets.ModelViewSet):
     """
     ViewSet for managing patient records.
 
@@ -137,6 +164,8 @@ class PatientViewSet(viewsets.ModelViewSet):
     filterset_fields = ['hospital', 'gender']
     search_fields = ['first_name', 'last_name', 'medical_record_number', 'email']
     ordering_fields = ['last_name', 'created_at', 'date_of_birth']
+    annotations = PATIENT_DETAIL_ANNOTATIONS
+    field_prefetches = {'recent_studies': recent_studies_prefetch}
 
     def get_serializer_class(self):
         """Use Detailed serilizer for single patient view"""
@@ -156,7 +185,7 @@ class PatientViewSet(viewsets.ModelViewSet):
         Returns all imaging studies for a patient
         """
         patient = self.get_object()
-        studies = patient.imaging_studies.all()
+        studies = patient.imaging_studies.annotate(**STUDY_LIST_ANNOTATIONS)
         serializer = ImagingStudyListSerializer(studies, many=True)
         return Response(serializer.data)
 
@@ -211,7 +240,7 @@ class PatientViewSet(viewsets.ModelViewSet):
     list=extend_schema(
         tags=['Studies'],
         summary='List all imaging studies',
-        description='Retrieve a paginated list of imaging studies with filtering and search.',
+        description='Retrieve a cursor-paginated list of imaging studies with filtering and search.',
         parameters=[
             OpenApiParameter('patient', OpenApiTypes.INT, description='Filter by patient ID'),
             OpenApiParameter('modality', OpenApiTypes.STR, description='Filter by modality (CT, MRI, XRAY, US, PET, MAMMO)'),
@@ -219,6 +248,7 @@ class PatientViewSet(viewsets.ModelViewSet):
             OpenApiParameter('body_part', OpenApiTypes.STR, description='Filter by body part'),
             OpenApiParameter('search', OpenApiTypes.STR, description='Search by patient name, MRN, body part, or clinical notes'),
             OpenApiParameter('ordering', OpenApiTypes.STR, description='Order by: study_date, created_at (prefix with - for descending)'),
+            *SPARSE_FIELDSET_PARAMETERS,
         ]
     ),
     create=extend_schema(
@@ -229,7 +259,8 @@ class PatientViewSet(viewsets.ModelViewSet):
     retrieve=extend_schema(
         tags=['Studies'],
         summary='Get study details',
-        description='Retrieve detailed information about a specific study including images and diagnosis.'
+        description='Retrieve detailed information about a specific study including its diagnosis. Images are included with ?expand=images.',
+        parameters=SPARSE_FIELDSET_PARAMETERS
     ),
     update=extend_schema(
         tags=['Studies'],
@@ -247,7 +278,7 @@ class PatientViewSet(viewsets.ModelViewSet):
         description='Remove an imaging study from the system.'
     ),
 )
-class ImagingStudyViewSet(viewsets.ModelViewSet):
+class ImagingStudyViewSet(SparseQuerysetMixin, viewsets.ModelViewSet):
       """
       ViewSet for managing medical imaging studies.
 
@@ -259,15 +290,18 @@ class ImagingStudyViewSet(viewsets.ModelViewSet):
       - Image upload and management
       - Radiological diagnosis integration
       """
-      queryset = ImagingStudy.objects.select_related('patient',
-  'patient__hospital').prefetch_related('images', 'diagnosis').all()
+      queryset = ImagingStudy.objects.select_related('patient').all()
       permission_classes = [permissions.IsAuthenticated]
+      pagination_class = KeysetPagination
       filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
       filterset_fields = ['patient', 'modality', 'status', 'body_part']
       search_fields = ['patient__first_name', 'patient__last_name',
   'patient__medical_record_number', 'body_part', 'clinical_notes']
       ordering_fields = ['study_date', 'created_at']
-      ordering = ['-study_date']
+      ordering = ['-study_date', '-id']
+      sparse_actions = ('list', 'retrieve', 'pending')
+      annotations = STUDY_LIST_ANNOTATIONS
+      field_prefetches = {'images': study_images_prefetch, 'diagnosis': diagnosis_prefetch}
 
       def get_serializer_class(self):
           """Use detailed serializer for single study view"""
@@ -287,7 +321,7 @@ class ImagingStudyViewSet(viewsets.ModelViewSet):
           Custom endpoint: GET /api/studies/pending/
           Returns studies pending review
           """
-          pending_studies = self.queryset.filter(status='pending')
+          pending_studies = self.get_queryset().filter(status='pending')
           serializer = self.get_serializer(pending_studies, many=True)
           return Response(serializer.data)
 
@@ -344,6 +378,116 @@ class ImagingStudyViewSet(viewsets.ModelViewSet):
           print(f"Diagnosis validation errors: {serializer.errors}")
           return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+      @extend_schema(
+          tags=['Images'],
+          summary='Get all thumbnails of a study',
+          description='Fetch the thumbnails of a study in one request: a tile manifest, the sprite sheet it refers to, or a multipart bundle of individual thumbnails.',
+          parameters=[
+              OpenApiParameter('bundle', OpenApiTypes.STR, description='manifest (default), sprite or multipart'),
+              OpenApiParameter('offset', OpenApiTypes.INT, description='Skip this many images (ordered by instance number)'),
+              OpenApiParameter('limit', OpenApiTypes.INT, description=f'Maximum images (default and max {THUMBNAIL_BATCH_MAX_IMAGES})'),
+          ],
+          responses={200: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT, 404: OpenApiTypes.OBJECT}
+      )
+      @action(detail=True, methods=['get'])
+      def thumbnails(self, request, pk=None):
+          """
+          Custom endpoint: GET /api/studies/{id}/thumbnails/
+          Batched thumbnails for study grids - replaces one request per slice
+
+          ?bundle=manifest  JSON tile offsets into the sprite (plus its URL)
+          ?bundle=sprite    The sprite sheet (JPEG)
+          ?bundle=multipart multipart/mixed with one image/jpeg part per image
+          """
+          bundle = request.query_params.get('bundle', 'manifest')
+          if bundle not in ('manifest', 'sprite', 'multipart'):
+              return Response(
+                  {'error': 'bundle must be one of: manifest, sprite, multipart'},
+                  status=status.HTTP_400_BAD_REQUEST
+              )
+
+          try:
+              offset = max(0, int(request.query_params.get('offset', 0)))
+              limit = min(THUMBNAIL_BATCH_MAX_IMAGES, max(1, int(request.query_params.get('limit', THUMBNAIL_BATCH_MAX_IMAGES))))
+          except ValueError:
+              return Response(
+                  {'error': 'offset and limit must be integers'},
+                  status=status.HTTP_400_BAD_REQUEST
+              )
+
+          # One query for every image in the page
+          images = list(
+              DicomImage.objects.filter(study_id=pk)
+              .order_by('instance_number')
+              .values_list(
+                  'id', 'instance_number', 'image_file', 'image_sha256',
+                  'study__patient__hospital_id', 'study__processing_version'
+              )[offset:offset + limit]
+          )
+          if not images and not ImagingStudy.objects.filter(pk=pk).exists():
+              return Response({'error': 'Study not found'}, status=status.HTTP_404_NOT_FOUND)
+
+          max_workers = getattr(settings, 'THUMBNAIL_BATCH_WORKERS', 8)
+
+          # Version/hospital/study generations are read once for the whole page
+          namespaces = {}
+          if images:
+              hospital_id, processing_version = images[0][4:]
+              scope = ImageCacheService.scope_namespace(int(pk), hospital_id, processing_version)
+              namespaces = {
+                  path: ImageCacheService.content_namespace(scope, sha256)
+                  for _, _, path, sha256, _, _ in images
+              }
+
+          if bundle == 'multipart':
+              thumbnails = ImageCacheService.get_thumbnails(
+                  [path for _, _, path, *_ in images], max_workers, namespaces
+              )
+              boundary = uuid.uuid4().hex
+              parts = []
+              for image_id, instance_number, path, *_ in images:
+                  if path not in thumbnails:
+                      continue
+                  parts.append(
+                      f'--{boundary}\r\n'
+                      f'Content-Type: image/jpeg\r\n'
+                      f'Content-ID: <image-{image_id}>\r\n'
+                      f'X-Image-Id: {image_id}\r\n'
+                      f'X-Instance-Number: {instance_number}\r\n'
+                      f'Content-Length: {len(thumbnails[path])}\r\n\r\n'.encode()
+                      + thumbnails[path] + b'\r\n'
+                  )
+              parts.append(f'--{boundary}--\r\n'.encode())
+
+              response = HttpResponse(b''.join(parts), content_type=f'multipart/mixed; boundary={boundary}')
+              response['Cache-Control'] = 'public, max-age=86400'
+              return response
+
+          sprite, tiles = ImageCacheService.get_sprite(
+              [(image_id, path) for image_id, _, path, *_ in images], max_workers, namespaces
+          )
+
+          if bundle == 'sprite':
+              response = HttpResponse(sprite, content_type='image/jpeg')
+              response['Content-Disposition'] = f'inline; filename="study_{pk}_thumbnails.jpg"'
+              response['Cache-Control'] = 'public, max-age=86400'  # Cache for 24 hours
+              return response
+
+          instance_numbers = {image_id: instance_number for image_id, instance_number, *_ in images}
+          for tile in tiles:
+              tile['instance_number'] = instance_numbers[tile['id']]
+
+          sprite_params = urlencode({'bundle': 'sprite', 'offset': offset, 'limit': limit})
+          return Response({
+              'study_id': int(pk),
+              'count': len(tiles),
+              'offset': offset,
+              'limit': limit,
+              'cell_size': list(ImageCacheService.THUMBNAIL_SIZE),
+              'sprite_url': f"{request.path}?{sprite_params}",
+              'tiles': tiles,
+          })
+
       @extend_schema(
           tags=['Images'],
           summary='Upload images to study',
@@ -407,17 +551,23 @@ class ImagingStudyViewSet(viewsets.ModelViewSet):
           max_instance = max_instance_result['instance_number__max'] or 0
 
           # Prepare file data for Celery task
+          staging_enabled = getattr(settings, 'UPLOAD_STAGING_ENABLED', True)
+          batch_id = UploadStagingService.new_batch_id()
           file_data_list = []
           for idx, file in enumerate(files, start=max_instance + 1):
-              # Read file content into memory
-              file.seek(0)
-              content = file.read()
-
-              file_data_list.append({
+              if staging_enabled:
+                  # Stream to staging storage - the task only gets the key and checksum
+                  file_data = UploadStagingService.stage_file(file, study.id, batch_id)
+              else:
+                  # Legacy inline mode: read file content into the message
+                  file.seek(0)
+                  file_data = {'content': file.read()}
+
+              file_data.update({
                   'filename': file.name,
-                  'content': content,
                   'instance_number': idx,
               })
+              file_data_list.append(file_data)
 
           # Dispatch async task
           user_id = request.user.id if request.user.is_authenticated else None
@@ -439,6 +589,7 @@ class ImagingStudyViewSet(viewsets.ModelViewSet):
         parameters=[
             OpenApiParameter('study', OpenApiTypes.INT, description='Filter by study ID'),
             OpenApiParameter('ordering', OpenApiTypes.STR, description='Order by: instance_number, uploaded_at (prefix with - for descending)'),
+            *SPARSE_FIELDSET_PARAMETERS,
         ]
     ),
     create=extend_schema(
@@ -449,7 +600,8 @@ class ImagingStudyViewSet(viewsets.ModelViewSet):
     retrieve=extend_schema(
         tags=['Images'],
         summary='Get image details',
-        description='Retrieve detailed information about a specific medical image including DICOM metadata if available.'
+        description='Retrieve detailed information about a specific medical image. The full DICOM tags are included with ?expand=dicom_metadata.',
+        parameters=SPARSE_FIELDSET_PARAMETERS
     ),
     update=extend_schema(
         tags=['Images'],
@@ -467,12 +619,14 @@ class ImagingStudyViewSet(viewsets.ModelViewSet):
         description='Remove an image from the system.'
     ),
 )
-class DicomImageViewSet(viewsets.ModelViewSet):
+class DicomImageViewSet(SparseQuerysetMixin, viewsets.ModelViewSet):
       """
       ViewSet for managing medical images.
 
       Supports both DICOM and standard image formats including:
       - DICOM file parsing with automatic metadata extraction
+      - Full DICOM tags on demand (?expand=dicom_metadata or /dicom-tags/)
+      - Sparse fieldsets (?fields=)
       - SOP Instance UID tracking for DICOM compliance
       - Progressive image loading (thumbnails and full resolution)
       - Image metadata including window/level, slice location
@@ -481,10 +635,11 @@ class DicomImageViewSet(viewsets.ModelViewSet):
       queryset = DicomImage.objects.select_related('study', 'study__patient').all()
       serializer_class = DicomImageSerializer
       permission_classes = [permissions.IsAuthenticated]
+      pagination_class = KeysetPagination
       filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
       filterset_fields = ['study']
       ordering_fields = ['instance_number', 'uploaded_at']
-      ordering = ['instance_number']
+      ordering = ['study_id', 'instance_number', 'id']
 
       def perform_create(self, serializer):
           """Automatically calculate file size when uploading"""
@@ -493,6 +648,28 @@ class DicomImageViewSet(viewsets.ModelViewSet):
               instance.file_size_bytes = instance.image_file.size
               instance.save()
 
+      @extend_schema(
+          tags=['Images'],
+          summary='Get all DICOM tags of an image',
+          description='Full DICOM tag dump of an image, loaded on demand. Image lists and study details leave it out.',
+          responses={200: OpenApiTypes.OBJECT, 404: OpenApiTypes.OBJECT}
+      )
+      @action(detail=True, methods=['get'], url_path='dicom-tags')
+      def dicom_tags(self, request, pk=None):
+          """
+          Custom endpoint: GET /api/images/{id}/dicom-tags/
+          Reads only the tag column of one image
+          """
+          tags = (
+              DicomImage.objects.filter(pk=pk)
+              .values('id', 'sop_instance_uid', 'is_dicom', 'dicom_metadata')
+              .first()
+          )
+          if tags is None:
+              return Response({'error': 'Image not found'}, status=status.HTTP_404_NOT_FOUND)
+
+          return Response(tags)
+
 
 @extend_schema_view(
     list=extend_schema(
@@ -504,6 +681,7 @@ class DicomImageViewSet(viewsets.ModelViewSet):
             OpenApiParameter('radiologist', OpenApiTypes.INT, description='Filter by radiologist user ID'),
             OpenApiParameter('search', OpenApiTypes.STR, description='Search by findings, impression, or recommendations'),
             OpenApiParameter('ordering', OpenApiTypes.STR, description='Order by: diagnosed_at, severity (prefix with - for descending)'),
+            *SPARSE_FIELDSET_PARAMETERS,
         ]
     ),
     create=extend_schema(
@@ -514,7 +692,8 @@ class DicomImageViewSet(viewsets.ModelViewSet):
     retrieve=extend_schema(
         tags=['Diagnoses'],
         summary='Get diagnosis details',
-        description='Retrieve detailed information about a specific diagnosis.'
+        description='Retrieve detailed information about a specific diagnosis.',
+        parameters=SPARSE_FIELDSET_PARAMETERS
     ),
     update=extend_schema(
         tags=['Diagnoses'],
@@ -532,7 +711,7 @@ class DicomImageViewSet(viewsets.ModelViewSet):
         description='Remove a diagnosis from the system.'
     ),
 )
-class DiagnosisViewSet(viewsets.ModelViewSet):
+class DiagnosisViewSet(SparseQuerysetMixin, viewsets.ModelViewSet):
       """
       ViewSet for managing radiological diagnoses.
 
@@ -569,17 +748,21 @@ class DiagnosisViewSet(viewsets.ModelViewSet):
             OpenApiParameter('user', OpenApiTypes.INT, description='Filter by user ID'),
             OpenApiParameter('action', OpenApiTypes.STR, description='Filter by action type'),
             OpenApiParameter('resource_type', OpenApiTypes.STR, description='Filter by resource type'),
+            OpenApiParameter('tenant_id', OpenApiTypes.INT, description='Filter by tenant (hospital) ID'),
+            OpenApiParameter('actor_type', OpenApiTypes.STR, description='Filter by actor type (user, system, api)'),
             OpenApiParameter('search', OpenApiTypes.STR, description='Search by resource type or IP address'),
             OpenApiParameter('ordering', OpenApiTypes.STR, description='Order by: timestamp (prefix with - for descending)'),
+            *SPARSE_FIELDSET_PARAMETERS,
         ]
     ),
     retrieve=extend_schema(
         tags=['Audit'],
         summary='Get audit log details',
-        description='Retrieve detailed information about a specific audit log entry.'
+        description='Retrieve detailed information about a specific audit log entry.',
+        parameters=SPARSE_FIELDSET_PARAMETERS
     ),
 )
-class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
+class AuditLogViewSet(SparseQuerysetMixin, viewsets.ReadOnlyModelViewSet):
       """
       Read-only ViewSet for audit logs.
 
@@ -592,11 +775,12 @@ class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
       queryset = AuditLog.objects.select_related('user').all()
       serializer_class = AuditLogSerializer
       permission_classes = [permissions.IsAuthenticated]
+      pagination_class = KeysetPagination
       filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
-      filterset_fields = ['user', 'action', 'resource_type']
+      filterset_fields = ['user', 'action', 'resource_type', 'tenant_id', 'actor_type']
       search_fields = ['resource_type', 'ip_address']
       ordering_fields = ['timestamp']
-      ordering = ['-timestamp']
+      ordering = ['-timestamp', '-id']
 
 
 @extend_schema_view(
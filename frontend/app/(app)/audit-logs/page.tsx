@@ -15,7 +15,8 @@ import {
 import { Badge } from '@/components/ui/badge';
 import { Button } from '@/components/ui/button';
 import { Settings, Loader2 } from 'lucide-react';
-import { apiClient } from '@/lib/api';
+import { apiClient, CursorPaginatedResponse } from '@/lib/api';
+import { cursorFromLink } from '@/lib/utils';
 
 interface AuditLog {
   id: number;
@@ -35,6 +36,8 @@ export default function AuditLogsPage() {
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
   const [page, setPage] = useState(1);
+  const [cursor, setCursor] = useState<string | undefined>();
+  const [links, setLinks] = useState<{ next: string | null; previous: string | null }>({ next: null, previous: null });
 
   // Redirect non-admin users
   useEffect(() => {
@@ -50,8 +53,9 @@ export default function AuditLogsPage() {
     const fetchLogs = async () => {
       try {
         setIsLoading(true);
-        const response = await apiClient.get(`/audit-logs/?page=${page}`);
+        const response = await apiClient.get<CursorPaginatedResponse<AuditLog>>('/audit-logs/', { cursor });
         setLogs(response.results || []);
+        setLinks({ next: response.next, previous: response.previous });
       } catch (err: any) {
         setError(err.message || 'Failed to load audit logs');
       } finally {
@@ -60,7 +64,7 @@ export default function AuditLogsPage() {
     };
 
     fetchLogs();
-  }, [isAdmin, page]);
+  }, [isAdmin, cursor]);
 
   if (authLoading || (isLoading && logs.length === 0)) {
     return (
@@ -177,16 +181,22 @@ export default function AuditLogsPage() {
                   <Button
                     variant="outline"
                     size="sm"
-                    onClick={() => setPage((p) => Math.max(1, p - 1))}
-                    disabled={page === 1}
+                    onClick={() => {
+                      setCursor(cursorFromLink(links.previous));
+                      setPage((p) => Math.max(1, p - 1));
+                    }}
+                    disabled={!links.previous}
                   >
                     Previous
                   </Button>
                   <Button
                     variant="outline"
                     size="sm"
-                    onClick={() => setPage((p) => p + 1)}
-                    disabled={logs.length < 20}
+                    onClick={() => {
+                      setCursor(cursorFromLink(links.next));
+                      setPage((p) => p + 1);
+                    }}
+                    disabled={!links.next}
                   >
                     Next
                   </Button>
@@ -24,6 +24,9 @@ import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/com
 import { Badge } from '@/components/ui/badge';
 import { Loader2, Plus, Search } from 'lucide-react';
 
+// Columns rendered by the table
+const PATIENT_LIST_FIELDS = 'id,medical_record_number,full_name,date_of_birth,age,gender,hospital_name,phone,email';
+
 export default function PatientsPage() {
   const router = useRouter();
   const [search, setSearch] = useState('');
@@ -33,7 +36,8 @@ export default function PatientsPage() {
   const { data, isLoading, error } = usePatients({
     search,
     gender: gender === 'all' ? undefined : gender,
-    page
+    page,
+    fields: PATIENT_LIST_FIELDS
   });
 
   const handleRowClick = (patientId: number) => {
@@ -24,19 +24,25 @@ import {
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 import { Badge } from '@/components/ui/badge';
 import { Plus, Search } from 'lucide-react';
+import { cursorFromLink } from '@/lib/utils';
+
+// Columns rendered by the table
+const STUDY_LIST_FIELDS = 'id,patient_name,patient_mrn,modality,body_part,study_date,status,image_count';
 
 export default function StudiesPage() {
   const router = useRouter();
   const [search, setSearch] = useState('');
   const [modality, setModality] = useState<string>('all');
   const [status, setStatus] = useState<string>('all');
-  const [page, setPage] = useState(1);
+  const [cursor, setCursor] = useState<string | undefined>();
 
   const { data, isLoading, error } = useStudies({
     search,
     modality: modality === 'all' ? undefined : modality,
     status: status === 'all' ? undefined : status,
-    page
+    cursor,
+    count: 'estimate',
+    fields: STUDY_LIST_FIELDS
   });
 
   const handleRowClick = (studyId: number) => {
@@ -92,14 +98,14 @@ export default function StudiesPage() {
                   <Input
                     placeholder="Search by patient name, MRN, or body part..."
                     value={search}
-                    onChange={(e) => setSearch(e.target.value)}
+                    onChange={(e) => { setSearch(e.target.value); setCursor(undefined); }}
                     className="pl-10"
                   />
                 </div>
               </div>
 
               {/* Modality Filter */}
-              <Select value={modality} onValueChange={setModality}>
+              <Select value={modality} onValueChange={(value) => { setModality(value); setCursor(undefined); }}>
                 <SelectTrigger className="w-full md:w-48">
                   <SelectValue placeholder="All Modalities" />
                 </SelectTrigger>
@@ -114,7 +120,7 @@ export default function StudiesPage() {
               </Select>
 
               {/* Status Filter */}
-              <Select value={status} onValueChange={setStatus}>
+              <Select value={status} onValueChange={(value) => { setStatus(value); setCursor(undefined); }}>
                 <SelectTrigger className="w-full md:w-48">
                   <SelectValue placeholder="All Statuses" />
                 </SelectTrigger>
@@ -134,7 +140,7 @@ export default function StudiesPage() {
                     setSearch('');
                     setModality('all');
                     setStatus('all');
-                    setPage(1);
+                    setCursor(undefined);
                   }}
                 >
                   Clear Filters
@@ -220,22 +226,22 @@ export default function StudiesPage() {
         </Card>
 
         {/* Pagination */}
-        {data && data.count > 0 && (
+        {data && data.results.length > 0 && (
           <div className="flex items-center justify-between">
             <p className="text-sm text-muted-foreground">
-              Showing {((page - 1) * 20) + 1} to {Math.min(page * 20, data.count)} of {data.count} studies
+              {data.count !== undefined && <>{data.count_estimated ? 'About ' : ''}{data.count} studies</>}
             </p>
             <div className="flex gap-2">
               <Button
                 variant="outline"
-                onClick={() => setPage(p => Math.max(1, p - 1))}
+                onClick={() => setCursor(cursorFromLink(data.previous))}
                 disabled={!data.previous}
               >
                 Previous
               </Button>
               <Button
                 variant="outline"
-                onClick={() => setPage(p => p + 1)}
+                onClick={() => setCursor(cursorFromLink(data.next))}
                 disabled={!data.next}
               >
                 Next
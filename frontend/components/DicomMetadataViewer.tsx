@@ -1,4 +1,7 @@
+import { useEffect, useState } from 'react';
 import { DicomImage } from '@/lib/api/types';
+import { studyService } from '@/lib/api/services/studyService';
+import { Button } from '@/components/ui/button';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 import { Badge } from '@/components/ui/badge';
 import { Tabs, TabsContent, TabsList, TabsTrigger } from '@/components/ui/tabs';
@@ -8,6 +11,24 @@ interface DicomMetadataViewerProps {
 }
 
 export default function DicomMetadataViewer({ image }: DicomMetadataViewerProps) {
+  // Image lists leave the full tag dump out; it is fetched on request
+  const [tags, setTags] = useState<any>(image.dicom_metadata);
+  const [tagsLoading, setTagsLoading] = useState(false);
+
+  useEffect(() => {
+    setTags(image.dicom_metadata);
+  }, [image.id, image.dicom_metadata]);
+
+  const loadTags = async () => {
+    setTagsLoading(true);
+    try {
+      const response = await studyService.getDicomTags(image.id);
+      setTags(response.dicom_metadata);
+    } finally {
+      setTagsLoading(false);
+    }
+  };
+
   if (!image.is_dicom) {
     return (
       <Card>
@@ -132,16 +153,20 @@ export default function DicomMetadataViewer({ image }: DicomMetadataViewerProps)
               />
             </div>
 
-            {image.dicom_metadata && (
-              <div className="mt-6">
-                <h4 className="text-sm font-semibold mb-2">Additional DICOM Tags</h4>
+            <div className="mt-6">
+              <h4 className="text-sm font-semibold mb-2">Additional DICOM Tags</h4>
+              {tags ? (
                 <div className="bg-muted p-4 rounded-md max-h-64 overflow-y-auto">
                   <pre className="text-xs">
-                    {JSON.stringify(image.dicom_metadata, null, 2)}
+                    {JSON.stringify(tags, null, 2)}
                   </pre>
                 </div>
-              </div>
-            )}
+              ) : (
+                <Button variant="outline" size="sm" onClick={loadTags} disabled={tagsLoading}>
+                  {tagsLoading ? 'Loading...' : 'Load all DICOM tags'}
+                </Button>
+              )}
+            </div>
           </TabsContent>
         </Tabs>
       </CardContent>
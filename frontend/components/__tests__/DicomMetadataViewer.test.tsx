@@ -4,6 +4,11 @@ import userEvent from '@testing-library/user-event';
 import '@testing-library/jest-dom';
 import DicomMetadataViewer from '../DicomMetadataViewer';
 import { DicomImage } from '@/lib/api/types';
+import { studyService } from '@/lib/api/services/studyService';
+
+jest.mock('@/lib/api/services/studyService', () => ({
+  studyService: { getDicomTags: jest.fn() },
+}));
 
 describe('DicomMetadataViewer', () => {
   const mockDicomImage: DicomImage = {
@@ -258,6 +263,25 @@ describe('DicomMetadataViewer', () => {
       expect(screen.getByText('Additional DICOM Tags')).toBeInTheDocument();
     });
 
+    it('should load DICOM tags on demand when not included', async () => {
+      const user = userEvent.setup();
+      (studyService.getDicomTags as jest.Mock).mockResolvedValue({
+        id: 1,
+        sop_instance_uid: '1.2.3.4.5.6.7.8.9',
+        is_dicom: true,
+        dicom_metadata: { patient: { name: 'Jane Roe' } },
+      });
+      render(<DicomMetadataViewer image={{ ...mockDicomImage, dicom_metadata: undefined }} />);
+
+      await user.click(screen.getByRole('tab', { name: /Equipment/i }));
+      await user.click(screen.getByRole('button', { name: /Load all DICOM tags/i }));
+
+      expect(studyService.getDicomTags).toHaveBeenCalledWith(1);
+      expect(await screen.findByText((content, element) => {
+        return element?.tagName.toLowerCase() === 'pre' && content.includes('Jane Roe');
+      })).toBeInTheDocument();
+    });
+
     it('should render DICOM metadata as JSON', async () => {
       const user = userEvent.setup();
       render(<DicomMetadataViewer image={mockDicomImage} />);
@@ -2,7 +2,8 @@ import { apiClient } from '../client';
 import {
   ImagingStudy,
   ImagingStudyDetail,
-  PaginatedResponse,
+  DicomTags,
+  CursorPaginatedResponse,
   StudyQueryParams,
   StudyStatistics,
   UploadResponse,
@@ -13,7 +14,7 @@ export const studyService = {
   /**
    * Get paginated list of studies with optional filters
    */
-  getAll: (params?: StudyQueryParams): Promise<PaginatedResponse<ImagingStudy>> => {
+  getAll: (params?: StudyQueryParams): Promise<CursorPaginatedResponse<ImagingStudy>> => {
     return apiClient.get('/studies/', params);
   },
 
@@ -33,6 +34,13 @@ export const studyService = {
     return Array.isArray(response) ? response : (response.results || []);
   },
 
+  /**
+   * Get the full DICOM tags of an image (loaded on demand)
+   */
+  getDicomTags: (imageId: number): Promise<DicomTags> => {
+    return apiClient.get(`/images/${imageId}/dicom-tags/`);
+  },
+
   /**
    * Create new study
    */
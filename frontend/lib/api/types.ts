@@ -6,6 +6,16 @@ export interface PaginatedResponse<T> {
   results: T[];
 }
 
+// Cursor-paginated list (studies, images, audit logs). count is only
+// present when requested with count: 'exact' | 'estimate'.
+export interface CursorPaginatedResponse<T> {
+  count?: number;
+  count_estimated?: boolean;
+  next: string | null;
+  previous: string | null;
+  results: T[];
+}
+
 // Hospital types
 export interface Hospital {
   id: number;
@@ -104,7 +114,7 @@ export interface DicomImage {
   manufacturer?: string;
   manufacturer_model?: string;
   sop_instance_uid?: string;
-  dicom_metadata?: any; // Full DICOM tags as JSON
+  dicom_metadata?: any; // Full DICOM tags as JSON (only with expand=dicom_metadata)
 
   file_size_bytes: number;
   uploaded_at: string;
@@ -171,13 +181,25 @@ export interface PatientQueryParams {
   gender?: string;
   hospital?: number;
   page?: number;
+  fields?: string; // comma-separated fields to return
 }
 
 export interface StudyQueryParams {
   patient?: number;
   modality?: string;
   status?: string;
-  page?: number;
+  search?: string;
+  cursor?: string;
+  count?: 'exact' | 'estimate';
+  fields?: string; // comma-separated fields to return
+}
+
+// Full DICOM tags of an image (/images/{id}/dicom-tags/)
+export interface DicomTags {
+  id: number;
+  sop_instance_uid: string | null;
+  is_dicom: boolean;
+  dicom_metadata: any;
 }
 
 // Upload response
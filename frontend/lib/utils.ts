@@ -4,3 +4,11 @@ import { twMerge } from "tailwind-merge"
 export function cn(...inputs: ClassValue[]) {
   return twMerge(clsx(inputs))
 }
+
+/**
+ * Cursor parameter of a cursor-paginated next/previous link
+ */
+export function cursorFromLink(link: string | null | undefined): string | undefined {
+  if (!link) return undefined
+  return new URL(link, "http://localhost").searchParams.get("cursor") ?? undefined
+}